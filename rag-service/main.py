@@ -9,17 +9,27 @@ import hashlib
 import ipaddress
 import math
 import socket
+import sqlite3
+import sys
 import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from contextvars import ContextVar, copy_context
+from functools import wraps
 from io import BytesIO
 import logging
 import mimetypes
 from datetime import datetime, timezone
 from pathlib import Path
-from threading import Lock
-from time import perf_counter
+from threading import Event, Lock, Thread, local
+from time import monotonic, perf_counter, sleep, time, time_ns
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 
+import numpy as np
+
 # --- optional libmagic (fall back if missing) ---
 try:
     import magic  # type: ignore
@@ -32,7 +42,7 @@ import requests
 from bs4 import BeautifulSoup
 from fastapi import Depends, FastAPI, Header, HTTPException, Request, UploadFile, File, Form, Path as FastPath
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, Response
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel, Field, ValidationError, field_validator
 
@@ -41,6 +51,27 @@ import chromadb
 # OpenAI embeddings
 from openai import OpenAI, OpenAIError, RateLimitError
 
+# Optional orjson for search response serialisation (falls back to FastAPI's encoder)
+try:
+    import orjson  # type: ignore
+    _ORJSON_OK = True
+except Exception:
+    orjson = None  # type: ignore
+    _ORJSON_OK = False
+
+# Optional OpenTelemetry tracing (the SDK and OTLP exporter come with chromadb)
+try:
+    from opentelemetry import propagate as otel_propagate, trace as otel_trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+    _OTEL_OK = True
+except Exception:
+    otel_propagate = otel_trace = None  # type: ignore
+    _OTEL_OK = False
+
 # Optional tiktoken for token-aware chunking
 try:
     import tiktoken  # type: ignore
@@ -55,14 +86,78 @@ except Exception:
 RAG_SERVICE_API_KEY = os.getenv("RAG_SERVICE_API_KEY", "")
 STORAGE_DIR = Path(os.getenv("RAG_STORAGE_DIR", "./storage")).resolve()
 REGISTRY_PATH = STORAGE_DIR / "registry.json"
+SEARCH_INDEX_PATH = Path(os.getenv("RAG_SEARCH_INDEX_PATH", str(STORAGE_DIR / "search_index.sqlite3"))).resolve()
 COLLECTION_NAME = os.getenv("RAG_COLLECTION", "sotsiaalai")
+# Points at the collection currently serving (written by /collection/migrate).
+ACTIVE_COLLECTION_PATH = STORAGE_DIR / "active_collection.json"
+# HNSW settings for newly created collections. space/M/construction_ef are fixed
+# once a collection exists (change them with /collection/migrate); search_ef is
+# applied to the serving collection at startup.
+HNSW_SPACES = ("l2", "cosine", "ip")
+RAG_HNSW_SPACE = os.getenv("RAG_HNSW_SPACE", "l2").strip().lower()
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "16"))
+RAG_HNSW_CONSTRUCTION_EF = int(os.getenv("RAG_HNSW_CONSTRUCTION_EF", "100"))
+RAG_HNSW_SEARCH_EF = int(os.getenv("RAG_HNSW_SEARCH_EF", "100"))
+RAG_COLLECTION_MIGRATE_PAGE = int(os.getenv("RAG_COLLECTION_MIGRATE_PAGE", "500"))
+RAG_COLLECTION_BENCHMARK_MAX_VECTORS = int(os.getenv("RAG_COLLECTION_BENCHMARK_MAX_VECTORS", "200000"))
+# Optional sharding: one Chroma collection per value of this metadata field
+# (rows without it stay in the base collection). Queries only visit the shards
+# the filter allows. Empty = a single collection.
+SHARD_KEYS = ("collection_id", "jurisdiction_level", "municipality_id")
+RAG_SHARD_KEY = os.getenv("RAG_SHARD_KEY", "").strip()
+RAG_SHARD_QUERY_WORKERS = int(os.getenv("RAG_SHARD_QUERY_WORKERS", "8"))
+# Chunk id -> shard entries kept in memory (LRU); misses are looked up by id.
+RAG_SHARD_LOCATION_CACHE = int(os.getenv("RAG_SHARD_LOCATION_CACHE", "200000"))
 
 # OpenAI embeddings — hoia kooskõlas olemasoleva kollektsiooniga
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBED_MODEL = os.getenv("RAG_EMBED_MODEL", os.getenv("EMBEDDING_MODEL", "text-embedding-3-large"))
+# text-embedding-3-* can return shortened vectors (0 = the model's native size).
+# The size is recorded on each collection when it is created, and the serving
+# collection's value wins over this setting, so queries always match the index.
+RAG_EMBED_DIMENSIONS = int(os.getenv("RAG_EMBED_DIMENSIONS", "0"))
 
 MAX_MB = int(os.getenv("RAG_SERVER_MAX_MB", "20"))
 
+# Query embedding cache. /search re-embeds the same rewritten queries constantly;
+# keep recent vectors in-process (LRU + TTL) and optionally in a small sqlite
+# store so they survive restarts. Size 0 disables the cache.
+RAG_QUERY_EMBED_CACHE_SIZE = int(os.getenv("RAG_QUERY_EMBED_CACHE_SIZE", "2048"))
+RAG_QUERY_EMBED_CACHE_TTL_SEC = float(os.getenv("RAG_QUERY_EMBED_CACHE_TTL_SEC", "86400"))
+RAG_QUERY_EMBED_CACHE_PATH = os.getenv("RAG_QUERY_EMBED_CACHE_PATH", "").strip()
+RAG_QUERY_EMBED_CACHE_DISK_MAX = int(os.getenv("RAG_QUERY_EMBED_CACHE_DISK_MAX", "50000"))
+# Cache misses from concurrent /search requests are sent to OpenAI together:
+# while other query embeddings are in flight, the first caller collects texts
+# for up to this many ms (0 = one request per query) and at most BATCH_MAX.
+RAG_QUERY_EMBED_BATCH_WINDOW_MS = float(os.getenv("RAG_QUERY_EMBED_BATCH_WINDOW_MS", "5"))
+RAG_QUERY_EMBED_BATCH_MAX = int(os.getenv("RAG_QUERY_EMBED_BATCH_MAX", "64"))
+# Chunk embeddings keyed by sha256(model, dimensions, chunk text). Re-ingesting
+# unchanged text reuses the stored float32 vector instead of calling OpenAI.
+# Least recently used rows are evicted above MAX_MB. Empty path disables it.
+RAG_CHUNK_EMBED_STORE_PATH = os.getenv("RAG_CHUNK_EMBED_STORE_PATH", str(STORAGE_DIR / "chunk_embeddings.sqlite3")).strip()
+RAG_CHUNK_EMBED_STORE_MAX_MB = float(os.getenv("RAG_CHUNK_EMBED_STORE_MAX_MB", "2048"))
+# Whole /search responses keyed by the canonical request and the collection
+# generation, which every collection write bumps. The TTL only bounds staleness
+# from writers outside this process. Size 0 disables the cache.
+RAG_SEARCH_CACHE_SIZE = int(os.getenv("RAG_SEARCH_CACHE_SIZE", "512"))
+RAG_SEARCH_CACHE_TTL_SEC = float(os.getenv("RAG_SEARCH_CACHE_TTL_SEC", "300"))
+RAG_SEARCH_COALESCE_WAIT_SEC = float(os.getenv("RAG_SEARCH_COALESCE_WAIT_SEC", "30"))
+RAG_SEARCH_BATCH_MAX_QUERIES = int(os.getenv("RAG_SEARCH_BATCH_MAX_QUERIES", "16"))
+# Run the lexical channels on a worker thread while the query is embedded and
+# the dense query runs; they only need the compiled filter, not the embedding.
+RAG_SEARCH_PARALLEL = os.getenv("RAG_SEARCH_PARALLEL", "1").strip().lower() in {"1", "true", "yes"}
+RAG_SEARCH_WORKERS = int(os.getenv("RAG_SEARCH_WORKERS", "8"))
+# Per-stage search timings: the last RAG_SEARCH_TIMING_WINDOW samples of each
+# stage feed the percentiles under /health ``search_timings``; every request is
+# also logged as one JSON line when RAG_SEARCH_TIMING_LOG is on.
+RAG_SEARCH_TIMING_WINDOW = int(os.getenv("RAG_SEARCH_TIMING_WINDOW", "2048"))
+RAG_SEARCH_TIMING_LOG = os.getenv("RAG_SEARCH_TIMING_LOG", "1").strip().lower() in {"1", "true", "yes"}
+# Dense over-fetch: when the metadata post-filter drops hits, re-query Chroma with
+# a larger n_results (sized from the observed keep rate) until top_k valid hits
+# are found, the pool is exhausted, or these budgets run out.
+RAG_DENSE_OVERFETCH_MAX = int(os.getenv("RAG_DENSE_OVERFETCH_MAX", "200"))
+RAG_DENSE_OVERFETCH_ROUNDS = int(os.getenv("RAG_DENSE_OVERFETCH_ROUNDS", "4"))
+
 # Chunking config
 # Mode: "tokens" (default) uses tiktoken if available, otherwise falls back to char-based.
 #       Set RAG_CHUNK_MODE=chars to force char-based splitting.
@@ -92,18 +187,100 @@ RAG_BM25_TITLE_WEIGHT = float(os.getenv("RAG_BM25_TITLE_WEIGHT", "1.8"))
 RAG_BM25_BODY_WEIGHT = float(os.getenv("RAG_BM25_BODY_WEIGHT", "1.0"))
 RAG_BM25_TITLE_K = float(os.getenv("RAG_BM25_TITLE_K", "0.8"))
 RAG_BM25_BODY_K = float(os.getenv("RAG_BM25_BODY_K", "1.5"))
+RAG_BM25_B = float(os.getenv("RAG_BM25_B", "0.75"))
+# Persistent inverted index for the lexical channels. When it is ready the
+# lexical retrievers read postings instead of scanning RAG_LEXICAL_SCAN_LIMIT
+# chunks; RAG_LEXICAL_SCAN_LIMIT then caps the candidate pool that is re-scored.
+RAG_SEARCH_INDEX_ENABLED = os.getenv("RAG_SEARCH_INDEX_ENABLED", "1").strip().lower() in {"1", "true", "yes"}
+RAG_SEARCH_INDEX_REBUILD_PAGE = int(os.getenv("RAG_SEARCH_INDEX_REBUILD_PAGE", "256"))
+# Decoded per-chunk result skeletons kept in memory (entries, 0 = read sqlite every time).
+RAG_SKELETON_CACHE_SIZE = int(os.getenv("RAG_SKELETON_CACHE_SIZE", "20000"))
+# Memory-mapped int8 copies of every chunk embedding, keyed by search-index ord.
+# Filtered dense searches over at most RAG_VECTOR_SCAN_MAX_ROWS allowed chunks scan
+# them with NumPy and rescore the best RAG_VECTOR_RESCORE_CANDIDATES with the
+# full-precision vectors from Chroma instead of asking HNSW with a where clause.
+RAG_VECTOR_SIDECAR_ENABLED = os.getenv("RAG_VECTOR_SIDECAR_ENABLED", "1").strip().lower() in {"1", "true", "yes"}
+RAG_VECTOR_SIDECAR_PATH = Path(os.getenv("RAG_VECTOR_SIDECAR_PATH", str(STORAGE_DIR / "vector_sidecar"))).resolve()
+# Also keep sign bits and shortlist by Hamming distance before the int8 pass.
+RAG_VECTOR_SIDECAR_BINARY = os.getenv("RAG_VECTOR_SIDECAR_BINARY", "0").strip().lower() in {"1", "true", "yes"}
+RAG_VECTOR_SCAN_MAX_ROWS = int(os.getenv("RAG_VECTOR_SCAN_MAX_ROWS", "50000"))
+RAG_VECTOR_RESCORE_CANDIDATES = int(os.getenv("RAG_VECTOR_RESCORE_CANDIDATES", "64"))
+RAG_VECTOR_BINARY_SHORTLIST = int(os.getenv("RAG_VECTOR_BINARY_SHORTLIST", "2000"))
+# Dense query planner: filters allowing at most RAG_EXACT_SCAN_MAX_ROWS chunks are
+# answered by exact brute force over their full-precision embeddings (kept in an
+# LRU of RAG_EXACT_MATRIX_CACHE_SIZE filters), larger ones by the sidecar scan up
+# to RAG_VECTOR_SCAN_MAX_ROWS, and everything else by HNSW.
+RAG_EXACT_SCAN_MAX_ROWS = int(os.getenv("RAG_EXACT_SCAN_MAX_ROWS", "2000"))
+RAG_EXACT_MATRIX_CACHE_SIZE = int(os.getenv("RAG_EXACT_MATRIX_CACHE_SIZE", "32"))
+# Exact (act, §, lg, p) lookup kept next to the postings. Pure reference queries
+# ("SHS § 131 lg 2") are answered from it without embedding the query.
+RAG_PROVISION_LOOKUP_ENABLED = os.getenv("RAG_PROVISION_LOOKUP_ENABLED", "1").strip().lower() in {"1", "true", "yes"}
+RAG_PROVISION_SHORT_CIRCUIT = os.getenv("RAG_PROVISION_SHORT_CIRCUIT", "1").strip().lower() in {"1", "true", "yes"}
 RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
 HYBRID_CHANNEL_WEIGHTS = {
     "dense": 1.0,
+    "provision_lookup": 1.5,
     "title_match": 1.35,
     "exact_phrase": 1.15,
     "bm25": 1.0,
 }
 HYBRID_CHANNEL_BOOSTS = {
+    "provision_lookup": 0.12,
     "title_match": 0.09,
     "exact_phrase": 0.06,
     "bm25": 0.05,
 }
+LEXICAL_RETRIEVAL_CHANNELS = ("provision_lookup", "title_match", "exact_phrase", "bm25")
+# Response projections for /search. "full" keeps every key (snake_case and
+# camelCase) and embeds result copies in groups; the other views return only the
+# listed snake_case keys and groups reference results by index.
+SEARCH_VIEWS = ("full", "compact", "ids_only")
+SEARCH_COMPACT_FIELDS = (
+    "id",
+    "doc_id",
+    "chunk_id",
+    "chunk_index",
+    "title",
+    "chunk",
+    "url",
+    "source_type",
+    "page",
+    "pages",
+    "section",
+    "year",
+    "authors",
+    "audience",
+    "collection_id",
+    "jurisdiction_level",
+    "municipality_name",
+    "act_title",
+    "act_reference",
+    "paragraph_number",
+    "paragraph_title",
+    "subsection_number",
+    "point_number",
+    "valid_from",
+    "valid_to",
+    "distance",
+    "retrieval_channels",
+    "dense_rank",
+    "lexical_rank",
+    "hybrid_score",
+    "hybrid_rank",
+)
+SEARCH_IDS_ONLY_FIELDS = ("id", "doc_id", "chunk_id", "retrieval_channels", "hybrid_score", "hybrid_rank")
+SEARCH_COMPACT_GROUP_FIELDS = (
+    "doc_id",
+    "title",
+    "url",
+    "source_type",
+    "jurisdiction_level",
+    "municipality_name",
+    "retrieval_channels",
+    "pages",
+    "short_ref",
+    "count",
+)
 RAG_METADATA_SCHEMA_VERSION = os.getenv("RAG_METADATA_SCHEMA_VERSION", "v2.5").strip() or "v2.5"
 
 # Lubatud MIME – kui env on tühi, kasuta mõistlikku vaikimisi komplekti
@@ -125,11 +302,497 @@ URL_FETCH_MAX_BYTES = int(os.getenv("RAG_URL_FETCH_MAX_BYTES", str(MAX_MB * 1024
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is missing for RAG embeddings")
 
+if RAG_HNSW_SPACE not in HNSW_SPACES:
+    raise RuntimeError(f"RAG_HNSW_SPACE must be one of {', '.join(HNSW_SPACES)}")
+if RAG_SHARD_KEY and RAG_SHARD_KEY not in SHARD_KEYS:
+    raise RuntimeError(f"RAG_SHARD_KEY must be one of {', '.join(SHARD_KEYS)}")
+
 STORAGE_DIR.mkdir(parents=True, exist_ok=True)
 
+def _collection_configuration(
+    space: str = RAG_HNSW_SPACE,
+    m: int = RAG_HNSW_M,
+    construction_ef: int = RAG_HNSW_CONSTRUCTION_EF,
+    search_ef: int = RAG_HNSW_SEARCH_EF,
+) -> Dict[str, object]:
+    return {
+        "hnsw": {
+            "space": space,
+            "max_neighbors": m,
+            "ef_construction": construction_ef,
+            "ef_search": search_ef,
+        }
+    }
+
+def _collection_hnsw(target) -> Dict[str, object]:
+    """The HNSW settings a Chroma collection was created with (plus its current search_ef)."""
+    try:
+        hnsw = (target.configuration or {}).get("hnsw") or {}
+    except Exception:
+        hnsw = {}
+    return {
+        "space": hnsw.get("space"),
+        "m": hnsw.get("max_neighbors"),
+        "construction_ef": hnsw.get("ef_construction"),
+        "search_ef": hnsw.get("ef_search"),
+    }
+
+def _load_active_collection_name() -> str:
+    if ACTIVE_COLLECTION_PATH.exists():
+        try:
+            name = json.loads(ACTIVE_COLLECTION_PATH.read_text(encoding="utf-8")).get("name")
+            if isinstance(name, str) and name:
+                return name
+        except Exception:
+            pass
+    return COLLECTION_NAME
+
+def _open_collection(name: str):
+    target = client.get_or_create_collection(
+        name=name,
+        configuration=_collection_configuration(),
+        metadata={"embed_model": EMBED_MODEL, "embed_dimensions": RAG_EMBED_DIMENSIONS},
+    )
+    if _collection_hnsw(target)["search_ef"] != RAG_HNSW_SEARCH_EF:
+        try:
+            target.modify(configuration={"hnsw": {"ef_search": RAG_HNSW_SEARCH_EF}})
+        except Exception:
+            logging.getLogger("rag-service").exception("[rag][collection] could not apply RAG_HNSW_SEARCH_EF")
+    return target
+
+def _shard_value(metadata: object, key: str) -> str:
+    """The shard a row belongs to ("" = base collection for missing or list values)."""
+    if not isinstance(metadata, dict):
+        return ""
+    value = metadata.get(key)
+    if value is None or isinstance(value, (list, tuple, dict)):
+        return ""
+    return str(value).strip()
+
+def _where_shard_values(where: object, key: str) -> Optional[set]:
+    """Shard values a Chroma ``where`` can match on ``key``; None = any shard."""
+    if not isinstance(where, dict) or not where:
+        return None
+    allowed: Optional[set] = None
+
+    def _narrow(values: Optional[set]) -> None:
+        nonlocal allowed
+        if values is not None:
+            allowed = set(values) if allowed is None else allowed & values
+
+    for field, expected in where.items():
+        if field == "$and":
+            for clause in list(expected or []):
+                _narrow(_where_shard_values(clause, key))
+        elif field == "$or":
+            branches = [_where_shard_values(clause, key) for clause in list(expected or [])]
+            if branches and all(branch is not None for branch in branches):
+                _narrow(set().union(*branches))
+        elif field == key:
+            if isinstance(expected, dict):
+                if "$in" in expected:
+                    _narrow({str(item).strip() for item in list(expected.get("$in") or [])})
+                elif "$eq" in expected:
+                    _narrow({str(expected.get("$eq")).strip()})
+            elif not isinstance(expected, (list, tuple)):
+                _narrow({str(expected).strip()})
+    return allowed
+
+def _merge_get_results(pages: List[Dict[str, object]]) -> Dict[str, object]:
+    if len(pages) == 1:
+        return pages[0]
+    merged: Dict[str, object] = {"ids": [], "included": pages[0].get("included") if pages else []}
+    for field in ("embeddings", "documents", "metadatas"):
+        parts = [page.get(field) for page in pages if page.get(field) is not None]
+        if not parts:
+            merged[field] = None
+        elif all(isinstance(part, np.ndarray) for part in parts):
+            merged[field] = np.concatenate([part for part in parts if len(part)]) if any(len(part) for part in parts) else parts[0]
+        else:
+            merged[field] = [item for part in parts for item in part]
+    for page in pages:
+        merged["ids"].extend(page.get("ids") or [])
+    return merged
+
+class _ShardedCollection:
+    """Chroma collection look-alike spread over one collection per ``key`` value.
+
+    The base collection keeps rows without a shard value and the collection-level
+    settings (name, metadata, HNSW config); shards are ``<base>--<slug>-<hash>``
+    and are found again at startup through their metadata. Writes are routed by
+    the row's metadata, ``get``/``delete`` by id through an LRU id → shard cache
+    (misses are looked up by id, likeliest shard first) or by the filter, and
+    ``query`` fans out to the shards the filter allows and merges by distance.
+    """
+
+    def __init__(self, base, key: str):
+        self.base = base
+        self.key = key
+        self._lock = Lock()
+        self._shards: Dict[str, object] = {"": base}
+        self._location: "OrderedDict[str, str]" = OrderedDict()
+        # (filter, offset) -> (shard position, offset inside it) where a page ended.
+        self._cursors: "OrderedDict[Tuple[str, int], Tuple[int, int]]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, RAG_SHARD_QUERY_WORKERS), thread_name_prefix="rag-shard")
+        prefix = f"{base.name}--"
+        for found in client.list_collections():
+            name = found if isinstance(found, str) else found.name
+            if not name.startswith(prefix):
+                continue
+            shard = client.get_collection(name)
+            meta = shard.metadata or {}
+            if meta.get("shard_of") == base.name and meta.get("shard_key") == key:
+                self._shards[str(meta.get("shard_value") or "")] = shard
+
+    def __getattr__(self, name: str):
+        return getattr(self.base, name)
+
+    @property
+    def name(self) -> str:
+        return self.base.name
+
+    @property
+    def metadata(self):
+        return self.base.metadata
+
+    @property
+    def configuration(self):
+        return self.base.configuration
+
+    def shard_counts(self) -> Dict[str, int]:
+        with self._lock:
+            shards = dict(self._shards)
+        return {value: shard.count() for value, shard in sorted(shards.items())}
+
+    def _shard_for(self, value: str, create: bool = False):
+        with self._lock:
+            shard = self._shards.get(value)
+            if shard is not None or not create:
+                return shard
+            slug = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")[:40] or "x"
+            digest = hashlib.sha1(value.encode("utf-8")).hexdigest()[:8]
+            base_meta = self.base.metadata or {}
+            hnsw = _collection_hnsw(self.base)
+            shard = client.get_or_create_collection(
+                name=f"{self.base.name}--{slug}-{digest}",
+                configuration=_collection_configuration(
+                    hnsw["space"] or RAG_HNSW_SPACE,
+                    hnsw["m"] or RAG_HNSW_M,
+                    hnsw["construction_ef"] or RAG_HNSW_CONSTRUCTION_EF,
+                    hnsw["search_ef"] or RAG_HNSW_SEARCH_EF,
+                ),
+                metadata={
+                    "embed_model": base_meta.get("embed_model") or EMBED_MODEL,
+                    "embed_dimensions": base_meta.get("embed_dimensions") or 0,
+                    "shard_of": self.base.name,
+                    "shard_key": self.key,
+                    "shard_value": value,
+                },
+            )
+            self._shards[value] = shard
+            return shard
+
+    def _shards_for_where(self, where: object) -> List[Tuple[str, object]]:
+        values = _where_shard_values(where, self.key)
+        with self._lock:
+            if values is None:
+                return list(self._shards.items())
+            # The base collection can still hold list-valued rows that match.
+            return [(value, shard) for value, shard in self._shards.items() if value == "" or value in values]
+
+    def _remember(self, locations: Dict[str, str]) -> None:
+        with self._lock:
+            for chunk_id, value in locations.items():
+                self._location[chunk_id] = value
+                self._location.move_to_end(chunk_id)
+            while len(self._location) > max(0, RAG_SHARD_LOCATION_CACHE):
+                self._location.popitem(last=False)
+
+    def _forget(self, ids: List[str]) -> None:
+        with self._lock:
+            for chunk_id in ids:
+                self._location.pop(chunk_id, None)
+
+    def _resolve(self, ids: List[str], hints: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Shard value of each stored id; ids stored nowhere are left out.
+
+        Cache misses are looked up by id, hinted shards first. While the search
+        index is serving, ids it does not hold are not stored and are not probed.
+        """
+        found: Dict[str, str] = {}
+        missing: List[str] = []
+        with self._lock:
+            for chunk_id in dict.fromkeys(ids):
+                value = self._location.get(chunk_id)
+                if value is None:
+                    missing.append(chunk_id)
+                else:
+                    found[chunk_id] = value
+                    self._location.move_to_end(chunk_id)
+            shards = list(self._shards.items())
+        if missing and _SEARCH_INDEX_STATE["enabled"] and _SEARCH_INDEX_STATE["ready"]:
+            known = _SEARCH_INDEX_STATE["ord_by_id"]
+            missing = [chunk_id for chunk_id in missing if chunk_id in known]
+        if not missing:
+            return found
+        hinted = list(dict.fromkeys((hints or {}).get(chunk_id) for chunk_id in missing))
+        shards.sort(key=lambda item: hinted.index(item[0]) if item[0] in hinted else len(hinted))
+        probed: Dict[str, str] = {}
+        for value, shard in shards:
+            if not missing:
+                break
+            hits = set(shard.get(ids=missing, include=[]).get("ids") or [])
+            probed.update((chunk_id, value) for chunk_id in hits)
+            missing = [chunk_id for chunk_id in missing if chunk_id not in hits]
+        self._remember(probed)
+        return {**found, **probed}
+
+    def _group_ids(self, ids: List[str]) -> Dict[str, List[str]]:
+        grouped: Dict[str, List[str]] = {}
+        for chunk_id, value in self._resolve(ids).items():
+            grouped.setdefault(value, []).append(chunk_id)
+        return grouped
+
+    def count(self) -> int:
+        return sum(self.shard_counts().values())
+
+    @staticmethod
+    def _empty_get(include) -> Dict[str, object]:
+        # Chroma refuses ``get(ids=[])``; answer an exhausted page in its shape.
+        include = list(include) if include is not None else ["metadatas", "documents"]
+        empty: Dict[str, object] = {"ids": [], "included": include}
+        for field in ("embeddings", "documents", "metadatas", "uris", "data"):
+            empty[field] = [] if field in include else None
+        return empty
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None, **kwargs):
+        if include is not None:
+            kwargs["include"] = include
+        if ids is not None:
+            ids = [ids] if isinstance(ids, str) else list(ids)
+            pages = [
+                self._shards[value].get(ids=group, where=where, **kwargs)
+                for value, group in self._group_ids(ids).items()
+            ]
+            return _merge_get_results(pages) if pages else self._empty_get(kwargs.get("include"))
+        skip = int(offset or 0)
+        remaining = None if limit is None else int(limit)
+        targets = self._shards_for_where(where)
+        where_key = json.dumps(where, sort_keys=True, default=str)
+        with self._lock:
+            cursor = self._cursors.get((where_key, skip)) if skip else None
+        # Offset paging resumes where the previous page ended instead of
+        # recounting the shards it already walked past.
+        position, inner = cursor if cursor is not None else (0, skip)
+        pages = []
+        while position < len(targets) and (remaining is None or remaining > 0):
+            shard = targets[position][1]
+            if inner and cursor is None:
+                size = shard.count() if where is None else len(shard.get(where=where, include=[]).get("ids") or [])
+                if inner >= size:
+                    inner -= size
+                    position += 1
+                    continue
+            page = shard.get(where=where, limit=remaining, offset=inner or None, **kwargs)
+            got = len(page.get("ids") or [])
+            pages.append(page)
+            inner += got
+            if remaining is not None:
+                remaining -= got
+            if remaining is None or remaining > 0:
+                position, inner = position + 1, 0
+        if remaining is not None:
+            with self._lock:
+                self._cursors[(where_key, skip + int(limit) - remaining)] = (position, inner)
+                while len(self._cursors) > 64:
+                    self._cursors.popitem(last=False)
+        return _merge_get_results(pages) if pages else self._empty_get(kwargs.get("include"))
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=None, **kwargs):
+        include = list(include) if include is not None else ["metadatas", "documents", "distances"]
+        targets = [shard for _, shard in self._shards_for_where(where)]
+        if len(targets) == 1:
+            return targets[0].query(query_embeddings=query_embeddings, n_results=n_results, where=where, include=include, **kwargs)
+        fetch_include = include if "distances" in include else [*include, "distances"]
+        futures = [
+            self._executor.submit(
+                shard.query,
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                include=fetch_include,
+                **kwargs,
+            )
+            for shard in targets
+        ]
+        results = [future.result() for future in futures]
+        fields = [field for field in ("embeddings", "documents", "metadatas", "distances") if field in fetch_include]
+        merged: Dict[str, object] = {"ids": [], "included": include}
+        for field in ("embeddings", "documents", "metadatas", "distances"):
+            merged[field] = [] if field in include else None
+        for row in range(len(query_embeddings)):
+            hits = []
+            for result in results:
+                distances = (result.get("distances") or [[]])[row]
+                for position, chunk_id in enumerate((result.get("ids") or [[]])[row]):
+                    hits.append((float(distances[position]), chunk_id, result, position))
+            hits.sort(key=lambda hit: (hit[0], hit[1]))
+            hits = hits[:n_results]
+            merged["ids"].append([hit[1] for hit in hits])
+            for field in fields:
+                if field in include:
+                    merged[field].append([hit[2][field][row][hit[3]] for hit in hits])
+        return merged
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None, **kwargs):
+        ids = list(ids)
+        groups: Dict[str, List[int]] = {}
+        for index in range(len(ids)):
+            metadata = metadatas[index] if metadatas is not None else None
+            groups.setdefault(_shard_value(metadata, self.key), []).append(index)
+        self._forget_moved(ids, {ids[index]: value for value, indices in groups.items() for index in indices})
+        for value, indices in groups.items():
+            self._shard_for(value, create=True).upsert(
+                ids=[ids[index] for index in indices],
+                embeddings=[embeddings[index] for index in indices] if embeddings is not None else None,
+                documents=[documents[index] for index in indices] if documents is not None else None,
+                metadatas=[metadatas[index] for index in indices] if metadatas is not None else None,
+                **kwargs,
+            )
+            self._remember({ids[index]: value for index in indices})
+
+    add = upsert
+
+    def _forget_moved(self, ids: List[str], targets: Dict[str, str]) -> None:
+        """Delete rows from their old shard when their shard value changed."""
+        stale: Dict[str, List[str]] = {}
+        for chunk_id, current in self._resolve(ids, hints=targets).items():
+            if current != targets[chunk_id]:
+                stale.setdefault(current, []).append(chunk_id)
+        for value, group in stale.items():
+            self._shards[value].delete(ids=group)
+            self._forget(group)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None, **kwargs):
+        ids = list(ids)
+        positions = {chunk_id: index for index, chunk_id in enumerate(ids)}
+        moved: List[str] = []
+        for value, group in self._group_ids(ids).items():
+            stay = group
+            if metadatas is not None:
+                # Chroma merges metadata keys (None drops one), so only an update
+                # that sets or drops ``key`` can move a row to another shard.
+                stay = []
+                for chunk_id in group:
+                    patch = metadatas[positions[chunk_id]] or {}
+                    target = _shard_value(patch, self.key) if self.key in patch else value
+                    (stay if target == value else moved).append(chunk_id)
+            if not stay:
+                continue
+            self._shards[value].update(
+                ids=stay,
+                embeddings=[embeddings[positions[chunk_id]] for chunk_id in stay] if embeddings is not None else None,
+                documents=[documents[positions[chunk_id]] for chunk_id in stay] if documents is not None else None,
+                metadatas=[metadatas[positions[chunk_id]] for chunk_id in stay] if metadatas is not None else None,
+                **kwargs,
+            )
+        if not moved:
+            return
+        # Rows changing shard are rewritten in full in their new shard.
+        existing = self.get(ids=moved, include=["embeddings", "documents", "metadatas"])
+        rows = {
+            chunk_id: (existing["embeddings"][index], existing["documents"][index], existing["metadatas"][index] or {})
+            for index, chunk_id in enumerate(existing.get("ids") or [])
+        }
+        present = [chunk_id for chunk_id in moved if chunk_id in rows]
+        if not present:
+            return
+        merged_metas = []
+        for chunk_id in present:
+            metadata = dict(rows[chunk_id][2])
+            for field, value in (metadatas[positions[chunk_id]] or {}).items():
+                if value is None:
+                    metadata.pop(field, None)
+                else:
+                    metadata[field] = value
+            merged_metas.append(metadata)
+        self.upsert(
+            ids=present,
+            embeddings=[embeddings[positions[chunk_id]] if embeddings is not None else rows[chunk_id][0] for chunk_id in present],
+            documents=[documents[positions[chunk_id]] if documents is not None else rows[chunk_id][1] for chunk_id in present],
+            metadatas=merged_metas,
+        )
+
+    def delete(self, ids=None, where=None, **kwargs):
+        if ids is not None:
+            groups = self._group_ids([ids] if isinstance(ids, str) else list(ids))
+        else:
+            groups = {}
+            for value, shard in self._shards_for_where(where):
+                found = shard.get(where=where, include=[]).get("ids") or []
+                if found:
+                    groups[value] = list(found)
+            where = None
+        for value, group in groups.items():
+            self._shards[value].delete(ids=group, where=where, **kwargs)
+            self._forget(group)
+
+    def modify(self, **kwargs) -> None:
+        for _, shard in sorted(self._shards.items()):
+            shard.modify(**kwargs)
+
+    def reshard(self) -> Dict[str, int]:
+        """Move rows whose shard value does not match the collection they sit in."""
+        moved = 0
+        scanned = 0
+        page_size = max(16, RAG_COLLECTION_MIGRATE_PAGE)
+        for value, shard in sorted(self._shards.items()):
+            offset = 0
+            misplaced: List[str] = []
+            while True:
+                page = shard.get(include=["metadatas"], limit=page_size, offset=offset)
+                page_ids = page.get("ids") or []
+                if not page_ids:
+                    break
+                offset += len(page_ids)
+                scanned += len(page_ids)
+                for chunk_id, metadata in zip(page_ids, page.get("metadatas") or []):
+                    if _shard_value(metadata, self.key) != value:
+                        misplaced.append(chunk_id)
+            for start in range(0, len(misplaced), page_size):
+                with COLLECTION_WRITE_LOCK:
+                    got = shard.get(ids=misplaced[start:start + page_size], include=["embeddings", "documents", "metadatas"])
+                    got_ids = list(got.get("ids") or [])
+                    if not got_ids:
+                        continue
+                    self._remember({chunk_id: value for chunk_id in got_ids})
+                    self.upsert(
+                        ids=got_ids,
+                        embeddings=np.asarray(got.get("embeddings"), dtype=np.float32).tolist(),
+                        documents=list(got.get("documents") or []),
+                        metadatas=[md if isinstance(md, dict) and md else None for md in got.get("metadatas") or []],
+                    )
+                    moved += len(got_ids)
+        return {"scanned": scanned, "moved": moved}
+
 # Chroma client (persistent) – we send precomputed OpenAI embeddings
 client = chromadb.PersistentClient(path=str(STORAGE_DIR / "chroma"))
-collection = client.get_or_create_collection(name=COLLECTION_NAME)
+collection = _open_collection(_load_active_collection_name())
+if RAG_SHARD_KEY:
+    collection = _ShardedCollection(collection, RAG_SHARD_KEY)
+# Writers hold this around Chroma writes so a migration can catch up and swap
+# the serving collection without losing a concurrent ingest.
+COLLECTION_WRITE_LOCK = Lock()
+_COLLECTION_MIGRATION: Dict[str, object] = {"running": False, "target": None, "copied": 0, "dirty": set()}
+# One benchmark at a time: a search_ef sweep changes the collection's ef until it finishes.
+COLLECTION_BENCHMARK_LOCK = Lock()
+
+def _collection_note_write(doc_id: str) -> None:
+    """Record a write for a running migration or search-index rebuild; call with COLLECTION_WRITE_LOCK held."""
+    if _COLLECTION_MIGRATION["running"]:
+        _COLLECTION_MIGRATION["dirty"].add(doc_id)
+    if _SEARCH_INDEX_STATE["rebuild_dirty"] is not None:
+        _SEARCH_INDEX_STATE["rebuild_dirty"].add(doc_id)
 
 # OpenAI client
 oa = OpenAI(api_key=OPENAI_API_KEY)
@@ -146,6 +809,208 @@ RAG_COST_MIRROR_URL = os.getenv("RAG_COST_MIRROR_URL", "").strip()
 RAG_COST_MIRROR_SECRET = os.getenv("RAG_COST_MIRROR_SECRET", "").strip()
 RAG_COST_MIRROR_TIMEOUT_SEC = float(os.getenv("RAG_COST_MIRROR_TIMEOUT_SEC", "1.5"))
 
+# --------------------
+# Prometheus metrics
+# --------------------
+# Hand-rolled text exposition (no client library): counters, gauges and
+# histograms live in _METRIC_VALUES keyed by sorted label tuples and are
+# rendered by GET /metrics. Cache ratios are read from the existing stats dicts.
+RAG_METRICS_ENABLED = os.getenv("RAG_METRICS_ENABLED", "1").strip().lower() in {"1", "true", "yes"}
+METRIC_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_METRICS_LOCK = Lock()
+_METRIC_META: Dict[str, Tuple[str, str]] = {
+    "rag_http_request_duration_seconds": ("histogram", "HTTP request latency by route template, method and status."),
+    "rag_ingests_in_flight": ("gauge", "Ingest/reindex requests currently being processed."),
+    "rag_embedding_requests_total": ("counter", "OpenAI embedding API calls by outcome."),
+    "rag_embedding_request_duration_seconds": ("histogram", "OpenAI embedding API call latency."),
+    "rag_embedding_inputs_total": ("counter", "Texts sent to the OpenAI embedding API."),
+    "rag_embedding_tokens_total": ("counter", "Tokens reported by the OpenAI embedding API."),
+    "rag_embedding_rate_wait_seconds": ("histogram", "Time spent waiting for the RPM/TPM embedding budget."),
+    "rag_query_embedding_batches_total": ("counter", "OpenAI requests made by the query-embedding micro-batcher."),
+    "rag_query_embedding_batched_texts_total": ("counter", "Distinct query texts sent by the micro-batcher."),
+    "rag_chunk_embedding_store_total": ("counter", "Chunk embedding store lookups at ingest by result."),
+    "rag_chroma_operation_duration_seconds": ("histogram", "Chroma query/upsert/update/delete latency."),
+    "rag_lexical_candidates_scanned_total": ("counter", "Rows scored by lexical retrieval."),
+    "rag_lexical_candidates_matched_total": ("counter", "Scored rows that matched a lexical channel."),
+    "rag_registry_operation_duration_seconds": ("histogram", "Document registry load/save latency."),
+    "rag_cache_requests_total": ("counter", "Cache lookups by cache and result."),
+    "rag_cache_hit_ratio": ("gauge", "Hits / (hits + misses) since start."),
+}
+_METRIC_VALUES: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+
+def _metric_inc(name: str, value: float = 1.0, **labels: str) -> None:
+    """Add to a counter or gauge series."""
+    if not RAG_METRICS_ENABLED:
+        return
+    key = tuple(sorted((label, str(item)) for label, item in labels.items()))
+    with _METRICS_LOCK:
+        series = _METRIC_VALUES.setdefault(name, {})
+        series[key] = float(series.get(key, 0.0)) + value
+
+def _metric_observe(name: str, seconds: float, **labels: str) -> None:
+    """Record one histogram sample (bucket counts are stored per bucket, not cumulative)."""
+    if not RAG_METRICS_ENABLED:
+        return
+    key = tuple(sorted((label, str(item)) for label, item in labels.items()))
+    bucket = bisect_left(METRIC_LATENCY_BUCKETS, seconds)
+    with _METRICS_LOCK:
+        series = _METRIC_VALUES.setdefault(name, {})
+        state = series.get(key)
+        if state is None:
+            state = series[key] = [[0] * (len(METRIC_LATENCY_BUCKETS) + 1), 0.0, 0]
+        state[0][bucket] += 1
+        state[1] += seconds
+        state[2] += 1
+
+def _metric_labels(key: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for label, value in pairs:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{label}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+def _metric_number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _metrics_cache_series() -> Dict[str, Dict[Tuple[Tuple[str, str], ...], object]]:
+    caches = {
+        "search_result": (_SEARCH_CACHE_STATS, (("hits", "hit"), ("misses", "miss"), ("coalesced", "coalesced"))),
+        "query_embedding": (_QUERY_EMBED_CACHE_STATS, (("hits", "hit"), ("misses", "miss"), ("disk_hits", "disk_hit"))),
+    }
+    requests_total: Dict[Tuple[Tuple[str, str], ...], object] = {}
+    ratios: Dict[Tuple[Tuple[str, str], ...], object] = {}
+    for cache, (stats, results) in caches.items():
+        for stat, result in results:
+            requests_total[(("cache", cache), ("result", result))] = float(stats.get(stat) or 0)
+        looked_up = float(stats.get("hits") or 0) + float(stats.get("misses") or 0)
+        ratios[(("cache", cache),)] = float(stats.get("hits") or 0) / looked_up if looked_up else 0.0
+    return {"rag_cache_requests_total": requests_total, "rag_cache_hit_ratio": ratios}
+
+def _metrics_render() -> str:
+    with _METRICS_LOCK:
+        snapshot = {
+            name: {key: ([list(state[0]), state[1], state[2]] if isinstance(state, list) else state) for key, state in series.items()}
+            for name, series in _METRIC_VALUES.items()
+        }
+    snapshot.update(_metrics_cache_series())
+    lines: List[str] = []
+    for name, (kind, help_text) in _METRIC_META.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, state in sorted((snapshot.get(name) or {}).items()):
+            if kind != "histogram":
+                lines.append(f"{name}{_metric_labels(key)} {_metric_number(state)}")
+                continue
+            counts, total, count = state
+            cumulative = 0
+            for bound, bucket_count in zip((*METRIC_LATENCY_BUCKETS, math.inf), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_metric_labels(key, (('le', _metric_number(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_metric_labels(key)} {_metric_number(round(total, 6))}")
+            lines.append(f"{name}_count{_metric_labels(key)} {count}")
+    return "\n".join(lines) + "\n"
+
+def _chroma_observe(op: str, started: float) -> None:
+    _metric_observe("rag_chroma_operation_duration_seconds", perf_counter() - started, op=op)
+    _span_record(f"rag.chroma.{op}", started)
+
+def _metric_is_ingest(path: str) -> bool:
+    return path.startswith("/ingest") or path == "/upload" or path.endswith(("/reindex", "/update-meta"))
+
+# --------------------
+# Tracing
+# --------------------
+# OpenTelemetry spans for each request (parented on an incoming ``traceparent``)
+# and for extraction, chunking, embedding sub-batches, Chroma writes/queries,
+# lexical scoring and registry I/O. The X-Observability-* headers of the request
+# are copied onto every span. RAG_TRACING_EXPORTER: "" (off), "console",
+# "memory" (spans kept in _TRACE_MEMORY_EXPORTER, for tests) or "otlp" (the
+# standard OTEL_EXPORTER_OTLP_* variables pick the collector).
+TRACING_EXPORTERS = ("", "console", "memory", "otlp")
+RAG_TRACING_EXPORTER = os.getenv("RAG_TRACING_EXPORTER", "").strip().lower()
+RAG_TRACING_SERVICE_NAME = os.getenv("RAG_TRACING_SERVICE_NAME", "rag-service").strip() or "rag-service"
+if RAG_TRACING_EXPORTER not in TRACING_EXPORTERS:
+    raise RuntimeError(f"RAG_TRACING_EXPORTER must be one of {', '.join(repr(item) for item in TRACING_EXPORTERS)}")
+_TRACE_ATTRIBUTES: ContextVar[Dict[str, str]] = ContextVar("rag_trace_attributes", default={})
+_TRACE_MEMORY_EXPORTER = None
+
+def _tracing_setup():
+    global _TRACE_MEMORY_EXPORTER
+    if not RAG_TRACING_EXPORTER:
+        return None
+    if not _OTEL_OK:
+        logger.warning("[rag][tracing] RAG_TRACING_EXPORTER=%s but opentelemetry is not installed", RAG_TRACING_EXPORTER)
+        return None
+    # A private provider: chromadb may own the global one.
+    provider = TracerProvider(resource=Resource.create({"service.name": RAG_TRACING_SERVICE_NAME}))
+    if RAG_TRACING_EXPORTER == "console":
+        provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    elif RAG_TRACING_EXPORTER == "memory":
+        _TRACE_MEMORY_EXPORTER = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(_TRACE_MEMORY_EXPORTER))
+    else:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    return provider.get_tracer("rag-service")
+
+_TRACER = _tracing_setup()
+
+def _span_attributes(attributes: Dict[str, object]) -> Dict[str, object]:
+    merged: Dict[str, object] = dict(_TRACE_ATTRIBUTES.get())
+    for key, value in attributes.items():
+        if isinstance(value, (str, bool, int, float)):
+            merged[f"rag.{key}"] = value
+    return merged
+
+def _span(name: str, **attributes: object):
+    """Context manager for a child span of the current request (no-op when tracing is off)."""
+    if _TRACER is None:
+        return nullcontext()
+    return _TRACER.start_as_current_span(name, attributes=_span_attributes(attributes))
+
+def _span_record(name: str, started: float, **attributes: object) -> None:
+    """Record an already finished step (``started`` is its perf_counter start) as a span."""
+    if _TRACER is None:
+        return
+    end_ns = time_ns()
+    span = _TRACER.start_span(
+        name,
+        start_time=end_ns - int((perf_counter() - started) * 1e9),
+        attributes=_span_attributes(attributes),
+    )
+    span.end(end_time=end_ns)
+
+def _traced(name: str):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _trace_request_attributes(headers) -> Dict[str, str]:
+    attributes: Dict[str, str] = {}
+    for key, header in (
+        ("route", OBSERVABILITY_ROUTE_HEADER),
+        ("stage", OBSERVABILITY_STAGE_HEADER),
+        ("user_id", OBSERVABILITY_USER_ID_HEADER),
+        ("role", OBSERVABILITY_ROLE_HEADER),
+        ("conversation_id", OBSERVABILITY_CONVERSATION_ID_HEADER),
+        ("artifact_id", OBSERVABILITY_ARTIFACT_ID_HEADER),
+        ("research_job_id", OBSERVABILITY_RESEARCH_JOB_ID_HEADER),
+    ):
+        value = _clean_observability_value(headers.get(header))
+        if value:
+            attributes[f"observability.{key}"] = value
+    return attributes
+
 app = FastAPI(title="SotsiaalAI RAG Service (OpenAI embeddings)", version="3.9")
 
 app.add_middleware(
@@ -156,6 +1021,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = perf_counter()
+    ingest = _metric_is_ingest(request.url.path)
+    if ingest:
+        _metric_inc("rag_ingests_in_flight", 1)
+    trace_token = _TRACE_ATTRIBUTES.set(_trace_request_attributes(request.headers))
+    span = None
+    if _TRACER is not None:
+        span = _TRACER.start_span(
+            f"{request.method} {request.url.path}",
+            context=otel_propagate.extract(dict(request.headers)),
+            kind=SpanKind.SERVER,
+            attributes=_span_attributes({}),
+        )
+    status = 500
+    try:
+        if span is None:
+            response = await call_next(request)
+        else:
+            with otel_trace.use_span(span, end_on_exit=False):
+                response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        if ingest:
+            _metric_inc("rag_ingests_in_flight", -1)
+        route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+        _metric_observe(
+            "rag_http_request_duration_seconds",
+            perf_counter() - started,
+            route=route,
+            method=request.method,
+            status=str(status),
+        )
+        if span is not None:
+            span.update_name(f"{request.method} {route}")
+            span.set_attribute("http.request.method", request.method)
+            span.set_attribute("http.route", route)
+            span.set_attribute("http.response.status_code", status)
+            if status >= 500:
+                span.set_status(Status(StatusCode.ERROR))
+            span.end()
+        _TRACE_ATTRIBUTES.reset(trace_token)
+
 
 @app.exception_handler(RequestValidationError)
 async def handle_request_validation_error(request: Request, exc: RequestValidationError):
@@ -583,21 +1493,28 @@ def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 def _load_registry_unlocked() -> Dict[str, Dict]:
+    started = perf_counter()
+    data: Dict[str, Dict] = {}
     if REGISTRY_PATH.exists():
         try:
-            return json.loads(REGISTRY_PATH.read_text(encoding="utf-8"))
+            data = json.loads(REGISTRY_PATH.read_text(encoding="utf-8"))
         except Exception:
             pass
-    return {}
+    _metric_observe("rag_registry_operation_duration_seconds", perf_counter() - started, op="load")
+    _span_record("rag.registry.load", started, documents=len(data))
+    return data
 
 def _load_registry() -> Dict[str, Dict]:
     with REGISTRY_LOCK:
         return _load_registry_unlocked()
 
 def _save_registry_unlocked(data: Dict[str, Dict]) -> None:
+    started = perf_counter()
     tmp_path = REGISTRY_PATH.with_suffix(f"{REGISTRY_PATH.suffix}.tmp")
     tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
     os.replace(tmp_path, REGISTRY_PATH)
+    _metric_observe("rag_registry_operation_duration_seconds", perf_counter() - started, op="save")
+    _span_record("rag.registry.save", started, documents=len(data))
 
 def _save_registry(data: Dict[str, Dict]) -> None:
     with REGISTRY_LOCK:
@@ -758,6 +1675,9 @@ def _log_rag_cost_usage(
         "top_k": top_k,
         "doc_id": context.get("doc_id"),
         "article_count": context.get("article_count"),
+        "embedding_cache": context.get("embedding_cache"),
+        "embedding_store_hits": context.get("embedding_store_hits"),
+        "embedding_store_misses": context.get("embedding_store_misses"),
         "cost_read_directly": cost_read_directly,
     }
     try:
@@ -950,6 +1870,7 @@ def _fetch_remote_html(url: str) -> str:
     raise HTTPException(422, "Too many redirects while fetching URL.")
 
 # --- PDF / DOCX / HTML extractors ---
+@_traced("rag.extract.pdf")
 def _extract_text_from_pdf(buff: bytes) -> List[Tuple[int, str]]:
     """Tagasta list (page_no, text)."""
     from pypdf import PdfReader
@@ -963,6 +1884,7 @@ def _extract_text_from_pdf(buff: bytes) -> List[Tuple[int, str]]:
     except Exception as e:
         raise HTTPException(422, f"PDF parse failed: {e}")
 
+@_traced("rag.extract.docx")
 def _extract_text_from_docx(buff: bytes) -> str:
     import tempfile, docx2txt
     try:
@@ -974,6 +1896,7 @@ def _extract_text_from_docx(buff: bytes) -> str:
     except Exception as e:
         raise HTTPException(422, f"DOCX parse failed: {e}")
 
+@_traced("rag.extract.html")
 def _extract_text_from_html(html: str) -> str:
     soup = BeautifulSoup(html, "html.parser")
     for t in soup(["script", "style", "noscript"]):
@@ -1086,6 +2009,59 @@ def _sanitize_filename(name: str, fallback: str = "document.pdf") -> str:
 EMBED_MAX_INPUTS_PER_REQUEST = int(os.getenv("RAG_EMBED_MAX_INPUTS_PER_REQUEST", "96"))
 EMBED_MAX_TOKENS_PER_REQUEST = int(os.getenv("RAG_EMBED_MAX_TOKENS_PER_REQUEST", "200000"))
 EMBED_MAX_TOKENS_PER_INPUT = int(os.getenv("RAG_EMBED_MAX_TOKENS_PER_INPUT", "8000"))
+# Sub-batches of one call go out concurrently on a process-wide pool, and every
+# request first takes its share from a requests/tokens-per-minute token bucket
+# shared by all callers (0 = no limit). A request that cannot get its budget
+# within RAG_EMBED_RATE_WAIT_MAX_SEC fails with 503 like an OpenAI rate limit.
+RAG_EMBED_CONCURRENCY = int(os.getenv("RAG_EMBED_CONCURRENCY", "4"))
+RAG_EMBED_RPM = int(os.getenv("RAG_EMBED_RPM", "0"))
+RAG_EMBED_TPM = int(os.getenv("RAG_EMBED_TPM", "0"))
+RAG_EMBED_RATE_WAIT_MAX_SEC = float(os.getenv("RAG_EMBED_RATE_WAIT_MAX_SEC", "60"))
+_EMBED_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, RAG_EMBED_CONCURRENCY), thread_name_prefix="rag-embed")
+_EMBED_RATE_LOCK = Lock()
+_EMBED_RATE: Dict[str, float] = {
+    "requests": float(RAG_EMBED_RPM),
+    "tokens": float(RAG_EMBED_TPM),
+    "updated": monotonic(),
+}
+
+def _embed_rate_acquire(tokens: int) -> float:
+    """Block until one request of ``tokens`` fits the RPM/TPM budgets; returns seconds waited."""
+    if RAG_EMBED_RPM <= 0 and RAG_EMBED_TPM <= 0:
+        return 0.0
+    started = monotonic()
+    # A single request larger than the whole minute budget waits for a full bucket.
+    tokens = min(max(0, tokens), RAG_EMBED_TPM) if RAG_EMBED_TPM > 0 else 0
+    while True:
+        with _EMBED_RATE_LOCK:
+            now = monotonic()
+            elapsed = now - _EMBED_RATE["updated"]
+            _EMBED_RATE["updated"] = now
+            if RAG_EMBED_RPM > 0:
+                _EMBED_RATE["requests"] = min(float(RAG_EMBED_RPM), _EMBED_RATE["requests"] + elapsed * RAG_EMBED_RPM / 60.0)
+            if RAG_EMBED_TPM > 0:
+                _EMBED_RATE["tokens"] = min(float(RAG_EMBED_TPM), _EMBED_RATE["tokens"] + elapsed * RAG_EMBED_TPM / 60.0)
+            wait = 0.0
+            if RAG_EMBED_RPM > 0 and _EMBED_RATE["requests"] < 1:
+                wait = (1 - _EMBED_RATE["requests"]) * 60.0 / RAG_EMBED_RPM
+            if RAG_EMBED_TPM > 0 and _EMBED_RATE["tokens"] < tokens:
+                wait = max(wait, (tokens - _EMBED_RATE["tokens"]) * 60.0 / RAG_EMBED_TPM)
+            if wait <= 0:
+                if RAG_EMBED_RPM > 0:
+                    _EMBED_RATE["requests"] -= 1
+                if RAG_EMBED_TPM > 0:
+                    _EMBED_RATE["tokens"] -= tokens
+                waited = now - started
+                if waited > 0:
+                    _metric_observe("rag_embedding_rate_wait_seconds", waited)
+                return waited
+        if now - started + wait > RAG_EMBED_RATE_WAIT_MAX_SEC:
+            _metric_inc("rag_embedding_requests_total", outcome="rate_budget_exceeded")
+            raise HTTPException(
+                status_code=503,
+                detail="Embedding rate budget exhausted (RAG_EMBED_RPM/RAG_EMBED_TPM); retry later.",
+            )
+        sleep(min(wait, 1.0))
 
 
 def _estimate_tokens(text: str) -> int:
@@ -1135,24 +2111,244 @@ def _pack_embedding_subbatches(texts: List[str]) -> List[List[str]]:
     return batches
 
 
+def _embed_dimensions() -> Optional[int]:
+    """Embedding size for the serving collection; None means the model's native size."""
+    try:
+        recorded = (collection.metadata or {}).get("embed_dimensions")
+    except Exception:
+        recorded = None
+    dimensions = int(recorded) if isinstance(recorded, (int, float)) else RAG_EMBED_DIMENSIONS
+    return dimensions if dimensions > 0 else None
+
 def _embed_subbatch_raw(texts: List[str]):
+    dimensions = _embed_dimensions()
+    started = perf_counter()
     try:
-        return oa.embeddings.create(model=EMBED_MODEL, input=texts)
+        if dimensions:
+            resp = oa.embeddings.create(model=EMBED_MODEL, input=texts, dimensions=dimensions)
+        else:
+            resp = oa.embeddings.create(model=EMBED_MODEL, input=texts)
+        _metric_inc("rag_embedding_requests_total", outcome="ok")
+        _metric_inc("rag_embedding_inputs_total", len(texts))
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            _metric_inc("rag_embedding_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+            _metric_inc("rag_embedding_tokens_total", getattr(usage, "total_tokens", 0) or 0, kind="total")
+        return resp
     except RateLimitError as exc:
+        _metric_inc("rag_embedding_requests_total", outcome="rate_limited")
         logger.warning("OpenAI embeddings quota/rate limit error: %s", exc)
         raise HTTPException(
             status_code=503,
             detail="OpenAI embeddings quota/rate limit error. Check OPENAI_API_KEY billing/quota for the RAG service.",
         ) from exc
     except OpenAIError as exc:
+        _metric_inc("rag_embedding_requests_total", outcome="error")
         logger.exception("OpenAI embeddings request failed")
         raise HTTPException(
             status_code=502,
             detail=f"OpenAI embeddings request failed: {exc.__class__.__name__}",
         ) from exc
+    finally:
+        _metric_observe("rag_embedding_request_duration_seconds", perf_counter() - started)
+        _span_record("rag.embed.subbatch", started, inputs=len(texts), model=EMBED_MODEL)
+
+
+def _embed_subbatch_limited(texts: List[str]):
+    _embed_rate_acquire(sum(_estimate_tokens(text) for text in texts))
+    return _embed_subbatch_raw(texts)
+
+def _embed_subbatches_concurrent(subbatches: List[List[str]]) -> List[object]:
+    """Embed sub-batches on the shared pool; responses come back in input order."""
+    if len(subbatches) <= 1 or RAG_EMBED_CONCURRENCY <= 1:
+        return [_embed_subbatch_limited(batch) for batch in subbatches]
+    futures = [_EMBED_EXECUTOR.submit(copy_context().run, _embed_subbatch_limited, batch) for batch in subbatches]
+    try:
+        return [future.result() for future in futures]
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+_CHUNK_EMBED_STORE_LOCAL = local()
+_CHUNK_EMBED_STORE_LOCK = Lock()
+_CHUNK_EMBED_STORE_STATS = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0, "errors": 0}
+
+def _chunk_embed_store_key(text: str, dimensions: Optional[int]) -> str:
+    raw = f"{EMBED_MODEL}\x00{dimensions or 0}\x00{text}".encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()
 
+def _chunk_embed_store_conn() -> Optional[sqlite3.Connection]:
+    if not RAG_CHUNK_EMBED_STORE_PATH:
+        return None
+    conn = getattr(_CHUNK_EMBED_STORE_LOCAL, "conn", None)
+    if conn is None:
+        path = Path(RAG_CHUNK_EMBED_STORE_PATH).resolve()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dimensions INTEGER NOT NULL, "
+            "used_at REAL NOT NULL, bytes INTEGER NOT NULL, embedding BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunk_embeddings_used ON chunk_embeddings(used_at)")
+        _CHUNK_EMBED_STORE_LOCAL.conn = conn
+    return conn
+
+def _chunk_embed_store_get(keys: List[str]) -> Dict[str, List[float]]:
+    """Stored vectors for ``keys``; hits get their ``used_at`` refreshed for LRU eviction."""
+    found: Dict[str, List[float]] = {}
+    unique = list(dict.fromkeys(keys))
+    started = perf_counter()
+    try:
+        conn = _chunk_embed_store_conn()
+        if conn is None or not unique:
+            return found
+        for offset in range(0, len(unique), 500):
+            part = unique[offset:offset + 500]
+            marks = ",".join("?" * len(part))
+            for key, blob in conn.execute(f"SELECT key, embedding FROM chunk_embeddings WHERE key IN ({marks})", part):
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        if found:
+            now = time()
+            conn.executemany("UPDATE chunk_embeddings SET used_at = ? WHERE key = ?", [(now, key) for key in found])
+    except sqlite3.Error as exc:
+        _CHUNK_EMBED_STORE_STATS["errors"] += 1
+        logger.warning("[rag][embed-store] read failed: %s", exc.__class__.__name__)
+    finally:
+        _span_record("rag.embed.store.get", started, keys=len(unique), hits=len(found))
+    return found
+
+def _chunk_embed_store_evict_unlocked(conn: sqlite3.Connection, max_bytes: int) -> int:
+    total = int(conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM chunk_embeddings").fetchone()[0])
+    evicted = 0
+    while total > max_bytes:
+        rows = conn.execute("SELECT key, bytes FROM chunk_embeddings ORDER BY used_at ASC LIMIT 1000").fetchall()
+        if not rows:
+            break
+        drop = []
+        for key, size in rows:
+            if total <= max_bytes:
+                break
+            drop.append((key,))
+            total -= int(size)
+        conn.executemany("DELETE FROM chunk_embeddings WHERE key = ?", drop)
+        evicted += len(drop)
+    _CHUNK_EMBED_STORE_STATS["evicted"] += evicted
+    return evicted
+
+def _chunk_embed_store_put(entries: Dict[str, List[float]], dimensions: Optional[int]) -> None:
+    try:
+        conn = _chunk_embed_store_conn()
+        if conn is None or not entries:
+            return
+        now = time()
+        rows = []
+        for key, embedding in entries.items():
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            rows.append((key, EMBED_MODEL, int(dimensions or 0), now, len(blob), blob))
+        with _CHUNK_EMBED_STORE_LOCK:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (key, model, dimensions, used_at, bytes, embedding) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            before = _CHUNK_EMBED_STORE_STATS["writes"]
+            _CHUNK_EMBED_STORE_STATS["writes"] += len(rows)
+            if before // 1024 != _CHUNK_EMBED_STORE_STATS["writes"] // 1024:
+                _chunk_embed_store_evict_unlocked(conn, int(RAG_CHUNK_EMBED_STORE_MAX_MB * 1024 * 1024))
+    except sqlite3.Error as exc:
+        _CHUNK_EMBED_STORE_STATS["errors"] += 1
+        logger.warning("[rag][embed-store] write failed: %s", exc.__class__.__name__)
+
+def _chunk_embed_store_compact(max_mb: Optional[float], current_model_only: bool, drop_unreferenced: bool) -> Dict[str, object]:
+    """Drop stale rows, evict down to ``max_mb`` and VACUUM the store file."""
+    conn = _chunk_embed_store_conn()
+    if conn is None:
+        raise HTTPException(409, "Chunk embedding store is disabled (set RAG_CHUNK_EMBED_STORE_PATH)")
+    path = Path(RAG_CHUNK_EMBED_STORE_PATH).resolve()
+    files = [path, path.with_name(path.name + "-wal")]
+    file_bytes_before = sum(item.stat().st_size for item in files if item.exists())
+    dimensions = _embed_dimensions()
+    removed = {"other_model": 0, "unreferenced": 0, "evicted": 0}
+    referenced: Optional[set] = None
+    if drop_unreferenced:
+        referenced = set()
+        page_size = max(16, RAG_COLLECTION_MIGRATE_PAGE)
+        offset = 0
+        while True:
+            got = collection.get(include=["documents"], limit=page_size, offset=offset) or {}
+            documents = got.get("documents") or []
+            if not documents:
+                break
+            referenced.update(_chunk_embed_store_key(str(text or ""), dimensions) for text in documents)
+            offset += len(documents)
+    with _CHUNK_EMBED_STORE_LOCK:
+        if current_model_only:
+            removed["other_model"] = conn.execute(
+                "DELETE FROM chunk_embeddings WHERE model != ? OR dimensions != ?",
+                (EMBED_MODEL, int(dimensions or 0)),
+            ).rowcount
+        if referenced is not None:
+            stale = [(key,) for (key,) in conn.execute("SELECT key FROM chunk_embeddings") if key not in referenced]
+            conn.executemany("DELETE FROM chunk_embeddings WHERE key = ?", stale)
+            removed["unreferenced"] = len(stale)
+        limit_mb = RAG_CHUNK_EMBED_STORE_MAX_MB if max_mb is None else max_mb
+        removed["evicted"] = _chunk_embed_store_evict_unlocked(conn, int(limit_mb * 1024 * 1024))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+    return {
+        "removed": removed,
+        "file_bytes_before": file_bytes_before,
+        "file_bytes_after": sum(item.stat().st_size for item in files if item.exists()),
+        "chunk_embed_store": _chunk_embed_store_status(),
+    }
 
-def _embed_batch_with_usage(texts: List[str]) -> Dict[str, object]:
+def _chunk_embed_store_status() -> Dict[str, object]:
+    status: Dict[str, object] = {
+        "enabled": bool(RAG_CHUNK_EMBED_STORE_PATH),
+        "max_mb": RAG_CHUNK_EMBED_STORE_MAX_MB,
+        **_CHUNK_EMBED_STORE_STATS,
+    }
+    if not RAG_CHUNK_EMBED_STORE_PATH:
+        return status
+    try:
+        conn = _chunk_embed_store_conn()
+        rows, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM chunk_embeddings").fetchone()
+        status.update({"entries": int(rows), "vector_bytes": int(size)})
+    except sqlite3.Error as exc:
+        status["error"] = exc.__class__.__name__
+    return status
+
+def _embed_batch_with_usage(texts: List[str], *, use_store: bool = False) -> Dict[str, object]:
+    """Embed ``texts`` in order; ``use_store`` serves unchanged chunk text from the chunk store.
+
+    ``embedding_input_count``, ``text_chars`` and the token counts describe only
+    what was sent to OpenAI; ``embedding_store_hits`` counts reused vectors.
+    """
+    if use_store and RAG_CHUNK_EMBED_STORE_PATH and texts:
+        dimensions = _embed_dimensions()
+        keys = [_chunk_embed_store_key(text, dimensions) for text in texts]
+        stored = _chunk_embed_store_get(keys)
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in stored:
+                missing.setdefault(key, text)
+        hits = len(texts) - sum(1 for key in keys if key in missing)
+        _CHUNK_EMBED_STORE_STATS["hits"] += hits
+        _CHUNK_EMBED_STORE_STATS["misses"] += len(missing)
+        _metric_inc("rag_chunk_embedding_store_total", hits, result="hit")
+        _metric_inc("rag_chunk_embedding_store_total", len(missing), result="miss")
+        result = _embed_batch_with_usage(list(missing.values()))
+        fresh = dict(zip(missing.keys(), result.get("embeddings") or []))
+        _chunk_embed_store_put(fresh, dimensions)
+        result["embeddings"] = [stored[key] if key in stored else fresh[key] for key in keys]
+        result["embedding_store_hits"] = hits
+        result["embedding_store_misses"] = len(texts) - hits
+        if not missing:
+            result.update({"prompt_tokens": 0, "total_tokens": 0, "cost_read_directly": True})
+        return result
     if not texts:
         return {
             "embeddings": [],
@@ -1172,8 +2368,7 @@ def _embed_batch_with_usage(texts: List[str]) -> Dict[str, object]:
     total_tokens = 0
     usage_seen = False
     resolved_model = EMBED_MODEL
-    for batch in subbatches:
-        resp = _embed_subbatch_raw(batch)
+    for resp in _embed_subbatches_concurrent(subbatches):
         embeddings.extend(d.embedding for d in resp.data)
         resolved_model = getattr(resp, "model", EMBED_MODEL) or EMBED_MODEL
         usage = getattr(resp, "usage", None)
@@ -1197,6 +2392,279 @@ def _embed_batch_with_usage(texts: List[str]) -> Dict[str, object]:
 def _embed_batch(texts: List[str]) -> List[List[float]]:
     return list(_embed_batch_with_usage(texts).get("embeddings") or [])
 
+_QUERY_EMBED_CACHE: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = OrderedDict()
+_QUERY_EMBED_CACHE_LOCK = Lock()
+_QUERY_EMBED_CACHE_STATS = {"hits": 0, "misses": 0, "disk_hits": 0, "disk_errors": 0}
+_QUERY_EMBED_DISK_LOCAL = local()
+_QUERY_EMBED_DISK_WRITES = 0
+
+def _query_embed_cache_key(query: str) -> Tuple[str, str]:
+    normalized = unicodedata.normalize("NFC", str(query or ""))
+    dimensions = _embed_dimensions()
+    model = f"{EMBED_MODEL}@{dimensions}" if dimensions else EMBED_MODEL
+    return (model, re.sub(r"\s+", " ", normalized).strip())
+
+def _query_embed_disk_conn() -> Optional[sqlite3.Connection]:
+    if not RAG_QUERY_EMBED_CACHE_PATH:
+        return None
+    conn = getattr(_QUERY_EMBED_DISK_LOCAL, "conn", None)
+    if conn is None:
+        path = Path(RAG_QUERY_EMBED_CACHE_PATH).resolve()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "model TEXT NOT NULL, query TEXT NOT NULL, created_at REAL NOT NULL, "
+            "embedding BLOB NOT NULL, PRIMARY KEY (model, query))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings(created_at)")
+        _QUERY_EMBED_DISK_LOCAL.conn = conn
+    return conn
+
+def _query_embed_disk_get(key: Tuple[str, str], now: float) -> Optional[Tuple[float, List[float]]]:
+    try:
+        conn = _query_embed_disk_conn()
+        if conn is None:
+            return None
+        row = conn.execute(
+            "SELECT created_at, embedding FROM query_embeddings WHERE model = ? AND query = ?",
+            key,
+        ).fetchone()
+    except sqlite3.Error as exc:
+        _QUERY_EMBED_CACHE_STATS["disk_errors"] += 1
+        logger.warning("[rag][embed-cache] disk read failed: %s", exc.__class__.__name__)
+        return None
+    if row is None or now - float(row[0]) > RAG_QUERY_EMBED_CACHE_TTL_SEC:
+        return None
+    return float(row[0]), np.frombuffer(row[1], dtype=np.float32).tolist()
+
+def _query_embed_disk_put(key: Tuple[str, str], created_at: float, embedding: List[float]) -> None:
+    global _QUERY_EMBED_DISK_WRITES
+    try:
+        conn = _query_embed_disk_conn()
+        if conn is None:
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO query_embeddings (model, query, created_at, embedding) VALUES (?, ?, ?, ?)",
+            (key[0], key[1], created_at, np.asarray(embedding, dtype=np.float32).tobytes()),
+        )
+        _QUERY_EMBED_DISK_WRITES += 1
+        if _QUERY_EMBED_DISK_WRITES % 256 == 0:
+            conn.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?",
+                (created_at - RAG_QUERY_EMBED_CACHE_TTL_SEC,),
+            )
+            conn.execute(
+                "DELETE FROM query_embeddings WHERE rowid IN ("
+                "SELECT rowid FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (max(0, RAG_QUERY_EMBED_CACHE_DISK_MAX),),
+            )
+    except sqlite3.Error as exc:
+        _QUERY_EMBED_CACHE_STATS["disk_errors"] += 1
+        logger.warning("[rag][embed-cache] disk write failed: %s", exc.__class__.__name__)
+
+def _query_embed_cache_get(key: Tuple[str, str]) -> Optional[List[float]]:
+    now = time()
+    with _QUERY_EMBED_CACHE_LOCK:
+        entry = _QUERY_EMBED_CACHE.get(key)
+        if entry is not None:
+            if now - entry[0] <= RAG_QUERY_EMBED_CACHE_TTL_SEC:
+                _QUERY_EMBED_CACHE.move_to_end(key)
+                return entry[1]
+            del _QUERY_EMBED_CACHE[key]
+    entry = _query_embed_disk_get(key, now)
+    if entry is None:
+        return None
+    _QUERY_EMBED_CACHE_STATS["disk_hits"] += 1
+    _query_embed_cache_put(key, entry[1], created_at=entry[0], persist=False)
+    return entry[1]
+
+def _query_embed_cache_put(
+    key: Tuple[str, str],
+    embedding: List[float],
+    *,
+    created_at: Optional[float] = None,
+    persist: bool = True,
+) -> None:
+    created = time() if created_at is None else created_at
+    with _QUERY_EMBED_CACHE_LOCK:
+        _QUERY_EMBED_CACHE[key] = (created, embedding)
+        _QUERY_EMBED_CACHE.move_to_end(key)
+        while len(_QUERY_EMBED_CACHE) > RAG_QUERY_EMBED_CACHE_SIZE:
+            _QUERY_EMBED_CACHE.popitem(last=False)
+    if persist:
+        _query_embed_disk_put(key, created, embedding)
+
+def _query_embed_cache_status() -> Dict[str, object]:
+    with _QUERY_EMBED_CACHE_LOCK:
+        size = len(_QUERY_EMBED_CACHE)
+    return {
+        "enabled": RAG_QUERY_EMBED_CACHE_SIZE > 0,
+        "size": size,
+        "max_size": RAG_QUERY_EMBED_CACHE_SIZE,
+        "ttl_sec": RAG_QUERY_EMBED_CACHE_TTL_SEC,
+        "persistent": bool(RAG_QUERY_EMBED_CACHE_PATH),
+        **_QUERY_EMBED_CACHE_STATS,
+    }
+
+def _embed_queries_with_usage(queries: List[str]) -> Dict[str, object]:
+    """Embed several search queries with one upstream call for the cache misses.
+
+    ``embeddings`` stays aligned with ``queries``; hits are counted in
+    ``embedding_cache_hits`` and only the misses are sent to OpenAI.
+    """
+    use_cache = RAG_QUERY_EMBED_CACHE_SIZE > 0
+    keys = [_query_embed_cache_key(query) for query in queries]
+    embeddings: List[Optional[List[float]]] = [None] * len(queries)
+    missing: Dict[Tuple[str, str], List[int]] = {}
+    for index, key in enumerate(keys):
+        cached = _query_embed_cache_get(key) if use_cache and key[1] else None
+        if cached is not None:
+            embeddings[index] = cached
+        else:
+            missing.setdefault(key if key[1] else ("", str(index)), []).append(index)
+    hits = len(queries) - sum(len(indexes) for indexes in missing.values())
+    if use_cache:
+        _QUERY_EMBED_CACHE_STATS["hits"] += hits
+        _QUERY_EMBED_CACHE_STATS["misses"] += len(missing)
+    miss_keys = list(missing.keys())
+    result = _embed_batch_with_usage([queries[missing[key][0]] for key in miss_keys])
+    for key, embedding in zip(miss_keys, result.get("embeddings") or []):
+        for index in missing[key]:
+            embeddings[index] = embedding
+        if use_cache and key[0]:
+            _query_embed_cache_put(key, list(embedding))
+    result["embeddings"] = embeddings
+    result["embedding_cache_hits"] = hits
+    result["embedding_cache"] = "disabled" if not use_cache else ("hit" if not miss_keys else "miss")
+    if not miss_keys:
+        result["cost_read_directly"] = True
+    return result
+
+_COLLECTION_GENERATION = 0
+_COLLECTION_GENERATION_LOCK = Lock()
+
+def _bump_collection_generation() -> int:
+    """Invalidate cached search results after any collection write."""
+    global _COLLECTION_GENERATION
+    with _COLLECTION_GENERATION_LOCK:
+        _COLLECTION_GENERATION += 1
+        return _COLLECTION_GENERATION
+
+_QUERY_EMBED_BATCH_LOCK = Lock()
+_QUERY_EMBED_BATCH: Dict[str, object] = {"open": None, "active": 0}
+
+def _embed_query_batched(query: str) -> Dict[str, object]:
+    """Embed one query, sharing the OpenAI call with queries from concurrent requests.
+
+    The first caller opens a batch and, when other query embeddings are in
+    flight, waits RAG_QUERY_EMBED_BATCH_WINDOW_MS for more texts (identical
+    texts share one input). Usage is split between the callers in proportion to
+    their estimated tokens; the caller that sent the request carries
+    ``embedding_calls``.
+    """
+    if RAG_QUERY_EMBED_BATCH_WINDOW_MS <= 0:
+        return _embed_batch_with_usage([query])
+    started = perf_counter()
+    weight = _estimate_tokens(query)
+    with _QUERY_EMBED_BATCH_LOCK:
+        _QUERY_EMBED_BATCH["active"] += 1
+        batch = _QUERY_EMBED_BATCH["open"]
+        leader = batch is None
+        if leader:
+            batch = {"texts": [], "slots": {}, "weights": [], "full": Event(), "done": Event(), "result": None, "error": None}
+            _QUERY_EMBED_BATCH["open"] = batch
+            busy = _QUERY_EMBED_BATCH["active"] > 1
+        batch["weights"].append(weight)
+        index = batch["slots"].get(query)
+        if index is None:
+            index = batch["slots"][query] = len(batch["texts"])
+            batch["texts"].append(query)
+        if len(batch["texts"]) >= max(1, RAG_QUERY_EMBED_BATCH_MAX):
+            if _QUERY_EMBED_BATCH["open"] is batch:
+                _QUERY_EMBED_BATCH["open"] = None
+            batch["full"].set()
+    try:
+        if leader:
+            if busy:
+                batch["full"].wait(RAG_QUERY_EMBED_BATCH_WINDOW_MS / 1000.0)
+            with _QUERY_EMBED_BATCH_LOCK:
+                if _QUERY_EMBED_BATCH["open"] is batch:
+                    _QUERY_EMBED_BATCH["open"] = None
+            try:
+                batch["result"] = _embed_batch_with_usage(list(batch["texts"]))
+                _metric_inc("rag_query_embedding_batches_total")
+                _metric_inc("rag_query_embedding_batched_texts_total", len(batch["texts"]))
+            except BaseException as exc:
+                batch["error"] = exc
+            finally:
+                batch["done"].set()
+        else:
+            batch["done"].wait()
+    finally:
+        with _QUERY_EMBED_BATCH_LOCK:
+            _QUERY_EMBED_BATCH["active"] -= 1
+    if batch["error"] is not None:
+        raise batch["error"]
+    result = batch["result"]
+    weights = batch["weights"]
+    if len(weights) == 1:
+        return {**result, "embeddings": list(result["embeddings"]), "latency_ms": (perf_counter() - started) * 1000}
+    share = weight / max(1, sum(weights))
+
+    def _split(value: Optional[int]) -> Optional[int]:
+        return None if value is None else int(round(value * share))
+
+    return {
+        "embeddings": [result["embeddings"][index]],
+        "model": result.get("model"),
+        "prompt_tokens": _split(result.get("prompt_tokens")),
+        "total_tokens": _split(result.get("total_tokens")),
+        "latency_ms": (perf_counter() - started) * 1000,
+        "embedding_input_count": 1,
+        "embedding_calls": int(result.get("embedding_calls") or 0) if leader else 0,
+        "text_chars": len(query),
+        "cost_read_directly": False,
+        "embedding_batch_size": len(weights),
+    }
+
+def _embed_query_with_usage(query: str) -> Dict[str, object]:
+    """Embed a single search query, serving repeats from the query cache.
+
+    Hits return the cached vector with zero tokens and ``embedding_calls=0`` so
+    the cost log reflects what was actually sent to OpenAI.
+    """
+    if RAG_QUERY_EMBED_CACHE_SIZE <= 0:
+        result = _embed_query_batched(query)
+        result["embedding_cache"] = "disabled"
+        return result
+    started = perf_counter()
+    key = _query_embed_cache_key(query)
+    cached = _query_embed_cache_get(key) if key[1] else None
+    if cached is not None:
+        _QUERY_EMBED_CACHE_STATS["hits"] += 1
+        return {
+            "embeddings": [cached],
+            "model": EMBED_MODEL,
+            "prompt_tokens": 0,
+            "total_tokens": 0,
+            "latency_ms": (perf_counter() - started) * 1000,
+            "embedding_input_count": 0,
+            "embedding_calls": 0,
+            "text_chars": 0,
+            "cost_read_directly": True,
+            "embedding_cache": "hit",
+        }
+    _QUERY_EMBED_CACHE_STATS["misses"] += 1
+    result = _embed_query_batched(query)
+    embeddings = list(result.get("embeddings") or [])
+    if embeddings and key[1]:
+        _query_embed_cache_put(key, list(embeddings[0]))
+    result["embedding_cache"] = "miss"
+    return result
+
 # --------------------
 # Schemas
 # --------------------
@@ -1681,6 +3149,12 @@ def clean_include(include):
             cleaned.append(s)
     return cleaned
 
+def _normalize_search_view(value) -> str:
+    view = str(value or "full").strip().lower()
+    if view not in SEARCH_VIEWS:
+        raise ValueError(f"view must be one of {', '.join(SEARCH_VIEWS)}")
+    return view
+
 class SearchIn(BaseModel):
     query: str
     top_k: int = 5
@@ -1688,6 +3162,18 @@ class SearchIn(BaseModel):
     where: Optional[dict] = None
     include: Optional[List[str]] = None
     retrievers: Optional[List[str]] = None
+    # Extra token distance allowed between the words of an exact_phrase match (0 = adjacent).
+    phrase_slop: int = Field(default=0, ge=0, le=20)
+    # Response projection: "full", "compact" or "ids_only"; ``fields`` picks result keys explicitly.
+    view: str = "full"
+    fields: Optional[List[str]] = Field(default=None, max_length=120)
+    # Add the per-stage ``timings`` block to the response (always measured and tracked).
+    timings: bool = False
+
+    @field_validator("view")
+    @classmethod
+    def validate_view(cls, value):
+        return _normalize_search_view(value)
 
     @field_validator("include")
     @classmethod
@@ -1701,6 +3187,97 @@ class SearchIn(BaseModel):
                 out.append(s)
         return out
 
+class SearchBatchQuery(BaseModel):
+    query: str
+    top_k: Optional[int] = None
+    filterDocId: Optional[str] = None
+    # Merged over the batch-level ``where``; per-query keys win.
+    where: Optional[dict] = None
+    retrievers: Optional[List[str]] = None
+    phrase_slop: Optional[int] = Field(default=None, ge=0, le=20)
+
+class SearchBatchIn(BaseModel):
+    queries: List[SearchBatchQuery]
+    top_k: int = 5
+    filterDocId: Optional[str] = None
+    where: Optional[dict] = None
+    include: Optional[List[str]] = None
+    retrievers: Optional[List[str]] = None
+    phrase_slop: int = Field(default=0, ge=0, le=20)
+    # Also return one reciprocal-rank-fused list across all queries.
+    fuse: bool = False
+    fused_top_k: Optional[int] = Field(default=None, ge=1, le=200)
+    view: str = "full"
+    fields: Optional[List[str]] = Field(default=None, max_length=120)
+
+    @field_validator("view")
+    @classmethod
+    def validate_view(cls, value):
+        return _normalize_search_view(value)
+
+    @field_validator("queries", mode="before")
+    @classmethod
+    def validate_queries(cls, value):
+        items = [{"query": item} if isinstance(item, str) else item for item in list(value or [])]
+        if not items:
+            raise ValueError("queries must not be empty")
+        if len(items) > RAG_SEARCH_BATCH_MAX_QUERIES:
+            raise ValueError(f"at most {RAG_SEARCH_BATCH_MAX_QUERIES} queries per batch")
+        return items
+
+    def search_inputs(self) -> List[SearchIn]:
+        out = []
+        for item in self.queries:
+            where = {**(self.where or {}), **(item.where or {})} if (self.where or item.where) else None
+            out.append(SearchIn(
+                query=item.query,
+                top_k=item.top_k or self.top_k,
+                filterDocId=item.filterDocId or self.filterDocId,
+                where=where,
+                include=self.include,
+                retrievers=item.retrievers or self.retrievers,
+                phrase_slop=self.phrase_slop if item.phrase_slop is None else item.phrase_slop,
+            ))
+        return out
+
+class CollectionMigrateIn(BaseModel):
+    space: str = RAG_HNSW_SPACE
+    m: int = Field(default=RAG_HNSW_M, ge=2, le=128)
+    construction_ef: int = Field(default=RAG_HNSW_CONSTRUCTION_EF, ge=1, le=2000)
+    search_ef: int = Field(default=RAG_HNSW_SEARCH_EF, ge=1, le=2000)
+    # Shorten stored text-embedding-3-* vectors (truncate + L2-normalise).
+    dimensions: Optional[int] = Field(default=None, ge=8, le=4096)
+    # False builds the collection for /collection/benchmark without serving from it.
+    activate: bool = True
+    drop_previous: bool = False
+
+    @field_validator("space")
+    @classmethod
+    def validate_space(cls, value):
+        space = str(value or "").strip().lower()
+        if space not in HNSW_SPACES:
+            raise ValueError(f"space must be one of {', '.join(HNSW_SPACES)}")
+        return space
+
+class CollectionBenchmarkIn(BaseModel):
+    collection: Optional[str] = None
+    k: int = Field(default=10, ge=1, le=100)
+    # Stored vectors used as queries when ``queries`` is empty.
+    sample: int = Field(default=50, ge=1, le=1000)
+    queries: Optional[List[str]] = Field(default=None, max_length=200)
+    search_ef: Optional[List[int]] = Field(default=None, max_length=20)
+    # Also score exact search on vectors shortened to these sizes against full-size exact search.
+    dimensions: Optional[List[int]] = Field(default=None, max_length=20)
+    seed: int = 0
+
+class ChunkEmbedStoreCompactIn(BaseModel):
+    # Evict least recently used vectors down to this size (default RAG_CHUNK_EMBED_STORE_MAX_MB).
+    max_mb: Optional[float] = Field(default=None, ge=0)
+    # Drop vectors made with another model or dimension count.
+    current_model_only: bool = True
+    # Drop vectors whose text is no longer a chunk in the serving collection.
+    drop_unreferenced: bool = False
+
 # --------------------
 # Core ingest (shared)
 # --------------------
@@ -1771,7 +3348,21 @@ def _section_for_page(section_index: List[Dict[str, object]], page_num: Optional
             return section
     return None
 
-def _build_ingest_payload(doc_id: str, text_or_pages, meta_common: Dict) -> Dict[str, object]:
+def _embedding_payload_fields(embed_result: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "embeddings": list(embed_result.get("embeddings") or []),
+        "embedding_model": embed_result.get("model"),
+        "prompt_tokens": embed_result.get("prompt_tokens"),
+        "total_tokens": embed_result.get("total_tokens"),
+        "embedding_latency_ms": embed_result.get("latency_ms"),
+        "embedding_input_count": embed_result.get("embedding_input_count"),
+        "text_chars": embed_result.get("text_chars"),
+        "cost_read_directly": embed_result.get("cost_read_directly"),
+        "embedding_store_hits": embed_result.get("embedding_store_hits"),
+        "embedding_store_misses": embed_result.get("embedding_store_misses"),
+    }
+
+def _build_ingest_payload(doc_id: str, text_or_pages, meta_common: Dict, embed: bool = True) -> Dict[str, object]:
     meta = build_rag_metadata(meta_common, doc_id=doc_id)
     title = (meta.title or "").strip()
     description = (meta.description or "").strip()
@@ -1858,6 +3449,7 @@ def _build_ingest_payload(doc_id: str, text_or_pages, meta_common: Dict) -> Dict
                     pass
         # rough approximation when not using tokens
         return max(1, len(s) // 4)
+    chunk_started = perf_counter()
     if isinstance(text_or_pages, list) and text_or_pages and isinstance(text_or_pages[0], tuple):
         full_text = _clean_text(" ".join(t or "" for _, t in text_or_pages))
         # Decide based on mode+limit unless ALWAYS_CHUNK is set
@@ -1889,6 +3481,7 @@ def _build_ingest_payload(doc_id: str, text_or_pages, meta_common: Dict) -> Dict
         else:
             chunks = _split_chunks(text)
             page_nums = [None] * len(chunks)
+    _span_record("rag.chunk", chunk_started, doc_id=doc_id, chunks=len(chunks))
 
     if not chunks:
         return {
@@ -2010,22 +3603,17 @@ def _build_ingest_payload(doc_id: str, text_or_pages, meta_common: Dict) -> Dict
                 cleaned[k] = v2
         metadatas.append(cleaned)
 
-    embed_result = _embed_batch_with_usage(final_texts)
-    embeddings = list(embed_result.get("embeddings") or [])
-    return {
+    payload = {
         "count": len(final_texts),
         "documents": final_texts,
         "metadatas": metadatas,
         "ids": ids,
-        "embeddings": embeddings,
-        "embedding_model": embed_result.get("model"),
-        "prompt_tokens": embed_result.get("prompt_tokens"),
-        "total_tokens": embed_result.get("total_tokens"),
-        "embedding_latency_ms": embed_result.get("latency_ms"),
-        "embedding_input_count": embed_result.get("embedding_input_count"),
-        "text_chars": embed_result.get("text_chars"),
-        "cost_read_directly": embed_result.get("cost_read_directly"),
+        "lexical_fields": [_lexical_index_fields(md, text) for md, text in zip(metadatas, final_texts)],
+        "positional_ids": True,
     }
+    if embed:
+        payload.update(_embedding_payload_fields(_embed_batch_with_usage(final_texts, use_store=True)))
+    return payload
 
 def _safe_chunk_id_segment(value: object) -> str:
     raw = str(value or "").strip().lower()
@@ -2183,7 +3771,7 @@ def _build_chunk_metadata_entry(
 
     return merged
 
-def _build_explicit_chunk_payload(doc_id: str, chunks: List["IngestTextChunk"], meta_common: Dict) -> Dict[str, object]:
+def _build_explicit_chunk_payload(doc_id: str, chunks: List["IngestTextChunk"], meta_common: Dict, embed: bool = True) -> Dict[str, object]:
     final_texts: List[str] = []
     metadatas: List[Dict[str, object]] = []
     ids: List[str] = []
@@ -2224,85 +3812,203 @@ def _build_explicit_chunk_payload(doc_id: str, chunks: List["IngestTextChunk"],
             "embeddings": [],
         }
 
-    embed_result = _embed_batch_with_usage(final_texts)
-    embeddings = list(embed_result.get("embeddings") or [])
-    return {
+    payload = {
         "count": len(final_texts),
         "documents": final_texts,
         "metadatas": metadatas,
         "ids": ids,
-        "embeddings": embeddings,
-        "embedding_model": embed_result.get("model"),
-        "prompt_tokens": embed_result.get("prompt_tokens"),
-        "total_tokens": embed_result.get("total_tokens"),
-        "embedding_latency_ms": embed_result.get("latency_ms"),
-        "embedding_input_count": embed_result.get("embedding_input_count"),
-        "text_chars": embed_result.get("text_chars"),
-        "cost_read_directly": embed_result.get("cost_read_directly"),
+        "lexical_fields": [_lexical_index_fields(md, text) for md, text in zip(metadatas, final_texts)],
+        "positional_ids": False,
     }
+    if embed:
+        payload.update(_embedding_payload_fields(_embed_batch_with_usage(final_texts, use_store=True)))
+    return payload
+
+_CHUNK_DIFF_IGNORED_META = {"createdAt"}
+
+def _chunk_metadata_changed(stored: Optional[Dict[str, object]], fresh: Dict[str, object]) -> bool:
+    stored = {k: v for k, v in (stored or {}).items() if k not in _CHUNK_DIFF_IGNORED_META}
+    return stored != {k: v for k, v in fresh.items() if k not in _CHUNK_DIFF_IGNORED_META}
+
+def _match_positional_chunk_ids(
+    ids: List[str],
+    documents: List[object],
+    metadatas: List[Dict[str, object]],
+    stored: Dict[str, Tuple[object, Dict[str, object]]],
+) -> List[str]:
+    """Map ``doc_id:i:hash`` ids onto stored ids so shifted or re-worded chunks are not re-created.
+
+    A chunk keeps the stored id with the same id, else one with the same text
+    (an inserted paragraph shifts ``i`` for the whole tail), else one at the
+    same ``chunk_index`` (the paragraph was re-worded in place).
+    """
+    matched: Dict[int, str] = {index: chunk_id for index, chunk_id in enumerate(ids) if chunk_id in stored}
+    used = set(matched.values())
+    by_text: Dict[object, List[str]] = {}
+    for chunk_id, (document, _) in stored.items():
+        if chunk_id not in used:
+            by_text.setdefault(document, []).append(chunk_id)
+    for index, document in enumerate(documents):
+        if index not in matched and by_text.get(document):
+            matched[index] = by_text[document].pop(0)
+            used.add(matched[index])
+    by_position: Dict[object, str] = {}
+    for chunk_id, (_, metadata) in stored.items():
+        position = metadata.get("chunk_index")
+        if chunk_id not in used and position is not None:
+            by_position.setdefault(position, chunk_id)
+    for index, metadata in enumerate(metadatas):
+        if index not in matched and metadata.get("chunk_index") in by_position:
+            matched[index] = by_position.pop(metadata.get("chunk_index"))
+    return [matched.get(index, chunk_id) for index, chunk_id in enumerate(ids)]
 
 def _replace_document_vectors_payload(
     doc_id: str,
     payload: Dict[str, object],
     observability: Optional[Dict[str, object]] = None,
-) -> int:
-    def _safe_existing_list(key: str) -> List[object]:
-        if not isinstance(existing, dict):
-            return []
-        value = existing.get(key)
-        if value is None:
-            return []
-        try:
-            return list(value)
-        except TypeError:
-            return []
+) -> Dict[str, int]:
+    """Bring the stored chunks of ``doc_id`` in line with ``payload`` by diffing.
+
+    Chunks are matched by id and, when the payload's ids are derived from the
+    chunk position (``positional_ids``), also by unchanged text and then by
+    ``chunk_index``; matched chunks keep their stored id. New or re-worded
+    chunks are embedded and upserted, chunks whose text is unchanged only get
+    their metadata updated when it differs, and chunks missing from
+    ``payload`` are deleted. Vectors in ``payload`` are not needed (build it
+    with ``embed=False``).
+    """
+    ids = [str(chunk_id) for chunk_id in payload["ids"]]
+    documents = list(payload["documents"])
+    metadatas = list(payload["metadatas"])
+    lexical_fields = payload.get("lexical_fields")
 
     existing = None
     try:
-        existing = collection.get(where={"doc_id": doc_id}, include=["documents", "metadatas", "embeddings"], limit=100000)
+        started = perf_counter()
+        existing = collection.get(where={"doc_id": doc_id}, include=["documents", "metadatas"], limit=100000)
+        _chroma_observe("get", started)
     except Exception:
-        existing = None
+        logger.warning("[rag][ingest] could not read stored chunks for doc_id=%s; replacing all", doc_id)
+    stored: Dict[str, Tuple[object, Dict[str, object]]] = {}
+    if isinstance(existing, dict):
+        existing_ids = list(existing.get("ids") or [])
+        existing_documents = list(existing.get("documents") or [None] * len(existing_ids))
+        existing_metadatas = list(existing.get("metadatas") or [None] * len(existing_ids))
+        for chunk_id, document, metadata in zip(existing_ids, existing_documents, existing_metadatas):
+            stored[str(chunk_id)] = (document, metadata or {})
+
+    if payload.get("positional_ids") and stored:
+        ids = _match_positional_chunk_ids(ids, documents, metadatas, stored)
+
+    embed_positions: List[int] = []
+    meta_positions: List[int] = []
+    for index, chunk_id in enumerate(ids):
+        previous = stored.get(chunk_id)
+        if previous is None or previous[0] != documents[index]:
+            embed_positions.append(index)
+        elif _chunk_metadata_changed(previous[1], metadatas[index]):
+            meta_positions.append(index)
+    keep_ids = set(ids)
+    removed_ids = [chunk_id for chunk_id in stored if chunk_id not in keep_ids]
+    counts = {
+        "inserted": len(ids),
+        "added": sum(1 for index in embed_positions if ids[index] not in stored),
+        "updated": sum(1 for index in embed_positions if ids[index] in stored),
+        "metadata_updated": len(meta_positions),
+        "unchanged": len(ids) - len(embed_positions) - len(meta_positions),
+        "removed": len(removed_ids),
+    }
 
-    existing_ids = _safe_existing_list("ids")
-    existing_documents = _safe_existing_list("documents")
-    existing_metadatas = _safe_existing_list("metadatas")
-    existing_embeddings = _safe_existing_list("embeddings")
+    embed_fields = _embedding_payload_fields(
+        _embed_batch_with_usage([documents[index] for index in embed_positions], use_store=True)
+    )
+    embeddings = embed_fields["embeddings"]
+    upsert_ids = [ids[index] for index in embed_positions]
+    meta_ids = [ids[index] for index in meta_positions]
+    meta_updates = []
+    for index in meta_positions:
+        update = dict(metadatas[index])
+        for field in stored[ids[index]][1]:
+            if field not in update:
+                update[field] = None
+        meta_updates.append(update)
+
+    touched = [chunk_id for chunk_id in upsert_ids + meta_ids + removed_ids if chunk_id in stored]
+    backup = None
+    if touched:
+        try:
+            backup = collection.get(ids=touched, include=["documents", "metadatas", "embeddings"])
+        except Exception:
+            backup = None
 
-    try:
-        if payload["count"]:
-            _log_rag_cost_usage(
-                model=payload.get("embedding_model"),
-                latency_ms=payload.get("embedding_latency_ms"),
-                prompt_tokens=payload.get("prompt_tokens"),
-                total_tokens=payload.get("total_tokens"),
-                embedding_input_count=int(payload.get("embedding_input_count") or 0),
-                text_chars=_to_int(payload.get("text_chars")),
-                chunk_count=int(payload.get("count") or 0),
-                cost_read_directly=bool(payload.get("cost_read_directly")),
-                **(observability or {}),
-            )
-        collection.delete(where={"doc_id": doc_id})
-        if payload["count"]:
-            collection.upsert(
-                documents=payload["documents"],
-                metadatas=payload["metadatas"],
-                ids=payload["ids"],
-                embeddings=payload["embeddings"],
-            )
-    except Exception:
-        if existing_ids and len(existing_ids) == len(existing_documents) == len(existing_metadatas) == len(existing_embeddings):
-            try:
+    # The cost log may POST to the mirror; keep it outside COLLECTION_WRITE_LOCK.
+    if embed_positions:
+        _log_rag_cost_usage(
+            model=embed_fields.get("embedding_model"),
+            latency_ms=embed_fields.get("embedding_latency_ms"),
+            prompt_tokens=embed_fields.get("prompt_tokens"),
+            total_tokens=embed_fields.get("total_tokens"),
+            embedding_input_count=int(embed_fields.get("embedding_input_count") or 0),
+            text_chars=_to_int(embed_fields.get("text_chars")),
+            chunk_count=len(embed_positions),
+            cost_read_directly=bool(embed_fields.get("cost_read_directly")),
+            embedding_store_hits=embed_fields.get("embedding_store_hits"),
+            embedding_store_misses=embed_fields.get("embedding_store_misses"),
+            **(observability or {}),
+        )
+
+    with COLLECTION_WRITE_LOCK:
+        _collection_note_write(doc_id)
+        try:
+            if existing is None:
+                started = perf_counter()
+                collection.delete(where={"doc_id": doc_id})
+                _chroma_observe("delete", started)
+            elif removed_ids:
+                started = perf_counter()
+                collection.delete(ids=removed_ids)
+                _chroma_observe("delete", started)
+            if upsert_ids:
+                started = perf_counter()
                 collection.upsert(
-                    documents=existing_documents,
-                    metadatas=existing_metadatas,
-                    ids=existing_ids,
-                    embeddings=existing_embeddings,
+                    documents=[documents[index] for index in embed_positions],
+                    metadatas=[metadatas[index] for index in embed_positions],
+                    ids=upsert_ids,
+                    embeddings=embeddings,
                 )
+                _chroma_observe("upsert", started)
+            if meta_ids:
+                started = perf_counter()
+                collection.update(ids=meta_ids, metadatas=meta_updates)
+                _chroma_observe("update", started)
+        except Exception:
+            try:
+                added_ids = [chunk_id for chunk_id in upsert_ids if chunk_id not in stored]
+                if added_ids:
+                    collection.delete(ids=added_ids)
+                if isinstance(backup, dict) and backup.get("ids"):
+                    collection.upsert(
+                        documents=list(backup["documents"]),
+                        metadatas=list(backup["metadatas"]),
+                        ids=list(backup["ids"]),
+                        embeddings=list(backup["embeddings"]),
+                    )
             except Exception:
                 logger.exception("Failed to restore previous vectors for doc_id=%s after replace error", doc_id)
-        raise
+            raise
 
-    return int(payload["count"])
+    written = embed_positions + meta_positions
+    _search_index_replace_document(
+        doc_id,
+        [ids[index] for index in written],
+        [documents[index] for index in written],
+        [metadatas[index] for index in written],
+        [lexical_fields[index] for index in written] if lexical_fields else None,
+        keep=keep_ids,
+    )
+    _vector_sidecar_put(upsert_ids, embeddings)
+    logger.info("[rag][ingest] doc_id=%s chunks %s", doc_id, json.dumps(counts, sort_keys=True))
+    return counts
 
 def _ingest_text(doc_id: str, text_or_pages, meta_common: Dict, observability: Optional[Dict[str, object]] = None) -> int:
     payload = _build_ingest_payload(doc_id, text_or_pages, meta_common)
@@ -2317,14 +4023,22 @@ def _ingest_text(doc_id: str, text_or_pages, meta_common: Dict, observability: O
         text_chars=_to_int(payload.get("text_chars")),
         chunk_count=int(payload.get("count") or 0),
         cost_read_directly=bool(payload.get("cost_read_directly")),
+        embedding_store_hits=payload.get("embedding_store_hits"),
+        embedding_store_misses=payload.get("embedding_store_misses"),
         **(observability or {}),
     )
-    collection.upsert(
-        documents=payload["documents"],
-        metadatas=payload["metadatas"],
-        ids=payload["ids"],
-        embeddings=payload["embeddings"],
-    )
+    with COLLECTION_WRITE_LOCK:
+        _collection_note_write(doc_id)
+        started = perf_counter()
+        collection.upsert(
+            documents=payload["documents"],
+            metadatas=payload["metadatas"],
+            ids=payload["ids"],
+            embeddings=payload["embeddings"],
+        )
+        _chroma_observe("upsert", started)
+    _search_index_upsert_chunks(payload["ids"], payload["documents"], payload["metadatas"], payload.get("lexical_fields"))
+    _vector_sidecar_put(payload["ids"], payload["embeddings"])
     return int(payload["count"])
 
 def _replace_document_vectors(
@@ -2332,8 +4046,8 @@ def _replace_document_vectors(
     text_or_pages,
     meta_common: Dict,
     observability: Optional[Dict[str, object]] = None,
-) -> int:
-    payload = _build_ingest_payload(doc_id, text_or_pages, meta_common)
+) -> Dict[str, int]:
+    payload = _build_ingest_payload(doc_id, text_or_pages, meta_common, embed=False)
     return _replace_document_vectors_payload(doc_id, payload, observability=observability)
 
 def _register(doc_id: str, entry: Dict) -> None:
@@ -2748,21 +4462,93 @@ def _lexical_token_counts(text: str, limit: int = 1000) -> Dict[str, int]:
             break
     return counts
 
-def _lexical_match(query: str, md: Dict, document: str) -> Optional[Dict[str, object]]:
-    title_norm = _normalize_search_text(md.get("title") or md.get("fileName") or md.get("source_url") or "")
-    paragraph_title_norm = _normalize_search_text(md.get("paragraph_title") or "")
-    section_norm = _normalize_search_text(md.get("section") or "")
-    act_title_norm = _normalize_search_text(md.get("act_title") or "")
-    body_norm = _normalize_search_text(document[:12000])
+def _compile_lexical_query(query: str, phrase_slop: int = 0) -> Dict[str, object]:
+    """Query-side lexical features, computed once per search instead of per chunk.
+
+    ``phrase_plans`` pairs each body phrase with its indexable tokens and their
+    offsets in the phrase, for resolution against positional postings.
+    """
+    phrases = _query_phrases(query)
+    tokens = _search_tokens(query)
+    phrase_plans = []
+    for phrase in phrases:
+        if len(phrase) < 12:
+            continue
+        plan = [
+            (offset, token)
+            for offset, token in enumerate(phrase.split(" "))
+            if len(token) >= 3 and token not in LEXICAL_STOPWORDS
+        ]
+        if plan:
+            phrase_plans.append((phrase, plan))
+    return {
+        "query": query,
+        "phrases": phrases,
+        "phrase_plans": phrase_plans,
+        "phrase_slop": max(0, int(phrase_slop or 0)),
+        "tokens": tokens,
+        "token_set": frozenset(tokens),
+        "paragraph_refs": _extract_query_paragraph_refs(query),
+        "full_query": phrases[0] if phrases else _normalize_search_text(query),
+    }
+
+def _lexical_token_positions(text: str) -> Dict[str, List[int]]:
+    """Positions of indexable tokens; every token (stopwords too) advances the position."""
+    positions: Dict[str, List[int]] = {}
+    for position, token in enumerate(str(text or "").split(" ")):
+        if len(token) < 3 or token in LEXICAL_STOPWORDS:
+            continue
+        positions.setdefault(token, []).append(position)
+    return positions
+
+def _lexical_match(
+    query: str,
+    md: Dict,
+    document: str,
+    term_stats: Optional[Dict[str, object]] = None,
+    compiled: Optional[Dict[str, object]] = None,
+) -> Optional[Dict[str, object]]:
+    """Score one chunk for the lexical channels.
+
+    ``term_stats`` comes from the search index postings (per-token title/body
+    term frequencies, a corpus-IDF BM25 score and the ingest-time normalised
+    ``fields``). Without it the chunk text is normalised and tokenised locally,
+    which is the legacy scan behaviour.
+    """
+    fields = term_stats.get("fields") if term_stats is not None else None
+    if fields:
+        title_norm = fields["title"]
+        paragraph_title_norm = fields["paragraph_title"]
+        section_norm = fields["section"]
+        act_title_norm = fields["act_title"]
+        body_norm = fields["body"]
+        paragraph_number = fields["paragraph_number"]
+        paragraph_title_token_set = fields["paragraph_title_tokens"]
+        act_title_token_set = fields["act_title_tokens"]
+    else:
+        title_norm = _normalize_search_text(md.get("title") or md.get("fileName") or md.get("source_url") or "")
+        paragraph_title_norm = _normalize_search_text(md.get("paragraph_title") or "")
+        section_norm = _normalize_search_text(md.get("section") or "")
+        act_title_norm = _normalize_search_text(md.get("act_title") or "")
+        body_norm = _normalize_search_text(document)
+        paragraph_number = _normalize_search_text(md.get("paragraph_number") or "")
+        paragraph_title_token_set = set(_search_tokens(paragraph_title_norm, limit=12))
+        act_title_token_set = set(_search_tokens(act_title_norm, limit=8))
     if not title_norm and not body_norm:
         return None
 
-    phrases = _query_phrases(query)
-    query_tokens = _search_tokens(query)
-    paragraph_refs = _extract_query_paragraph_refs(query)
-    paragraph_number = _normalize_search_text(md.get("paragraph_number") or "")
-    title_counts = _lexical_token_counts(title_norm, limit=80)
-    body_counts = _lexical_token_counts(body_norm, limit=900)
+    compiled = compiled or _compile_lexical_query(query)
+    phrase_hits = term_stats.get("phrase_hits") if term_stats is not None else None
+    phrases = compiled["phrases"]
+    query_tokens = compiled["tokens"]
+    query_token_set = compiled["token_set"]
+    paragraph_refs = compiled["paragraph_refs"]
+    if term_stats is not None:
+        title_counts = dict(term_stats.get("title_tf") or {})
+        body_counts = dict(term_stats.get("body_tf") or {})
+    else:
+        title_counts = _lexical_token_counts(title_norm, limit=80)
+        body_counts = _lexical_token_counts(body_norm, limit=900)
     title_tokens = set(title_counts.keys())
     body_tokens = set(body_counts.keys())
     channels: List[str] = []
@@ -2773,26 +4559,24 @@ def _lexical_match(query: str, md: Dict, document: str) -> Optional[Dict[str, ob
     bm25_body_matches = 0
     bm25_coverage = 0.0
 
-    full_query = phrases[0] if phrases else _normalize_search_text(query)
+    full_query = compiled["full_query"]
     if paragraph_number and paragraph_number in paragraph_refs:
         score += 16.0
         channels.append("title_match")
         if paragraph_title_norm and paragraph_title_norm in full_query:
             score += 6.0
         elif paragraph_title_norm:
-            paragraph_title_tokens = set(_search_tokens(paragraph_title_norm, limit=12))
-            if paragraph_title_tokens and paragraph_title_tokens.intersection(set(query_tokens)):
+            if paragraph_title_token_set and paragraph_title_token_set.intersection(query_token_set):
                 score += 3.5
-        if act_title_norm and any(token in set(query_tokens) for token in _search_tokens(act_title_norm, limit=8)):
+        if act_title_norm and act_title_token_set.intersection(query_token_set):
             score += 2.0
     elif paragraph_title_norm and full_query:
         if paragraph_title_norm in full_query:
             score += 8.0
             channels.append("title_match")
         elif paragraph_title_norm and paragraph_title_norm in title_norm:
-            paragraph_title_tokens = set(_search_tokens(paragraph_title_norm, limit=12))
-            overlap = len(paragraph_title_tokens.intersection(set(query_tokens)))
-            if overlap >= max(1, min(2, len(paragraph_title_tokens))):
+            overlap = len(paragraph_title_token_set.intersection(query_token_set))
+            if overlap >= max(1, min(2, len(paragraph_title_token_set))):
                 score += min(6.0, 2.5 * overlap)
                 channels.append("title_match")
     if section_norm and section_norm in full_query:
@@ -2813,14 +4597,16 @@ def _lexical_match(query: str, md: Dict, document: str) -> Optional[Dict[str, ob
             score += 4.0
             if "title_match" not in channels:
                 channels.append("title_match")
-        elif body_norm and len(phrase) >= 12 and phrase in body_norm:
+        elif body_norm and len(phrase) >= 12 and (
+            phrase in phrase_hits if phrase_hits is not None else phrase in body_norm
+        ):
             score += 3.0
             if "exact_phrase" not in channels:
                 channels.append("exact_phrase")
 
     if query_tokens:
-        title_overlap = len(set(query_tokens).intersection(title_tokens))
-        body_overlap = len(set(query_tokens).intersection(body_tokens))
+        title_overlap = len(query_token_set.intersection(title_tokens))
+        body_overlap = len(query_token_set.intersection(body_tokens))
         if title_overlap:
             score += min(4.0, title_overlap * 1.2)
         if body_overlap >= 2:
@@ -2828,18 +4614,24 @@ def _lexical_match(query: str, md: Dict, document: str) -> Optional[Dict[str, ob
         if title_overlap >= max(1, min(3, len(query_tokens))):
             if "title_match" not in channels:
                 channels.append("title_match")
-        for token in query_tokens:
-            title_freq = title_counts.get(token, 0)
-            body_freq = body_counts.get(token, 0)
-            if not title_freq and not body_freq:
-                continue
-            bm25_matches += 1
-            if title_freq:
-                bm25_title_matches += 1
-                bm25_score += RAG_BM25_TITLE_WEIGHT * (title_freq / (title_freq + RAG_BM25_TITLE_K))
-            if body_freq:
-                bm25_body_matches += 1
-                bm25_score += RAG_BM25_BODY_WEIGHT * (body_freq / (body_freq + RAG_BM25_BODY_K))
+        if term_stats is not None:
+            bm25_score = float(term_stats.get("bm25_score") or 0.0)
+            bm25_matches = int(term_stats.get("bm25_matches") or 0)
+            bm25_title_matches = int(term_stats.get("bm25_title_matches") or 0)
+            bm25_body_matches = int(term_stats.get("bm25_body_matches") or 0)
+        else:
+            for token in query_tokens:
+                title_freq = title_counts.get(token, 0)
+                body_freq = body_counts.get(token, 0)
+                if not title_freq and not body_freq:
+                    continue
+                bm25_matches += 1
+                if title_freq:
+                    bm25_title_matches += 1
+                    bm25_score += RAG_BM25_TITLE_WEIGHT * (title_freq / (title_freq + RAG_BM25_TITLE_K))
+                if body_freq:
+                    bm25_body_matches += 1
+                    bm25_score += RAG_BM25_BODY_WEIGHT * (body_freq / (body_freq + RAG_BM25_BODY_K))
         bm25_coverage = bm25_matches / max(1, len(query_tokens))
         if bm25_matches and (
             bm25_coverage >= RAG_BM25_MIN_COVERAGE
@@ -2883,17 +4675,13 @@ def _normalize_requested_retrievers(value) -> List[str]:
             out.append(cleaned)
     return out or ["dense", "title_match", "exact_phrase", "bm25"]
 
-def _search_result_from_metadata(
-    *,
-    item_id: str,
-    document: str,
-    md: Dict,
-    distance=None,
-    channels: Optional[List[str]] = None,
-    rank: Optional[int] = None,
-    lexical_score: Optional[float] = None,
-    lexical_details: Optional[Dict[str, object]] = None,
-) -> Dict[str, object]:
+def _result_skeleton(md: Dict) -> Dict[str, object]:
+    """Metadata-derived part of a search hit; depends only on the chunk's metadata.
+
+    Computed once when the chunk is written to the search index so query time
+    only attaches the chunk text, scores and ranks.
+    """
+    md = md if isinstance(md, dict) else {}
     source_path = md.get("source_path")
     file_name = None
     if source_path:
@@ -2904,22 +4692,7 @@ def _search_result_from_metadata(
     authors_val = normalize_authors(md.get("authors") or md.get("authors_list"))
     tags_val = normalize_tags(md.get("tags") or md.get("tags_list"))
     tag_tokens_val = normalize_tag_tokens(md.get("tag_tokens") or md.get("tagTokens") or tags_val)
-    retrieval_channels = channels or ["dense"]
-    primary_channel = retrieval_channels[0] if retrieval_channels else "dense"
     return {
-        "id": item_id,
-        "retriever": primary_channel,
-        "retrieval_channel": primary_channel,
-        "retrievalChannel": primary_channel,
-        "retrieval_channels": retrieval_channels,
-        "retrieval_rank": rank,
-        "lexical_score": lexical_score,
-        "bm25_score": lexical_details.get("bm25_score") if isinstance(lexical_details, dict) else None,
-        "bm25_coverage": lexical_details.get("bm25_coverage") if isinstance(lexical_details, dict) else None,
-        "bm25_matches": lexical_details.get("bm25_matches") if isinstance(lexical_details, dict) else None,
-        "bm25_title_matches": lexical_details.get("bm25_title_matches") if isinstance(lexical_details, dict) else None,
-        "bm25_body_matches": lexical_details.get("bm25_body_matches") if isinstance(lexical_details, dict) else None,
-        "bm25_query_tokens": lexical_details.get("bm25_query_tokens") if isinstance(lexical_details, dict) else None,
         "doc_id": md.get("doc_id") or md.get("docId"),
         "docId": md.get("docId") or md.get("doc_id"),
         "chunk_id": md.get("chunk_id") or md.get("chunkId"),
@@ -2992,11 +4765,42 @@ def _search_result_from_metadata(
         "administering_body": md.get("administering_body"),
         "tags": tags_val,
         "language": md.get("language"),
-        "chunk": document,
         "url": md.get("source_url"),
         "fileName": file_name,
         "source_type": md.get("source_type"),
         "page": md.get("page"),
+    }
+
+def _search_result_from_metadata(
+    *,
+    item_id: str,
+    document: str,
+    md: Dict,
+    distance=None,
+    channels: Optional[List[str]] = None,
+    rank: Optional[int] = None,
+    lexical_score: Optional[float] = None,
+    lexical_details: Optional[Dict[str, object]] = None,
+    skeleton: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
+    retrieval_channels = channels or ["dense"]
+    primary_channel = retrieval_channels[0] if retrieval_channels else "dense"
+    return {
+        "id": item_id,
+        "retriever": primary_channel,
+        "retrieval_channel": primary_channel,
+        "retrievalChannel": primary_channel,
+        "retrieval_channels": retrieval_channels,
+        "retrieval_rank": rank,
+        "lexical_score": lexical_score,
+        "bm25_score": lexical_details.get("bm25_score") if isinstance(lexical_details, dict) else None,
+        "bm25_coverage": lexical_details.get("bm25_coverage") if isinstance(lexical_details, dict) else None,
+        "bm25_matches": lexical_details.get("bm25_matches") if isinstance(lexical_details, dict) else None,
+        "bm25_title_matches": lexical_details.get("bm25_title_matches") if isinstance(lexical_details, dict) else None,
+        "bm25_body_matches": lexical_details.get("bm25_body_matches") if isinstance(lexical_details, dict) else None,
+        "bm25_query_tokens": lexical_details.get("bm25_query_tokens") if isinstance(lexical_details, dict) else None,
+        **(skeleton if skeleton is not None else _result_skeleton(md)),
+        "chunk": document,
         "distance": distance,
     }
 
@@ -3028,7 +4832,7 @@ def _apply_hybrid_ranking(results: List[Dict[str, object]]) -> None:
         lexical_rank = _to_int(item.get("lexical_rank"))
         dense_score = _hybrid_dense_score(item.get("distance")) if "dense" in channels else 0.0
         lexical_score = _hybrid_lexical_score(item.get("lexical_score")) if any(
-            channel in channels for channel in ["title_match", "exact_phrase", "bm25"]
+            channel in channels for channel in LEXICAL_RETRIEVAL_CHANNELS
         ) else 0.0
         rrf_score = 0.0
         rrf_contributions: Dict[str, float] = {}
@@ -3118,7 +4922,7 @@ def _build_channel_stats(results: List[Dict[str, object]]) -> Dict[str, object]:
         channels = item.get("retrieval_channels") if isinstance(item.get("retrieval_channels"), list) else []
         channel_set = {str(channel or "").strip() for channel in channels if str(channel or "").strip()}
         has_dense = "dense" in channel_set
-        has_lexical = any(channel in channel_set for channel in ["title_match", "exact_phrase", "bm25"])
+        has_lexical = any(channel in channel_set for channel in LEXICAL_RETRIEVAL_CHANNELS)
         if has_dense and not has_lexical:
             dense_only_count += 1
         elif has_lexical and not has_dense:
@@ -3167,142 +4971,2311 @@ def _build_channel_stats(results: List[Dict[str, object]]) -> Dict[str, object]:
         "bm25": bm25_summary,
     }
 
-def _fetch_lexical_candidates(
-    query: str,
-    chroma_where: Optional[Dict[str, object]],
-    top_k: int,
-    requested_retrievers: Optional[List[str]] = None,
-) -> List[Dict[str, object]]:
-    if not RAG_LEXICAL_SEARCH_ENABLED or not str(query or "").strip():
-        return []
-    allowed_channels = set(requested_retrievers or ["title_match", "exact_phrase", "bm25"])
-    scan_limit = max(1, min(100000, RAG_LEXICAL_SCAN_LIMIT))
+# --------------------
+# Search index (persistent lexical postings)
+# --------------------
+# One SQLite file next to the Chroma store keeps an inverted index over the
+# lexical fields of every chunk. Chunks get a stable integer ordinal; postings
+# are (term_id, field, ord, tf) rows so a query only touches the postings of its
+# own terms. Field lengths per ordinal are mirrored in memory for BM25 length
+# normalisation. Chroma stays the source of truth: the index is maintained from
+# the ingest/patch/delete paths and can always be rebuilt from the collection.
+# The normalised field text is stored with the chunk (computed once at ingest),
+# so query-time lexical scoring does no per-chunk normalisation; the short
+# fields live in memory and the body is read for the candidate pool only.
+# Body postings also carry token positions (int32, counted over every token of
+# the normalised body) so exact_phrase is resolved by postings intersection.
+# result_skeletons keeps each chunk's metadata-derived hit fields (JSON) so
+# /search does not re-normalise authors/tags/paths per hit.
+SEARCH_INDEX_SCHEMA_VERSION = "6"
+LEXICAL_INDEX_FIELDS = ("title", "body", "paragraph_title", "section", "act_title")
+LEXICAL_FIELD_IDS = {name: index for index, name in enumerate(LEXICAL_INDEX_FIELDS)}
+LEXICAL_SHORT_FIELDS = ("title", "paragraph_title", "section", "act_title", "paragraph_number")
+LEXICAL_NORM_FIELDS = LEXICAL_INDEX_FIELDS + ("paragraph_number",)
+LEXICAL_INDEX_MAX_TERMS_PER_FIELD = 200000
+SEARCH_INDEX_TABLES = (
+    "index_chunks",
+    "lexical_terms",
+    "lexical_postings",
+    "provision_index",
+    "filter_values",
+    "result_skeletons",
+)
+SEARCH_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_chunks (
+    ord INTEGER PRIMARY KEY AUTOINCREMENT,
+    chunk_id TEXT NOT NULL UNIQUE,
+    doc_id TEXT,
+    len_title INTEGER NOT NULL DEFAULT 0,
+    len_body INTEGER NOT NULL DEFAULT 0,
+    len_paragraph_title INTEGER NOT NULL DEFAULT 0,
+    len_section INTEGER NOT NULL DEFAULT 0,
+    len_act_title INTEGER NOT NULL DEFAULT 0,
+    norm_title TEXT NOT NULL DEFAULT '',
+    norm_body TEXT NOT NULL DEFAULT '',
+    norm_paragraph_title TEXT NOT NULL DEFAULT '',
+    norm_section TEXT NOT NULL DEFAULT '',
+    norm_act_title TEXT NOT NULL DEFAULT '',
+    norm_paragraph_number TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS index_chunks_doc_id ON index_chunks(doc_id);
+CREATE TABLE IF NOT EXISTS lexical_terms (
+    term_id INTEGER PRIMARY KEY,
+    term TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS lexical_postings (
+    term_id INTEGER NOT NULL,
+    field INTEGER NOT NULL,
+    ord INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    positions BLOB,
+    PRIMARY KEY (term_id, field, ord)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS lexical_postings_ord ON lexical_postings(ord);
+CREATE TABLE IF NOT EXISTS provision_index (
+    ord INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL,
+    paragraph TEXT NOT NULL,
+    subsection TEXT NOT NULL DEFAULT '',
+    point TEXT NOT NULL DEFAULT '',
+    act_keys TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS filter_values (
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    ord INTEGER NOT NULL,
+    PRIMARY KEY (field, value, ord)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS filter_values_ord ON filter_values(ord);
+CREATE TABLE IF NOT EXISTS result_skeletons (
+    ord INTEGER PRIMARY KEY,
+    skeleton BLOB NOT NULL
+);
+"""
+SEARCH_INDEX_LOCK = Lock()
+# Guards the check-and-set of ``rebuilding`` so only one rebuild wipes the tables.
+SEARCH_INDEX_REBUILD_LOCK = Lock()
+_SEARCH_INDEX_LOCAL = local()
+_SEARCH_INDEX_STATE: Dict[str, object] = {
+    "enabled": RAG_SEARCH_INDEX_ENABLED,
+    "ready": False,
+    "rebuilding": False,
+    # doc_ids written to Chroma while a rebuild pages through it (None = no rebuild).
+    "rebuild_dirty": None,
+    "error": None,
+    "lengths": np.zeros((0, len(LEXICAL_INDEX_FIELDS)), dtype=np.int32),
+    "alive": np.zeros(0, dtype=bool),
+    "short_fields": {},
+    "ord_by_id": {},
+}
+# (act key, paragraph) -> {ord: (chunk_id, subsection, point)}; act key "" holds every entry.
+_PROVISION_INDEX: Dict[Tuple[str, str], Dict[int, Tuple[str, str, str]]] = {}
+_PROVISION_KEYS_BY_ORD: Dict[int, List[Tuple[str, str]]] = {}
+
+def _search_index_conn() -> sqlite3.Connection:
+    conn = getattr(_SEARCH_INDEX_LOCAL, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(str(SEARCH_INDEX_PATH), timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _SEARCH_INDEX_LOCAL.conn = conn
+    return conn
+
+def _sql_batches(values: List[object], size: int = 900):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _search_index_set_meta_unlocked(conn: sqlite3.Connection, key: str, value: object) -> None:
+    conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+def _search_index_ensure_capacity_unlocked(ord_value: int) -> None:
+    lengths = _SEARCH_INDEX_STATE["lengths"]
+    if ord_value < len(lengths):
+        return
+    capacity = max(1024, ord_value + 1, len(lengths) * 2)
+    grown = np.zeros((capacity, len(LEXICAL_INDEX_FIELDS)), dtype=np.int32)
+    grown[: len(lengths)] = lengths
+    alive = np.zeros(capacity, dtype=bool)
+    alive[: len(lengths)] = _SEARCH_INDEX_STATE["alive"]
+    _SEARCH_INDEX_STATE["lengths"] = grown
+    _SEARCH_INDEX_STATE["alive"] = alive
+
+def _lexical_short_fields(fields: Dict[str, object]) -> Tuple[object, ...]:
+    """Compact in-memory form of the non-body normalised fields of one chunk."""
+    paragraph_title = fields.get("paragraph_title") or ""
+    act_title = fields.get("act_title") or ""
+    return (
+        *(sys.intern(fields.get(field) or "") for field in LEXICAL_SHORT_FIELDS),
+        frozenset(_search_tokens(paragraph_title, limit=12)),
+        frozenset(_search_tokens(act_title, limit=8)),
+    )
+
+def _lexical_chunk_fields(short_fields: Tuple[object, ...], body: str) -> Dict[str, object]:
+    fields: Dict[str, object] = dict(zip(LEXICAL_SHORT_FIELDS, short_fields))
+    fields["paragraph_title_tokens"] = short_fields[len(LEXICAL_SHORT_FIELDS)]
+    fields["act_title_tokens"] = short_fields[len(LEXICAL_SHORT_FIELDS) + 1]
+    fields["body"] = body or ""
+    return fields
+
+def _search_index_load_state_unlocked(conn: sqlite3.Connection) -> None:
+    with _SKELETON_CACHE_LOCK:
+        _SKELETON_CACHE.clear()
+    _SEARCH_INDEX_STATE["lengths"] = np.zeros((0, len(LEXICAL_INDEX_FIELDS)), dtype=np.int32)
+    _SEARCH_INDEX_STATE["alive"] = np.zeros(0, dtype=bool)
+    _SEARCH_INDEX_STATE["short_fields"] = {}
+    _SEARCH_INDEX_STATE["ord_by_id"] = {}
+    length_columns = ", ".join(f"len_{field}" for field in LEXICAL_INDEX_FIELDS)
+    norm_columns = ", ".join(f"norm_{field}" for field in LEXICAL_SHORT_FIELDS)
+    rows = conn.execute(f"SELECT ord, chunk_id, {length_columns}, {norm_columns} FROM index_chunks").fetchall()
+    if rows:
+        _search_index_ensure_capacity_unlocked(max(row[0] for row in rows))
+        width = len(LEXICAL_INDEX_FIELDS)
+        for row in rows:
+            _SEARCH_INDEX_STATE["lengths"][row[0]] = row[2:2 + width]
+            _SEARCH_INDEX_STATE["alive"][row[0]] = True
+            _SEARCH_INDEX_STATE["ord_by_id"][row[1]] = row[0]
+            _SEARCH_INDEX_STATE["short_fields"][row[0]] = _lexical_short_fields(
+                dict(zip(LEXICAL_SHORT_FIELDS, row[2 + width:]))
+            )
+    _filter_bitmaps_load_unlocked(conn)
+    _PROVISION_INDEX.clear()
+    _PROVISION_KEYS_BY_ORD.clear()
+    for ord_value, chunk_id, paragraph, subsection, point, act_keys in conn.execute(
+        "SELECT ord, chunk_id, paragraph, subsection, point, act_keys FROM provision_index"
+    ):
+        entry = (paragraph, subsection, point, tuple(key for key in act_keys.split("\n") if key))
+        _provision_index_put(ord_value, chunk_id, entry)
+    ready = conn.execute("SELECT value FROM index_meta WHERE key = 'ready'").fetchone()
+    _SEARCH_INDEX_STATE["ready"] = bool(ready and ready[0] == "1")
+
+def _search_index_init() -> None:
+    if not RAG_SEARCH_INDEX_ENABLED:
+        return
     try:
-        if chroma_where:
-            got = collection.get(where=chroma_where, include=["documents", "metadatas"], limit=scan_limit)
-        else:
-            got = collection.get(include=["documents", "metadatas"], limit=scan_limit)
+        conn = _search_index_conn()
+        with SEARCH_INDEX_LOCK:
+            conn.execute("CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)")
+            version = conn.execute("SELECT value FROM index_meta WHERE key = 'schema_version'").fetchone()
+            if version is None or version[0] != SEARCH_INDEX_SCHEMA_VERSION:
+                for table in SEARCH_INDEX_TABLES:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute("DELETE FROM index_meta")
+            conn.executescript(SEARCH_INDEX_SCHEMA)
+            _search_index_set_meta_unlocked(conn, "schema_version", SEARCH_INDEX_SCHEMA_VERSION)
+            _search_index_load_state_unlocked(conn)
+            if not _SEARCH_INDEX_STATE["ready"] and not _SEARCH_INDEX_STATE["alive"].any() and collection.count() == 0:
+                _search_index_set_meta_unlocked(conn, "ready", "1")
+                _SEARCH_INDEX_STATE["ready"] = True
+    except Exception as exc:
+        logger.exception("Search index init failed; lexical retrieval falls back to collection scans")
+        _SEARCH_INDEX_STATE["enabled"] = False
+        _SEARCH_INDEX_STATE["error"] = exc.__class__.__name__
+
+def _search_index_mark_stale(reason: str) -> None:
+    logger.warning("[rag][search-index] marked stale: %s", reason)
+    _SEARCH_INDEX_STATE["ready"] = False
+    _SEARCH_INDEX_STATE["error"] = reason
+    try:
+        with SEARCH_INDEX_LOCK:
+            _search_index_set_meta_unlocked(_search_index_conn(), "ready", "0")
     except Exception:
-        logger.exception("lexical retrieval failed")
-        return []
-
-    ids = got.get("ids") or []
-    docs = got.get("documents") or []
-    metas = got.get("metadatas") or []
-    scored: List[Dict[str, object]] = []
-    for i, item_id in enumerate(ids):
-        document = docs[i] if i < len(docs) and isinstance(docs[i], str) else ""
-        md = metas[i] if i < len(metas) and isinstance(metas[i], dict) else {}
-        match = _lexical_match(query, md, document)
-        if not match:
-            continue
-        channels = [item for item in list(match["channels"]) if item in allowed_channels]
-        if not channels:
-            continue
-        scored.append({
-            "id": item_id,
-            "document": document,
-            "metadata": md,
-            "score": float(match["score"]),
-            "channels": channels,
-            "bm25_score": match.get("bm25_score"),
-            "bm25_coverage": match.get("bm25_coverage"),
-            "bm25_matches": match.get("bm25_matches"),
-            "bm25_title_matches": match.get("bm25_title_matches"),
-            "bm25_body_matches": match.get("bm25_body_matches"),
-            "bm25_query_tokens": match.get("bm25_query_tokens"),
-        })
+        pass
 
-    scored.sort(key=lambda item: float(item.get("score") or 0), reverse=True)
-    limit = max(0, min(max(1, top_k), RAG_LEXICAL_TOP_K))
-    return scored[:limit]
+def _lexical_index_fields(md: Dict, document: Optional[str]) -> Dict[str, object]:
+    """Normalised lexical fields of one chunk; ``document=None`` skips the body."""
+    md = md if isinstance(md, dict) else {}
+    fields = {
+        "title": _normalize_search_text(md.get("title") or md.get("fileName") or md.get("source_url") or ""),
+        "paragraph_title": _normalize_search_text(md.get("paragraph_title") or ""),
+        "section": _normalize_search_text(md.get("section") or ""),
+        "act_title": _normalize_search_text(md.get("act_title") or ""),
+        "paragraph_number": _normalize_search_text(md.get("paragraph_number") or ""),
+        "provision": _provision_index_entry(md),
+        "filters": _filter_index_values(md),
+        "skeleton": _result_skeleton(md),
+    }
+    if document is not None:
+        fields["body"] = _normalize_search_text(document)
+    return fields
+
+def _lexical_term_ids_unlocked(conn: sqlite3.Connection, terms: List[str], create: bool) -> Dict[str, int]:
+    unique_terms = sorted(set(terms))
+    if create and unique_terms:
+        conn.executemany("INSERT OR IGNORE INTO lexical_terms (term) VALUES (?)", [(term,) for term in unique_terms])
+    out: Dict[str, int] = {}
+    for batch in _sql_batches(unique_terms):
+        placeholders = ",".join("?" for _ in batch)
+        for term_id, term in conn.execute(
+            f"SELECT term_id, term FROM lexical_terms WHERE term IN ({placeholders})",
+            batch,
+        ):
+            out[term] = term_id
+    return out
 
-# --------------------
-# Routes
-# --------------------
-@app.get("/health")
-def health():
-    reg = _load_registry()
+def _search_index_delete_ords_unlocked(conn: sqlite3.Connection, ords: List[int]) -> None:
+    changes: Dict[Tuple[str, str], Tuple[List[int], List[int]]] = {}
+    for batch in _sql_batches(ords):
+        placeholders = ",".join("?" for _ in batch)
+        for field, value, ord_value in conn.execute(
+            f"SELECT field, value, ord FROM filter_values WHERE ord IN ({placeholders})",
+            batch,
+        ):
+            changes.setdefault((field, value), ([], []))[1].append(ord_value)
+        for (chunk_id,) in conn.execute(f"SELECT chunk_id FROM index_chunks WHERE ord IN ({placeholders})", batch):
+            _SEARCH_INDEX_STATE["ord_by_id"].pop(chunk_id, None)
+        conn.execute(f"DELETE FROM filter_values WHERE ord IN ({placeholders})", batch)
+        conn.execute(f"DELETE FROM result_skeletons WHERE ord IN ({placeholders})", batch)
+        conn.execute(f"DELETE FROM lexical_postings WHERE ord IN ({placeholders})", batch)
+        conn.execute(f"DELETE FROM index_chunks WHERE ord IN ({placeholders})", batch)
+    _filter_bitmaps_apply_unlocked(changes)
+    _skeleton_cache_drop(ords)
+    for ord_value in ords:
+        if ord_value < len(_SEARCH_INDEX_STATE["alive"]):
+            _SEARCH_INDEX_STATE["alive"][ord_value] = False
+            _SEARCH_INDEX_STATE["lengths"][ord_value] = 0
+        _SEARCH_INDEX_STATE["short_fields"].pop(ord_value, None)
+        _provision_index_drop(ord_value)
+    for batch in _sql_batches(ords):
+        placeholders = ",".join("?" for _ in batch)
+        conn.execute(f"DELETE FROM provision_index WHERE ord IN ({placeholders})", batch)
+
+def _skeleton_dumps(skeleton: Dict[str, object]) -> bytes:
+    if _ORJSON_OK:
+        return orjson.dumps(skeleton, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(skeleton, ensure_ascii=False, default=str).encode("utf-8")
+
+def _skeleton_loads(blob: bytes) -> Dict[str, object]:
+    return orjson.loads(blob) if _ORJSON_OK else json.loads(blob)
+
+_SKELETON_CACHE: "OrderedDict[int, Dict[str, object]]" = OrderedDict()
+_SKELETON_CACHE_LOCK = Lock()
+# Ords rewritten by the open write transaction. They are evicted again once it
+# commits, since a concurrent reader may have re-cached the previous version.
+_SKELETON_CACHE_DIRTY: set = set()
+
+def _skeleton_cache_drop(ords) -> None:
+    with _SKELETON_CACHE_LOCK:
+        for ord_value in ords:
+            _SKELETON_CACHE.pop(ord_value, None)
+            _SKELETON_CACHE_DIRTY.add(ord_value)
+
+def _skeleton_cache_settle() -> None:
+    with _SKELETON_CACHE_LOCK:
+        for ord_value in _SKELETON_CACHE_DIRTY:
+            _SKELETON_CACHE.pop(ord_value, None)
+        _SKELETON_CACHE_DIRTY.clear()
+
+def _search_index_skeletons(chunk_ids: List[str]) -> Dict[str, Dict[str, object]]:
+    """Stored result skeletons by chunk id; chunks without one are simply absent."""
+    if not chunk_ids or not _SEARCH_INDEX_STATE["ready"]:
+        return {}
+    ord_by_id = _SEARCH_INDEX_STATE["ord_by_id"]
+    ids_by_ord = {ord_by_id[chunk_id]: chunk_id for chunk_id in chunk_ids if chunk_id in ord_by_id}
+    out: Dict[str, Dict[str, object]] = {}
+    missing: List[int] = []
+    with _SKELETON_CACHE_LOCK:
+        for ord_value, chunk_id in ids_by_ord.items():
+            skeleton = _SKELETON_CACHE.get(ord_value)
+            if skeleton is None:
+                missing.append(ord_value)
+            else:
+                _SKELETON_CACHE.move_to_end(ord_value)
+                out[chunk_id] = skeleton
+    if not missing:
+        return out
+    loaded: Dict[int, Dict[str, object]] = {}
     try:
-        n = collection.count()
+        conn = _search_index_conn()
+        for batch in _sql_batches(missing):
+            placeholders = ",".join("?" for _ in batch)
+            for ord_value, blob in conn.execute(
+                f"SELECT ord, skeleton FROM result_skeletons WHERE ord IN ({placeholders})",
+                batch,
+            ):
+                loaded[ord_value] = _skeleton_loads(blob)
     except Exception:
-        n = -1
-    return {
-        "ok": True,
-        "status": "ok",
-        "vectors": n,
-        "documents": len(reg),
-        "embed_model": EMBED_MODEL,
-        "collection": COLLECTION_NAME,
-        "chunk_size": CHUNK_SIZE,
-        "chunk_overlap": CHUNK_OVERLAP,
-        "allowed_mime": sorted(list(ALLOWED_MIME)),
-        "storage_dir": os.path.realpath(str(STORAGE_DIR)),
-    }
+        logger.exception("[rag][search-index] skeleton lookup failed")
+        return out
+    with _SKELETON_CACHE_LOCK:
+        for ord_value, skeleton in loaded.items():
+            out[ids_by_ord[ord_value]] = skeleton
+            if RAG_SKELETON_CACHE_SIZE > 0:
+                _SKELETON_CACHE[ord_value] = skeleton
+        while len(_SKELETON_CACHE) > max(0, RAG_SKELETON_CACHE_SIZE):
+            _SKELETON_CACHE.popitem(last=False)
+    return out
 
-# --- Ephemeral analyze (no persistence) ---
-@app.post("/analyze", dependencies=[Depends(_require_key)])
-async def analyze(
-    file: UploadFile = File(...),
-    mimeType: Optional[str] = Form(None),
-    maxChunks: Optional[int] = Form(None),
-):
-    raw = await file.read()
-    if not raw:
-        raise HTTPException(400, "Empty file")
-    size_mb = _bytes_mb(raw)
-    if size_mb > MAX_MB:
-        raise HTTPException(413, f"File too large ({size_mb:.1f}MB > {MAX_MB}MB)")
+def _search_index_write_fields_unlocked(
+    conn: sqlite3.Connection,
+    rows: List[Tuple[str, Optional[str], Dict[str, object]]],
+) -> None:
+    """Write postings for (chunk_id, doc_id, normalised fields) rows.
 
-    declared_mime = mimeType or file.content_type
-    mime = _detect_mime(file.filename or "file", raw, declared_mime)
-    if ALLOWED_MIME and mime not in ALLOWED_MIME:
-        raise HTTPException(415, f"MIME not allowed: {mime}")
+    Only the fields present in each row are replaced, so metadata-only updates
+    can pass the non-body fields and keep the body postings untouched.
+    """
+    if not rows:
+        return
+    chunk_ids = [row[0] for row in rows]
+    ords: Dict[str, int] = {}
+    for batch in _sql_batches(chunk_ids):
+        placeholders = ",".join("?" for _ in batch)
+        for ord_value, chunk_id in conn.execute(
+            f"SELECT ord, chunk_id FROM index_chunks WHERE chunk_id IN ({placeholders})",
+            batch,
+        ):
+            ords[chunk_id] = ord_value
+
+    counts_by_chunk: List[Tuple[str, Dict[str, object], Dict[str, Dict[str, int]], Dict[str, List[int]]]] = []
+    all_terms: List[str] = []
+    for chunk_id, doc_id, fields in rows:
+        if chunk_id not in ords:
+            cursor = conn.execute("INSERT INTO index_chunks (chunk_id, doc_id) VALUES (?, ?)", (chunk_id, doc_id))
+            ords[chunk_id] = int(cursor.lastrowid)
+        elif doc_id is not None:
+            conn.execute("UPDATE index_chunks SET doc_id = ? WHERE ord = ?", (doc_id, ords[chunk_id]))
+        field_counts = {
+            field: _lexical_token_counts(text, limit=LEXICAL_INDEX_MAX_TERMS_PER_FIELD)
+            for field, text in fields.items()
+            if field in LEXICAL_FIELD_IDS and field != "body"
+        }
+        body_positions: Dict[str, List[int]] = {}
+        if "body" in fields:
+            body_positions = _lexical_token_positions(str(fields["body"] or ""))
+            field_counts["body"] = {term: len(positions) for term, positions in body_positions.items()}
+        counts_by_chunk.append((chunk_id, fields, field_counts, body_positions))
+        for counts in field_counts.values():
+            all_terms.extend(counts.keys())
+
+    term_ids = _lexical_term_ids_unlocked(conn, all_terms, create=True)
+    filter_changes: Dict[Tuple[str, str], Tuple[List[int], List[int]]] = {}
+    postings: List[Tuple[int, int, int, int, Optional[bytes]]] = []
+    for chunk_id, fields, field_counts, body_positions in counts_by_chunk:
+        ord_value = ords[chunk_id]
+        _search_index_ensure_capacity_unlocked(ord_value)
+        field_ids = [LEXICAL_FIELD_IDS[field] for field in field_counts]
+        placeholders = ",".join("?" for _ in field_ids)
+        conn.execute(f"DELETE FROM lexical_postings WHERE ord = ? AND field IN ({placeholders})", [ord_value, *field_ids])
+        assignments = []
+        values: List[object] = []
+        for field in LEXICAL_NORM_FIELDS:
+            if field in fields:
+                assignments.append(f"norm_{field} = ?")
+                values.append(fields[field] or "")
+        for field, counts in field_counts.items():
+            field_id = LEXICAL_FIELD_IDS[field]
+            length = int(sum(counts.values()))
+            assignments.append(f"len_{field} = ?")
+            values.append(length)
+            _SEARCH_INDEX_STATE["lengths"][ord_value][field_id] = length
+            for term, tf in counts.items():
+                positions = body_positions.get(term) if field == "body" else None
+                blob = np.asarray(positions, dtype=np.int32).tobytes() if positions else None
+                postings.append((term_ids[term], field_id, ord_value, int(tf), blob))
+        if assignments:
+            conn.execute(f"UPDATE index_chunks SET {', '.join(assignments)} WHERE ord = ?", [*values, ord_value])
+        _SEARCH_INDEX_STATE["alive"][ord_value] = True
+        _SEARCH_INDEX_STATE["ord_by_id"][chunk_id] = ord_value
+        _SEARCH_INDEX_STATE["short_fields"][ord_value] = _lexical_short_fields(fields)
+        if "filters" in fields:
+            _filter_values_write_unlocked(conn, ord_value, fields["filters"], filter_changes)
+        if "skeleton" in fields:
+            conn.execute(
+                "INSERT OR REPLACE INTO result_skeletons (ord, skeleton) VALUES (?, ?)",
+                (ord_value, _skeleton_dumps(fields["skeleton"])),
+            )
+            _skeleton_cache_drop([ord_value])
+        if "provision" in fields:
+            conn.execute("DELETE FROM provision_index WHERE ord = ?", (ord_value,))
+            _provision_index_drop(ord_value)
+            provision = fields.get("provision")
+            if provision:
+                paragraph, subsection, point, act_keys = provision
+                conn.execute(
+                    "INSERT INTO provision_index (ord, chunk_id, paragraph, subsection, point, act_keys) VALUES (?, ?, ?, ?, ?, ?)",
+                    (ord_value, chunk_id, paragraph, subsection, point, "\n".join(act_keys)),
+                )
+                _provision_index_put(ord_value, chunk_id, provision)
+    conn.executemany("INSERT INTO lexical_postings (term_id, field, ord, tf, positions) VALUES (?, ?, ?, ?, ?)", postings)
+    _filter_bitmaps_apply_unlocked(filter_changes)
 
-    # extract text (without saving to storage or indexing)
-    # NOTE: keep raw_text with lõigud/pealkirjad kasutajale kuvamiseks.
-    if mime == "application/pdf":
-        pages = _extract_text_from_pdf(raw)
-        texts = [t for (_, t) in pages if t]
-        raw_text = "\n\n".join(texts)
-    elif mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        raw_text = _extract_text_from_docx(raw)
-    elif mime == "text/html":
-        raw_text = _extract_text_from_html(raw.decode("utf-8", errors="ignore"))
-    else:
-        raw_text = raw.decode("utf-8", errors="ignore")
+def _search_index_apply(action: str, fn) -> None:
+    _bump_collection_generation()
+    if not _SEARCH_INDEX_STATE["enabled"]:
+        return
+    conn = _search_index_conn()
+    try:
+        with SEARCH_INDEX_LOCK:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                fn(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                _search_index_load_state_unlocked(conn)
+                raise
+            finally:
+                _skeleton_cache_settle()
+    except Exception as exc:
+        logger.exception("[rag][search-index] %s failed", action)
+        _search_index_mark_stale(f"{action}_failed: {exc.__class__.__name__}")
+    finally:
+        # A search that started during the write keyed its result with the
+        # generation above but may have read the old postings/bitmaps.
+        _bump_collection_generation()
+
+def _search_index_chunk_rows(
+    ids: List[str],
+    documents: Optional[List[object]],
+    metadatas: Optional[List[object]],
+    lexical_fields: Optional[List[Dict[str, object]]] = None,
+) -> List[Tuple[str, Optional[str], Dict[str, object]]]:
+    """Pair chunk ids with normalised fields, reusing ingest-time ``lexical_fields`` when given."""
+    rows = []
+    for index, chunk_id in enumerate(ids or []):
+        md = metadatas[index] if metadatas and index < len(metadatas) and isinstance(metadatas[index], dict) else {}
+        doc_id = md.get("doc_id") or md.get("docId")
+        if lexical_fields and index < len(lexical_fields) and isinstance(lexical_fields[index], dict):
+            fields = dict(lexical_fields[index])
+        elif documents is None:
+            fields = _lexical_index_fields(md, None)
+        else:
+            document = documents[index] if index < len(documents) and isinstance(documents[index], str) else ""
+            fields = _lexical_index_fields(md, document)
+        rows.append((str(chunk_id), str(doc_id) if doc_id else None, fields))
+    return rows
+
+def _search_index_upsert_chunks(
+    ids: List[str],
+    documents: List[object],
+    metadatas: List[object],
+    lexical_fields: Optional[List[Dict[str, object]]] = None,
+) -> None:
+    rows = _search_index_chunk_rows(ids, documents, metadatas, lexical_fields)
+    _search_index_apply("upsert", lambda conn: _search_index_write_fields_unlocked(conn, rows))
 
-    # clean up only for chunking (embeddings), mitte kasutaja eelvaadet
-    cleaned_text = _clean_text(raw_text)
-    chunks = _split_chunks(cleaned_text)
-    if maxChunks is not None:
+def _search_index_replace_document(
+    doc_id: str,
+    ids: List[str],
+    documents: List[object],
+    metadatas: List[object],
+    lexical_fields: Optional[List[Dict[str, object]]] = None,
+    keep: Optional[set] = None,
+) -> None:
+    """Write ``ids`` and drop the document's other chunks, except those in ``keep``."""
+    rows = _search_index_chunk_rows(ids, documents, metadatas, lexical_fields)
+    keep = {row[0] for row in rows} | set(keep or ())
+
+    def _replace(conn: sqlite3.Connection) -> None:
+        stale = [
+            ord_value
+            for ord_value, chunk_id in conn.execute("SELECT ord, chunk_id FROM index_chunks WHERE doc_id = ?", (doc_id,))
+            if chunk_id not in keep
+        ]
+        _search_index_delete_ords_unlocked(conn, stale)
+        _search_index_write_fields_unlocked(conn, rows)
+
+    _search_index_apply("replace_document", _replace)
+
+def _search_index_update_metadata(ids: List[str], metadatas: List[object]) -> None:
+    rows = _search_index_chunk_rows(ids, None, metadatas)
+    _search_index_apply("update_metadata", lambda conn: _search_index_write_fields_unlocked(conn, rows))
+
+def _search_index_delete_document(doc_id: str) -> None:
+    def _delete(conn: sqlite3.Connection) -> None:
+        ords = [row[0] for row in conn.execute("SELECT ord FROM index_chunks WHERE doc_id = ?", (doc_id,))]
+        _search_index_delete_ords_unlocked(conn, ords)
+
+    _search_index_apply("delete_document", _delete)
+
+def _search_index_claim_rebuild() -> bool:
+    """Mark a rebuild as running; False when one already is."""
+    with SEARCH_INDEX_REBUILD_LOCK:
+        if _SEARCH_INDEX_STATE["rebuilding"]:
+            return False
+        _SEARCH_INDEX_STATE["rebuilding"] = True
+        return True
+
+def _search_index_rebuild_write(conn: sqlite3.Connection, fn) -> None:
+    with SEARCH_INDEX_LOCK:
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            k = int(maxChunks)
-            if k > 0:
-                chunks = chunks[:k]
+            fn(conn)
+            conn.execute("COMMIT")
         except Exception:
-            pass
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            _skeleton_cache_settle()
 
-    # Tagasta kliendile täistekst; eelvaateks kärbi, et vältida liiga suurt payloadi
-    # (kuid jäta lõigud alles).
-    preview = raw_text[:8000]
-    return {
-        "ok": True,
-        "fileName": file.filename,
-        "mimeType": mime,
-        "sizeMB": round(size_mb, 2),
-        "chunks": chunks,
-        "preview": preview,
-        "fullText": raw_text,
-    }
+def _search_index_rebuild_reconcile(conn: sqlite3.Connection, page_size: int) -> None:
+    """Index rows the offset pages skipped and drop ords Chroma no longer has.
 
-# --- shared worker for file ingestion (used by JSON + multipart) ---
-def _process_ingest_file(
-    doc_id: str,
-    file_name: str,
-    raw: bytes,
-    mime_declared: Optional[str],
-    meta: Dict,
+    Call with COLLECTION_WRITE_LOCK held. Only writes recorded during the page
+    pass can shift its offsets, so without them the pass saw every row.
+    """
+    dirty = _SEARCH_INDEX_STATE["rebuild_dirty"]
+    _SEARCH_INDEX_STATE["rebuild_dirty"] = None
+    if not dirty:
+        return
+    with SEARCH_INDEX_LOCK:
+        indexed = dict(_SEARCH_INDEX_STATE["ord_by_id"])
+    stored: set = set()
+    offset = 0
+    while True:
+        page_ids = collection.get(include=[], limit=page_size, offset=offset).get("ids") or []
+        if not page_ids:
+            break
+        stored.update(page_ids)
+        offset += len(page_ids)
+    missing = sorted(chunk_id for chunk_id in stored if chunk_id not in indexed)
+    ghosts = [ord_value for chunk_id, ord_value in indexed.items() if chunk_id not in stored]
+    for start in range(0, len(missing), page_size):
+        got = collection.get(ids=missing[start:start + page_size], include=["documents", "metadatas"])
+        rows = _search_index_chunk_rows(got.get("ids") or [], got.get("documents") or [], got.get("metadatas") or [])
+        _search_index_rebuild_write(conn, lambda c: _search_index_write_fields_unlocked(c, rows))
+    if ghosts:
+        _search_index_rebuild_write(conn, lambda c: _search_index_delete_ords_unlocked(c, ghosts))
+    logger.info("[rag][search-index] rebuild reconciled docs=%s added=%s dropped=%s", len(dirty), len(missing), len(ghosts))
+
+def _search_index_rebuild() -> int:
+    """Rebuild the index from the Chroma collection (documents + metadatas).
+
+    Call after ``_search_index_claim_rebuild()`` returned True. Each page is read
+    and written under COLLECTION_WRITE_LOCK, so a concurrent ingest, patch or
+    delete (Chroma first, index second) cannot be overwritten by an older page.
+    """
+    conn = _search_index_conn()
+    try:
+        with COLLECTION_WRITE_LOCK:
+            _SEARCH_INDEX_STATE["rebuild_dirty"] = set()
+        with SEARCH_INDEX_LOCK:
+            _SEARCH_INDEX_STATE["ready"] = False
+            conn.execute("BEGIN IMMEDIATE")
+            for table in SEARCH_INDEX_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+            _search_index_set_meta_unlocked(conn, "ready", "0")
+            conn.execute("COMMIT")
+            _search_index_load_state_unlocked(conn)
+        indexed = 0
+        started = perf_counter()
+        page_size = max(16, RAG_SEARCH_INDEX_REBUILD_PAGE)
+        offset = 0
+        while True:
+            with COLLECTION_WRITE_LOCK:
+                got = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                ids = got.get("ids") or []
+                if not ids:
+                    _search_index_rebuild_reconcile(conn, page_size)
+                    break
+                rows = _search_index_chunk_rows(ids, got.get("documents") or [], got.get("metadatas") or [])
+                _search_index_rebuild_write(conn, lambda c: _search_index_write_fields_unlocked(c, rows))
+            indexed += len(ids)
+            offset += len(ids)
+        with SEARCH_INDEX_LOCK:
+            _search_index_set_meta_unlocked(conn, "ready", "1")
+            _search_index_set_meta_unlocked(conn, "rebuilt_at", now_iso())
+            _SEARCH_INDEX_STATE["ready"] = True
+            _SEARCH_INDEX_STATE["error"] = None
+        _bump_collection_generation()
+        logger.info("[rag][search-index] rebuilt chunks=%s ms=%.1f", indexed, (perf_counter() - started) * 1000)
+        # Ords were reassigned, so the vector sidecar has to follow.
+        _vector_sidecar_rebuild_safe()
+        return indexed
+    finally:
+        _SEARCH_INDEX_STATE["rebuild_dirty"] = None
+        _SEARCH_INDEX_STATE["rebuilding"] = False
+
+def _search_index_rebuild_safe() -> None:
+    try:
+        _search_index_rebuild()
+    except Exception as exc:
+        logger.exception("[rag][search-index] rebuild failed")
+        _SEARCH_INDEX_STATE["error"] = f"rebuild_failed: {exc.__class__.__name__}"
+
+def _search_index_ensure_ready() -> bool:
+    """Return True when postings can serve queries; otherwise start a background rebuild."""
+    if not _SEARCH_INDEX_STATE["enabled"]:
+        return False
+    if _SEARCH_INDEX_STATE["ready"]:
+        return True
+    if _search_index_claim_rebuild():
+        Thread(target=_search_index_rebuild_safe, name="search-index-rebuild", daemon=True).start()
+    return False
+
+def _search_index_status() -> Dict[str, object]:
+    alive = _SEARCH_INDEX_STATE["alive"]
+    return {
+        "enabled": bool(_SEARCH_INDEX_STATE["enabled"]),
+        "ready": bool(_SEARCH_INDEX_STATE["ready"]),
+        "rebuilding": bool(_SEARCH_INDEX_STATE["rebuilding"]),
+        "chunks": int(alive.sum()) if len(alive) else 0,
+        "provisions": len(_PROVISION_KEYS_BY_ORD),
+        "filter_fields": len(_FILTER_BITMAPS),
+        "error": _SEARCH_INDEX_STATE["error"],
+        "path": str(SEARCH_INDEX_PATH),
+    }
+
+# --------------------
+# Provision lookup
+# --------------------
+# Exact (act, paragraph, subsection, point) -> chunk lookup for legal references
+# such as "SHS § 131 lg 2 p 3". Entries are written together with the postings
+# and mirrored in memory, so a lookup is a handful of dict reads.
+PROVISION_REF_PATTERN = re.compile(
+    r"(?:§+\s*|\bparagrahv(?:i|is|ist|ile|il|iga|iks)?\s+|\bparagraph\s+)(\d+[a-z]?)"
+    r"(?:\s*(?:lg|l[õo]i(?:ge|ke|kes|get|kest|kele))\.?\s*(\d+[a-z]?))?"
+    r"(?:\s*(?:p|pt|punkt(?:i|is|ist|ile)?)\.?\s*(\d+[a-z]?))?",
+    flags=re.I,
+)
+PROVISION_SHS_PATTERN = re.compile(r"\bshs\s+(\d{1,3}[a-z]?)\b", flags=re.I)
+PROVISION_ACT_TAIL_PATTERN = re.compile(r"(?:(?i:seadus)\w*|\b[A-ZÕÄÖÜŠŽ]{2,10})\s*$")
+
+def _provision_act_key(value: object) -> str:
+    return re.sub(r"\bseadus\w*", "seadus", _normalize_search_text(value)).strip()
+
+def _provision_value(value: object) -> str:
+    return _normalize_search_text(value).replace(" ", "")
+
+def _provision_index_entry(md: Dict) -> Optional[Tuple[str, str, str, Tuple[str, ...]]]:
+    md = md if isinstance(md, dict) else {}
+    paragraph = _provision_value(md.get("paragraph_number"))
+    if not paragraph:
+        return None
+    act_keys = {
+        _provision_act_key(md.get(key))
+        for key in ("act_title", "act_reference", "canonical_source_id")
+    }
+    return (
+        paragraph,
+        _provision_value(md.get("subsection_number")),
+        _provision_value(md.get("point_number")),
+        tuple(sorted(key for key in act_keys if key)),
+    )
+
+def _provision_index_put(ord_value: int, chunk_id: str, entry: Tuple[str, str, str, Tuple[str, ...]]) -> None:
+    paragraph, subsection, point, act_keys = entry
+    keys = [("", paragraph)] + [(act_key, paragraph) for act_key in act_keys]
+    for key in keys:
+        _PROVISION_INDEX.setdefault(key, {})[ord_value] = (chunk_id, subsection, point)
+    _PROVISION_KEYS_BY_ORD[ord_value] = keys
+
+def _provision_index_drop(ord_value: int) -> None:
+    for key in _PROVISION_KEYS_BY_ORD.pop(ord_value, []):
+        bucket = _PROVISION_INDEX.get(key)
+        if bucket is not None:
+            bucket.pop(ord_value, None)
+            if not bucket:
+                _PROVISION_INDEX.pop(key, None)
+
+def _extract_query_provision_refs(query: object) -> List[Dict[str, object]]:
+    """Parse § references with optional act name, lõige (lg) and punkt (p)."""
+    source = str(query or "")
+    refs: List[Dict[str, object]] = []
+    seen = set()
+    boundary = 0
+    for match in PROVISION_REF_PATTERN.finditer(source):
+        window_start = max(boundary, source.rfind("\n", 0, match.start()) + 1, match.start() - 80)
+        window = source[window_start:match.start()].rstrip(" ,;:(")
+        act_explicit = bool(PROVISION_ACT_TAIL_PATTERN.search(window))
+        boundary = match.end()
+        ref = {
+            "paragraph": _provision_value(match.group(1)),
+            "subsection": _provision_value(match.group(2)),
+            "point": _provision_value(match.group(3)),
+            "act": _provision_act_key(window) if act_explicit else "",
+            "span": (window_start if act_explicit else match.start(), match.end()),
+        }
+        key = (ref["paragraph"], ref["subsection"], ref["point"], ref["act"])
+        if ref["paragraph"] and key not in seen:
+            seen.add(key)
+            refs.append(ref)
+    for match in PROVISION_SHS_PATTERN.finditer(source):
+        ref = {
+            "paragraph": _provision_value(match.group(1)),
+            "subsection": "",
+            "point": "",
+            "act": _provision_act_key("SHS"),
+            "span": (match.start(), match.end()),
+        }
+        key = (ref["paragraph"], ref["subsection"], ref["point"], ref["act"])
+        if key not in seen:
+            seen.add(key)
+            refs.append(ref)
+    return refs[:8]
+
+def _provision_query_is_pure(query: str, refs: List[Dict[str, object]]) -> bool:
+    """True when nothing but the references (and their act names) is left in the query."""
+    remainder = str(query or "")
+    for ref in sorted(refs, key=lambda item: item["span"][0], reverse=True):
+        start, end = ref["span"]
+        remainder = remainder[:start] + " " + remainder[end:]
+    return not _search_tokens(remainder)
+
+def _provision_match_score(ref: Dict[str, object], subsection: str, point: str) -> float:
+    if ref["subsection"]:
+        if subsection == ref["subsection"]:
+            if not ref["point"]:
+                score = 28.0 if not point else 24.0
+            else:
+                score = 30.0 if point == ref["point"] else 22.0
+        else:
+            score = 22.0 if not subsection else 16.0
+    else:
+        score = 26.0 if not subsection else 22.0
+    return score if ref["act"] else score - 2.0
+
+def _provision_lookup(
+    refs: List[Dict[str, object]],
+    limit: int,
+    filter_mask: Optional[np.ndarray] = None,
+) -> List[Tuple[str, float]]:
+    hits: Dict[str, float] = {}
+    for ref in refs:
+        paragraph = str(ref["paragraph"])
+        if ref["act"]:
+            words = str(ref["act"]).split(" ")
+            act_keys = {" ".join(words[index:]) for index in range(len(words))}
+        else:
+            act_keys = {""}
+        matched: Dict[int, Tuple[str, str, str]] = {}
+        for act_key in act_keys:
+            matched.update(_PROVISION_INDEX.get((act_key, paragraph)) or {})
+        for ord_value, (chunk_id, subsection, point) in matched.items():
+            if filter_mask is not None and (ord_value >= len(filter_mask) or not filter_mask[ord_value]):
+                continue
+            score = _provision_match_score(ref, subsection, point)
+            if score > hits.get(chunk_id, 0.0):
+                hits[chunk_id] = score
+    return sorted(hits.items(), key=lambda item: (-item[1], item[0]))[: max(1, limit)]
+
+def _fetch_provision_candidates(
+    refs: List[Dict[str, object]],
+    chroma_where: Optional[Dict[str, object]],
+    top_k: int,
+    stats: Optional[Dict[str, object]] = None,
+    filter_mask: Optional[np.ndarray] = None,
+) -> List[Dict[str, object]]:
+    """Lexical-candidate shaped hits for the ``provision_lookup`` channel."""
+    if not refs or not RAG_PROVISION_LOOKUP_ENABLED or not _search_index_ensure_ready():
+        return []
+    started = perf_counter()
+    hits = _provision_lookup(refs, max(1, min(top_k, RAG_LEXICAL_TOP_K)), filter_mask)
+    if stats is not None:
+        stats["lookup_ms"] = round((perf_counter() - started) * 1000, 4)
+    if not hits:
+        return []
+    try:
+        got = collection.get(
+            ids=[chunk_id for chunk_id, _ in hits],
+            where=chroma_where if filter_mask is None else None,
+            include=["documents", "metadatas"],
+        )
+    except Exception:
+        logger.exception("provision lookup failed")
+        return []
+    ids = got.get("ids") or []
+    docs = got.get("documents") or []
+    metas = got.get("metadatas") or []
+    rows = {
+        item_id: (
+            docs[i] if i < len(docs) and isinstance(docs[i], str) else "",
+            metas[i] if i < len(metas) and isinstance(metas[i], dict) else {},
+        )
+        for i, item_id in enumerate(ids)
+    }
+    return [
+        {
+            "id": chunk_id,
+            "document": rows[chunk_id][0],
+            "metadata": rows[chunk_id][1],
+            "score": score,
+            "channels": ["provision_lookup"],
+        }
+        for chunk_id, score in hits
+        if chunk_id in rows
+    ]
+
+def _merge_provision_candidates(
+    lexical_candidates: List[Dict[str, object]],
+    provision_candidates: List[Dict[str, object]],
+) -> List[Dict[str, object]]:
+    if not provision_candidates:
+        return lexical_candidates
+    merged = {str(item.get("id")): item for item in lexical_candidates}
+    for candidate in provision_candidates:
+        existing = merged.get(str(candidate["id"]))
+        if existing is None:
+            merged[str(candidate["id"])] = candidate
+            continue
+        existing["channels"] = ["provision_lookup"] + [
+            channel for channel in list(existing.get("channels") or []) if channel != "provision_lookup"
+        ]
+        existing["score"] = max(float(existing.get("score") or 0), float(candidate["score"]))
+    return sorted(merged.values(), key=lambda item: float(item.get("score") or 0), reverse=True)
+
+# --------------------
+# Filter bitmaps
+# --------------------
+# Per-field, per-value sets of chunk ordinals for the metadata used in /search
+# filters. Each set is a roaring-style container: a sorted uint32 array while
+# sparse, a packed bit array once that is smaller. A where tree is evaluated
+# once per query into a boolean mask over ordinals and shared by the dense
+# post-filter, the lexical index and the provision lookup.
+FILTER_BITMAP_FIELDS = frozenset({
+    "doc_id",
+    "audience",
+    "authors",
+    "tags",
+    "year",
+    "country",
+    "jurisdiction_level",
+    "municipality_name",
+    "historical",
+    "item_type",
+    *(metadata_key for _, metadata_key in SEARCH_METADATA_STRING_FILTERS),
+})
+FILTER_TAG_TOKEN_PATTERN = re.compile(r"tag_token_\d+")
+_FILTER_BITMAPS: Dict[str, Dict[str, Tuple[str, np.ndarray]]] = {}
+
+def _filter_bitmap_field(key: str) -> bool:
+    return key in FILTER_BITMAP_FIELDS or bool(FILTER_TAG_TOKEN_PATTERN.fullmatch(key))
+
+def _filter_value_key(value: object) -> Optional[str]:
+    """Bitmap key for a metadata value, matching ``_metadata_matches_filter`` equality."""
+    normalized = _normalize_metadata_scalar(value)
+    if normalized is None:
+        return None
+    if isinstance(normalized, float) and normalized.is_integer():
+        normalized = int(normalized)
+    return json.dumps(normalized, ensure_ascii=False)
+
+def _filter_index_values(md: Dict) -> Tuple[Tuple[str, str], ...]:
+    pairs = set()
+    for key, value in (md or {}).items():
+        if not _filter_bitmap_field(str(key)):
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            value_key = _filter_value_key(item)
+            if value_key is not None:
+                pairs.add((str(key), value_key))
+    return tuple(sorted(pairs))
+
+def _bitmap_encode(ords: np.ndarray, capacity: int) -> Tuple[str, np.ndarray]:
+    ords = np.asarray(ords, dtype=np.uint32)
+    if len(ords) * 32 > max(capacity, 1):
+        mask = np.zeros(max(capacity, int(ords.max()) + 1), dtype=bool)
+        mask[ords] = True
+        return ("bitmap", np.packbits(mask))
+    return ("array", ords)
+
+def _bitmap_ords(container: Tuple[str, np.ndarray]) -> np.ndarray:
+    kind, data = container
+    if kind == "bitmap":
+        return np.flatnonzero(np.unpackbits(data)).astype(np.uint32)
+    return data
+
+def _bitmap_or_into(mask: np.ndarray, container: Tuple[str, np.ndarray]) -> None:
+    kind, data = container
+    if kind == "bitmap":
+        bits = np.unpackbits(data, count=min(len(mask), len(data) * 8)).astype(bool)
+        mask[: len(bits)] |= bits
+    else:
+        mask[data[data < len(mask)]] = True
+
+def _filter_bitmaps_apply_unlocked(changes: Dict[Tuple[str, str], Tuple[List[int], List[int]]]) -> None:
+    """Apply (added ords, removed ords) per (field, value) to the in-memory containers."""
+    capacity = len(_SEARCH_INDEX_STATE["alive"])
+    for (field, value), (added, removed) in changes.items():
+        values = _FILTER_BITMAPS.setdefault(field, {})
+        current = _bitmap_ords(values[value]) if value in values else np.zeros(0, dtype=np.uint32)
+        if removed:
+            current = np.setdiff1d(current, np.asarray(removed, dtype=np.uint32), assume_unique=True)
+        if added:
+            current = np.union1d(current, np.asarray(added, dtype=np.uint32))
+        if len(current):
+            values[value] = _bitmap_encode(current, capacity)
+        else:
+            values.pop(value, None)
+            if not values:
+                _FILTER_BITMAPS.pop(field, None)
+
+def _filter_bitmaps_load_unlocked(conn: sqlite3.Connection) -> None:
+    _FILTER_BITMAPS.clear()
+    capacity = len(_SEARCH_INDEX_STATE["alive"])
+    current_key: Optional[Tuple[str, str]] = None
+    current_ords: List[int] = []
+    for field, value, ord_value in conn.execute("SELECT field, value, ord FROM filter_values ORDER BY field, value, ord"):
+        if (field, value) != current_key:
+            if current_key is not None and current_ords:
+                _FILTER_BITMAPS.setdefault(current_key[0], {})[current_key[1]] = _bitmap_encode(np.asarray(current_ords), capacity)
+            current_key = (field, value)
+            current_ords = []
+        current_ords.append(ord_value)
+    if current_key is not None and current_ords:
+        _FILTER_BITMAPS.setdefault(current_key[0], {})[current_key[1]] = _bitmap_encode(np.asarray(current_ords), capacity)
+
+def _filter_values_write_unlocked(
+    conn: sqlite3.Connection,
+    ord_value: int,
+    pairs: Tuple[Tuple[str, str], ...],
+    changes: Dict[Tuple[str, str], Tuple[List[int], List[int]]],
+) -> None:
+    existing = set(conn.execute("SELECT field, value FROM filter_values WHERE ord = ?", (ord_value,)).fetchall())
+    wanted = set(pairs)
+    for pair in existing - wanted:
+        conn.execute("DELETE FROM filter_values WHERE field = ? AND value = ? AND ord = ?", (*pair, ord_value))
+        changes.setdefault(pair, ([], []))[1].append(ord_value)
+    for pair in wanted - existing:
+        conn.execute("INSERT INTO filter_values (field, value, ord) VALUES (?, ?, ?)", (*pair, ord_value))
+        changes.setdefault(pair, ([], []))[0].append(ord_value)
+
+def _search_index_filter_mask(where: Optional[Dict[str, object]]) -> Optional[np.ndarray]:
+    """Boolean mask over ordinals for a Chroma-style where tree.
+
+    Returns None when there is no filter, the index is not serving, or the tree
+    uses a field/operator the bitmaps do not cover; callers then fall back to
+    ``_metadata_matches_filter``.
+    """
+    if not where or not _SEARCH_INDEX_STATE["enabled"] or not _SEARCH_INDEX_STATE["ready"]:
+        return None
+    alive = _SEARCH_INDEX_STATE["alive"]
+    capacity = len(alive)
+
+    def _evaluate(node: object) -> Optional[np.ndarray]:
+        if not isinstance(node, dict):
+            return None
+        mask = np.ones(capacity, dtype=bool)
+        for key, expected in node.items():
+            if key in {"$and", "$or"}:
+                clauses = [_evaluate(clause) for clause in list(expected or [])]
+                if any(clause is None for clause in clauses):
+                    return None
+                if key == "$and":
+                    for clause in clauses:
+                        mask &= clause
+                else:
+                    combined = np.zeros(capacity, dtype=bool)
+                    for clause in clauses:
+                        combined |= clause
+                    mask &= combined
+                continue
+            if not _filter_bitmap_field(str(key)):
+                return None
+            if isinstance(expected, dict):
+                if set(expected.keys()) != {"$in"}:
+                    return None
+                values = list(expected.get("$in") or [])
+            else:
+                values = [expected]
+            matched = np.zeros(capacity, dtype=bool)
+            field_bitmaps = _FILTER_BITMAPS.get(str(key)) or {}
+            for value in values:
+                container = field_bitmaps.get(_filter_value_key(value) or "")
+                if container is not None:
+                    _bitmap_or_into(matched, container)
+            mask &= matched
+        return mask
+
+    mask = _evaluate(where)
+    if mask is None:
+        return None
+    return mask & alive
+
+def _filter_mask_allows(
+    mask: Optional[np.ndarray],
+    item_id: str,
+    md: Dict,
+    where: Optional[Dict[str, object]],
+) -> bool:
+    if mask is not None:
+        ord_value = _SEARCH_INDEX_STATE["ord_by_id"].get(str(item_id))
+        if ord_value is not None and ord_value < len(mask):
+            return bool(mask[ord_value])
+    return _metadata_matches_filter(md, where)
+
+def _search_index_chunk_ids(ords: List[int]) -> List[str]:
+    conn = _search_index_conn()
+    by_ord: Dict[int, str] = {}
+    for batch in _sql_batches(ords):
+        placeholders = ",".join("?" for _ in batch)
+        for ord_value, chunk_id in conn.execute(
+            f"SELECT ord, chunk_id FROM index_chunks WHERE ord IN ({placeholders})",
+            batch,
+        ):
+            by_ord[ord_value] = chunk_id
+    return [by_ord[ord_value] for ord_value in ords if ord_value in by_ord]
+
+_search_index_init()
+
+def _lexical_field_csr(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    tf: np.ndarray,
+    n_rows: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR (indptr, indices, data) term-frequency matrix, candidates x query terms."""
+    order = np.lexsort((cols, rows))
+    rows = rows[order]
+    indptr = np.searchsorted(rows, np.arange(n_rows + 1), side="left").astype(np.int64)
+    return indptr, cols[order], tf[order].astype(np.float64)
+
+def _bm25_field_scores(
+    csr: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    idf: np.ndarray,
+    field_lengths: np.ndarray,
+    avg_length: float,
+    weight: float,
+    k: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Bulk BM25 saturation over one CSR field; returns (row scores, row match counts)."""
+    indptr, indices, data = csr
+    n_rows = len(indptr) - 1
+    row_of_entry = np.repeat(np.arange(n_rows), np.diff(indptr))
+    b = min(1.0, max(0.0, RAG_BM25_B))
+    norm = 1.0 - b + b * (field_lengths / max(1.0, avg_length))
+    contrib = weight * idf[indices] * (data / (data + k * norm[row_of_entry]))
+    scores = np.bincount(row_of_entry, weights=contrib, minlength=n_rows)
+    matches = np.bincount(row_of_entry, minlength=n_rows)
+    return scores, matches
+
+def _phrase_positions_match(token_positions: List[np.ndarray], gaps: List[int], slop: int) -> bool:
+    """Ordered match of phrase tokens; ``slop`` is the extra span allowed over the phrase span."""
+    starts = token_positions[0]
+    current = starts
+    valid = np.ones(len(starts), dtype=bool)
+    for positions, gap in zip(token_positions[1:], gaps):
+        idx = np.searchsorted(positions, current + gap, side="left")
+        valid &= idx < len(positions)
+        current = positions[np.minimum(idx, len(positions) - 1)]
+    if not valid.any():
+        return False
+    extra = (current - starts) - sum(gaps)
+    return bool(np.any(valid & (extra <= slop)))
+
+def _lexical_phrase_matches(conn: sqlite3.Connection, compiled: Dict[str, object]) -> Dict[int, set]:
+    """Resolve compiled phrase plans against body positions; returns ord -> matched phrases.
+
+    Tokens that are not indexed (short words, stopwords) stay as gaps in the
+    plan, i.e. they match any single token at that position.
+    """
+    plans = compiled.get("phrase_plans") or []
+    if not plans:
+        return {}
+    slop = max(0, int(compiled.get("phrase_slop") or 0))
+    body_id = LEXICAL_FIELD_IDS["body"]
+    alive = _SEARCH_INDEX_STATE["alive"]
+    term_ids = _lexical_term_ids_unlocked(conn, [token for _, plan in plans for _, token in plan], create=False)
+    matches: Dict[int, set] = {}
+    for phrase, plan in plans:
+        if any(token not in term_ids for _, token in plan):
+            continue
+        candidate_ords: Optional[np.ndarray] = None
+        for _, token in plan:
+            ords = np.fromiter(
+                (row[0] for row in conn.execute(
+                    "SELECT ord FROM lexical_postings WHERE term_id = ? AND field = ?",
+                    (term_ids[token], body_id),
+                )),
+                dtype=np.int64,
+            )
+            candidate_ords = ords if candidate_ords is None else np.intersect1d(candidate_ords, ords, assume_unique=True)
+            if not len(candidate_ords):
+                break
+        if candidate_ords is None or not len(candidate_ords):
+            continue
+        candidate_ords = candidate_ords[(candidate_ords < len(alive))]
+        candidate_ords = candidate_ords[alive[candidate_ords]]
+        positions_by_token: Dict[str, Dict[int, np.ndarray]] = {}
+        for token in {token for _, token in plan}:
+            by_ord: Dict[int, np.ndarray] = {}
+            for batch in _sql_batches([int(value) for value in candidate_ords]):
+                placeholders = ",".join("?" for _ in batch)
+                for ord_value, blob in conn.execute(
+                    f"SELECT ord, positions FROM lexical_postings WHERE term_id = ? AND field = ? AND ord IN ({placeholders})",
+                    [term_ids[token], body_id, *batch],
+                ):
+                    by_ord[ord_value] = np.frombuffer(blob or b"", dtype=np.int32).astype(np.int64)
+            positions_by_token[token] = by_ord
+        gaps = [plan[index][0] - plan[index - 1][0] for index in range(1, len(plan))]
+        for ord_value in candidate_ords:
+            ord_value = int(ord_value)
+            token_positions = [positions_by_token[token].get(ord_value) for _, token in plan]
+            if any(positions is None or not len(positions) for positions in token_positions):
+                continue
+            if _phrase_positions_match(token_positions, gaps, slop):
+                matches.setdefault(ord_value, set()).add(phrase)
+    return matches
+
+def _lexical_index_term_stats(
+    compiled: Dict[str, object],
+    pool_limit: int,
+    filter_mask: Optional[np.ndarray] = None,
+) -> Dict[str, Dict[str, object]]:
+    """Look up postings for the compiled query and return per-chunk term stats.
+
+    Postings become CSR term-frequency matrices (candidates x query terms) for
+    the title and body fields and BM25 saturation is computed in bulk with
+    corpus IDF and per-field length normalisation. The result is keyed by chunk
+    id and capped to the ``pool_limit`` best chunks; ``filter_mask`` drops
+    filtered-out chunks before the pool is cut.
+    """
+    tokens: List[str] = list(compiled.get("tokens") or [])
+    if not tokens:
+        return {}
+    conn = _search_index_conn()
+    term_ids = _lexical_term_ids_unlocked(conn, tokens, create=False)
+    if not term_ids:
+        return {}
+    present = [token for token in tokens if token in term_ids]
+    col_by_term_id = {term_ids[token]: col for col, token in enumerate(present)}
+    placeholders = ",".join("?" for _ in col_by_term_id)
+    fetched = conn.execute(
+        f"SELECT term_id, field, ord, tf FROM lexical_postings WHERE term_id IN ({placeholders})",
+        list(col_by_term_id.keys()),
+    ).fetchall()
+    if not fetched:
+        return {}
+
+    postings = np.asarray(fetched, dtype=np.int64)
+    alive = _SEARCH_INDEX_STATE["alive"]
+    lengths = _SEARCH_INDEX_STATE["lengths"]
+    ords = postings[:, 2]
+    live = ords < len(alive)
+    live[live] = alive[ords[live]]
+    postings = postings[live]
+    if not len(postings):
+        return {}
+
+    n_terms = len(present)
+    cols = np.asarray([col_by_term_id[int(term_id)] for term_id in postings[:, 0]], dtype=np.int64)
+    # IDF comes from the whole live corpus; the filter only narrows what is scored.
+    doc_count = max(1, int(alive.sum()))
+    pairs = np.unique(postings[:, 2] * n_terms + cols)
+    df = np.bincount(pairs % n_terms, minlength=n_terms).astype(np.float64)
+    idf = np.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+
+    if filter_mask is not None:
+        allowed = postings[:, 2] < len(filter_mask)
+        allowed[allowed] = filter_mask[postings[allowed, 2]]
+        postings = postings[allowed]
+        cols = cols[allowed]
+        if not len(postings):
+            return {}
+    fields = postings[:, 1]
+    cand_ords, rows = np.unique(postings[:, 2], return_inverse=True)
+    n_rows = len(cand_ords)
+
+    live_lengths = lengths[: len(alive)][alive]
+    title_id = LEXICAL_FIELD_IDS["title"]
+    body_id = LEXICAL_FIELD_IDS["body"]
+    cand_lengths = lengths[cand_ords]
+    title_sel = fields == title_id
+    body_sel = fields == body_id
+    title_csr = _lexical_field_csr(rows[title_sel], cols[title_sel], postings[title_sel, 3], n_rows)
+    body_csr = _lexical_field_csr(rows[body_sel], cols[body_sel], postings[body_sel, 3], n_rows)
+    title_scores, title_matches = _bm25_field_scores(
+        title_csr, idf, cand_lengths[:, title_id].astype(np.float64),
+        float(live_lengths[:, title_id].mean()), RAG_BM25_TITLE_WEIGHT, RAG_BM25_TITLE_K,
+    )
+    body_scores, body_matches = _bm25_field_scores(
+        body_csr, idf, cand_lengths[:, body_id].astype(np.float64),
+        float(live_lengths[:, body_id].mean()), RAG_BM25_BODY_WEIGHT, RAG_BM25_BODY_K,
+    )
+    bm25_scores = title_scores + body_scores
+    text_sel = title_sel | body_sel
+    text_pairs = np.unique(rows[text_sel] * n_terms + cols[text_sel])
+    bm25_matches = np.bincount(text_pairs // n_terms, minlength=n_rows)
+    meta_pairs = np.unique(rows[~text_sel] * n_terms + cols[~text_sel])
+    pool_scores = bm25_scores + 0.5 * np.bincount(
+        meta_pairs // n_terms, weights=idf[meta_pairs % n_terms], minlength=n_rows
+    )
+    phrase_matches = _lexical_phrase_matches(conn, compiled)
+    if phrase_matches:
+        pool_scores = pool_scores + 3.0 * np.isin(cand_ords, np.fromiter(phrase_matches.keys(), dtype=np.int64))
+
+    pool_size = min(n_rows, max(1, pool_limit))
+    if pool_size < n_rows:
+        pool_rows = np.argpartition(-pool_scores, pool_size - 1)[:pool_size]
+    else:
+        pool_rows = np.arange(n_rows)
+    pool_rows = pool_rows[np.argsort(-pool_scores[pool_rows], kind="stable")]
+
+    chunk_rows: Dict[int, Tuple[str, str]] = {}
+    pool_ords = [int(cand_ords[row]) for row in pool_rows]
+    for batch in _sql_batches(pool_ords):
+        placeholders = ",".join("?" for _ in batch)
+        for ord_value, chunk_id, norm_body in conn.execute(
+            f"SELECT ord, chunk_id, norm_body FROM index_chunks WHERE ord IN ({placeholders})",
+            batch,
+        ):
+            chunk_rows[ord_value] = (chunk_id, norm_body)
+
+    short_fields = _SEARCH_INDEX_STATE["short_fields"]
+    out: Dict[str, Dict[str, object]] = {}
+    for row, ord_value in zip(pool_rows, pool_ords):
+        chunk_row = chunk_rows.get(ord_value)
+        short = short_fields.get(ord_value)
+        if not chunk_row or short is None:
+            continue
+        title_start, title_end = title_csr[0][row], title_csr[0][row + 1]
+        body_start, body_end = body_csr[0][row], body_csr[0][row + 1]
+        out[chunk_row[0]] = {
+            "title_tf": {present[col]: int(tf) for col, tf in zip(title_csr[1][title_start:title_end], title_csr[2][title_start:title_end])},
+            "body_tf": {present[col]: int(tf) for col, tf in zip(body_csr[1][body_start:body_end], body_csr[2][body_start:body_end])},
+            "bm25_score": float(bm25_scores[row]),
+            "bm25_matches": int(bm25_matches[row]),
+            "bm25_title_matches": int(title_matches[row]),
+            "bm25_body_matches": int(body_matches[row]),
+            "phrase_hits": phrase_matches.get(ord_value, set()),
+            "fields": _lexical_chunk_fields(short, chunk_row[1]),
+        }
+    return out
+
+def _lexical_rows_get(
+    ids: List[str],
+    where: Optional[Dict[str, object]],
+    lexical_cache: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
+    """Fetch candidate rows, sharing them across the queries of one batch via ``lexical_cache``."""
+    if lexical_cache is None:
+        return collection.get(ids=ids, where=where, include=["documents", "metadatas"])
+    rows = lexical_cache.setdefault(f"rows:{json.dumps(where, sort_keys=True, default=str)}", {})
+    missing = [item_id for item_id in ids if item_id not in rows]
+    if missing:
+        got = collection.get(ids=missing, where=where, include=["documents", "metadatas"])
+        docs = got.get("documents") or []
+        metas = got.get("metadatas") or []
+        for item_id in missing:
+            rows[item_id] = None
+        for i, item_id in enumerate(got.get("ids") or []):
+            rows[item_id] = (
+                docs[i] if i < len(docs) and isinstance(docs[i], str) else "",
+                metas[i] if i < len(metas) and isinstance(metas[i], dict) else {},
+            )
+    found = [item_id for item_id in ids if rows.get(item_id) is not None]
+    return {
+        "ids": found,
+        "documents": [rows[item_id][0] for item_id in found],
+        "metadatas": [rows[item_id][1] for item_id in found],
+    }
+
+def _fetch_lexical_candidates_indexed(
+    compiled: Dict[str, object],
+    chroma_where: Optional[Dict[str, object]],
+    allowed_channels: set,
+    filter_mask: Optional[np.ndarray] = None,
+    lexical_cache: Optional[Dict[str, object]] = None,
+    stats: Optional[Dict[str, object]] = None,
+) -> List[Dict[str, object]]:
+    started = perf_counter()
+    pool_limit = max(1, min(100000, RAG_LEXICAL_SCAN_LIMIT))
+    stats_by_id = _lexical_index_term_stats(compiled, pool_limit, filter_mask)
+    if not stats_by_id:
+        return []
+    got = _lexical_rows_get(
+        list(stats_by_id.keys()),
+        chroma_where if filter_mask is None else None,
+        lexical_cache,
+    )
+    if stats is not None:
+        stats["lexical_fetch_ms"] = (perf_counter() - started) * 1000
+    return _score_lexical_rows(compiled, got, allowed_channels, stats_by_id)
+
+def _score_lexical_rows(
+    compiled: Dict[str, object],
+    got: Dict[str, object],
+    allowed_channels: set,
+    stats_by_id: Optional[Dict[str, Dict[str, object]]] = None,
+) -> List[Dict[str, object]]:
+    started = perf_counter()
+    ids = got.get("ids") or []
+    docs = got.get("documents") or []
+    metas = got.get("metadatas") or []
+    scored: List[Dict[str, object]] = []
+    for i, item_id in enumerate(ids):
+        document = docs[i] if i < len(docs) and isinstance(docs[i], str) else ""
+        md = metas[i] if i < len(metas) and isinstance(metas[i], dict) else {}
+        term_stats = stats_by_id.get(item_id) if stats_by_id is not None else None
+        match = _lexical_match(compiled["query"], md, document, term_stats=term_stats, compiled=compiled)
+        if not match:
+            continue
+        channels = [item for item in list(match["channels"]) if item in allowed_channels]
+        if not channels:
+            continue
+        scored.append({
+            "id": item_id,
+            "document": document,
+            "metadata": md,
+            "score": float(match["score"]),
+            "channels": channels,
+            "bm25_score": match.get("bm25_score"),
+            "bm25_coverage": match.get("bm25_coverage"),
+            "bm25_matches": match.get("bm25_matches"),
+            "bm25_title_matches": match.get("bm25_title_matches"),
+            "bm25_body_matches": match.get("bm25_body_matches"),
+            "bm25_query_tokens": match.get("bm25_query_tokens"),
+        })
+    _metric_inc("rag_lexical_candidates_scanned_total", len(ids))
+    _metric_inc("rag_lexical_candidates_matched_total", len(scored))
+    _span_record("rag.lexical.score", started, scanned=len(ids), matched=len(scored))
+    return scored
+
+def _fetch_lexical_candidates(
+    query: str,
+    chroma_where: Optional[Dict[str, object]],
+    top_k: int,
+    requested_retrievers: Optional[List[str]] = None,
+    phrase_slop: int = 0,
+    filter_mask: Optional[np.ndarray] = None,
+    lexical_cache: Optional[Dict[str, object]] = None,
+    stats: Optional[Dict[str, object]] = None,
+) -> List[Dict[str, object]]:
+    """Score lexical candidates for one query.
+
+    ``lexical_cache`` is a per-request dict shared by the queries of a
+    ``/search/batch`` call so candidate rows and the fallback scan are fetched
+    from Chroma once per filter instead of once per query. ``stats`` receives
+    ``lexical_fetch_ms`` (posting lists + rows) and ``lexical_score_ms``.
+    """
+    if not RAG_LEXICAL_SEARCH_ENABLED or not str(query or "").strip():
+        return []
+    started = perf_counter()
+    allowed_channels = set(requested_retrievers or ["title_match", "exact_phrase", "bm25"])
+    compiled = _compile_lexical_query(query, phrase_slop=phrase_slop)
+    try:
+        if compiled["tokens"] and _search_index_ensure_ready():
+            scored = _fetch_lexical_candidates_indexed(
+                compiled,
+                chroma_where,
+                allowed_channels,
+                filter_mask,
+                lexical_cache,
+                stats,
+            )
+        else:
+            # Index still building (or query has no indexable terms): bounded collection scan.
+            scan_limit = max(1, min(100000, RAG_LEXICAL_SCAN_LIMIT))
+            scan_key = f"scan:{json.dumps(chroma_where, sort_keys=True, default=str)}"
+            got = lexical_cache.get(scan_key) if lexical_cache is not None else None
+            if got is None:
+                if chroma_where:
+                    got = collection.get(where=chroma_where, include=["documents", "metadatas"], limit=scan_limit)
+                else:
+                    got = collection.get(include=["documents", "metadatas"], limit=scan_limit)
+                if lexical_cache is not None:
+                    lexical_cache[scan_key] = got
+            fetched = perf_counter()
+            scored = _score_lexical_rows(compiled, got, allowed_channels)
+            if stats is not None:
+                stats["lexical_fetch_ms"] = (fetched - started) * 1000
+    except Exception:
+        logger.exception("lexical retrieval failed")
+        return []
+
+    scored.sort(key=lambda item: float(item.get("score") or 0), reverse=True)
+    limit = max(0, min(max(1, top_k), RAG_LEXICAL_TOP_K))
+    if stats is not None:
+        stats["lexical_score_ms"] = (perf_counter() - started) * 1000 - float(stats.get("lexical_fetch_ms") or 0)
+    return scored[:limit]
+
+# --------------------
+# Vector sidecar
+# --------------------
+# codes.i8 (ord x dim int8), scales.f32 (per-row scale, 0 = no vector) and, with
+# RAG_VECTOR_SIDECAR_BINARY, bits.u8 (packed sign bits). meta.json ties the files
+# to the collection and to the search-index build whose ords they use.
+VECTOR_SIDECAR_LOCK = Lock()
+_VECTOR_SIDECAR: Dict[str, object] = {
+    "ready": False,
+    "rebuilding": False,
+    "dim": 0,
+    "capacity": 0,
+    "codes": None,
+    "scales": None,
+    "bits": None,
+    "dirty": None,
+    "error": None,
+}
+
+def _vector_sidecar_identity() -> Dict[str, object]:
+    rebuilt_at = None
+    try:
+        row = _search_index_conn().execute("SELECT value FROM index_meta WHERE key = 'rebuilt_at'").fetchone()
+        rebuilt_at = row[0] if row else None
+    except Exception:
+        pass
+    return {"collection": collection.name, "index_rebuilt_at": rebuilt_at}
+
+def _vector_sidecar_open_unlocked(dim: int, capacity: int, create: bool = False) -> None:
+    RAG_VECTOR_SIDECAR_PATH.mkdir(parents=True, exist_ok=True)
+    mode = "w+" if create else "r+"
+    capacity = max(1, capacity)
+    _VECTOR_SIDECAR["codes"] = np.memmap(RAG_VECTOR_SIDECAR_PATH / "codes.i8", dtype=np.int8, mode=mode, shape=(capacity, dim))
+    _VECTOR_SIDECAR["scales"] = np.memmap(RAG_VECTOR_SIDECAR_PATH / "scales.f32", dtype=np.float32, mode=mode, shape=(capacity,))
+    _VECTOR_SIDECAR["bits"] = (
+        np.memmap(RAG_VECTOR_SIDECAR_PATH / "bits.u8", dtype=np.uint8, mode=mode, shape=(capacity, (dim + 7) // 8))
+        if RAG_VECTOR_SIDECAR_BINARY
+        else None
+    )
+    _VECTOR_SIDECAR["dim"] = dim
+    _VECTOR_SIDECAR["capacity"] = capacity
+
+def _vector_sidecar_grow_unlocked(ord_value: int) -> None:
+    capacity = int(_VECTOR_SIDECAR["capacity"])
+    if ord_value < capacity:
+        return
+    new_capacity = max(ord_value + 1, capacity * 2, 1024)
+    dim = int(_VECTOR_SIDECAR["dim"])
+    for name in ("codes", "scales", "bits"):
+        if _VECTOR_SIDECAR[name] is not None:
+            _VECTOR_SIDECAR[name].flush()
+    _VECTOR_SIDECAR.update(codes=None, scales=None, bits=None)
+    row_bytes = {"codes.i8": dim, "scales.f32": 4, "bits.u8": (dim + 7) // 8}
+    for file_name, width in row_bytes.items():
+        path = RAG_VECTOR_SIDECAR_PATH / file_name
+        if path.exists():
+            with open(path, "r+b") as handle:
+                handle.truncate(new_capacity * width)
+    _vector_sidecar_open_unlocked(dim, new_capacity)
+
+def _vector_sidecar_write_meta_unlocked() -> None:
+    meta = {**_vector_sidecar_identity(), "dim": _VECTOR_SIDECAR["dim"], "binary": RAG_VECTOR_SIDECAR_BINARY}
+    path = RAG_VECTOR_SIDECAR_PATH / "meta.json"
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+def _quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantisation; returns (codes, scales)."""
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    safe = np.where(scales > 0, scales, 1.0)
+    codes = np.clip(np.rint(matrix / safe[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _vector_sidecar_write_unlocked(ords: List[int], embeddings) -> None:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2 or not len(ords):
+        return
+    if not _VECTOR_SIDECAR["dim"]:
+        _vector_sidecar_open_unlocked(int(matrix.shape[1]), max(1024, max(ords) + 1), create=True)
+        if _VECTOR_SIDECAR["ready"]:
+            _vector_sidecar_write_meta_unlocked()
+    if matrix.shape[1] != _VECTOR_SIDECAR["dim"]:
+        raise ValueError(f"embedding has {matrix.shape[1]} dimensions, sidecar has {_VECTOR_SIDECAR['dim']}")
+    _vector_sidecar_grow_unlocked(max(ords))
+    rows = np.asarray(ords, dtype=np.int64)
+    codes, scales = _quantize_int8(matrix)
+    _VECTOR_SIDECAR["codes"][rows] = codes
+    _VECTOR_SIDECAR["scales"][rows] = scales
+    if _VECTOR_SIDECAR["bits"] is not None:
+        _VECTOR_SIDECAR["bits"][rows] = np.packbits(matrix > 0, axis=1)
+
+def _vector_sidecar_put(ids: List[str], embeddings) -> None:
+    """Store quantised copies of freshly written chunk embeddings (after the search-index write)."""
+    if not RAG_VECTOR_SIDECAR_ENABLED or not ids:
+        return
+    ord_by_id = _SEARCH_INDEX_STATE["ord_by_id"]
+    pairs = [(ord_by_id[str(chunk_id)], vector) for chunk_id, vector in zip(ids, embeddings) if str(chunk_id) in ord_by_id]
+    try:
+        with VECTOR_SIDECAR_LOCK:
+            if _VECTOR_SIDECAR["dirty"] is not None:
+                _VECTOR_SIDECAR["dirty"].update(str(chunk_id) for chunk_id in ids)
+            if pairs:
+                _vector_sidecar_write_unlocked([ord_value for ord_value, _ in pairs], [vector for _, vector in pairs])
+                for name in ("codes", "scales", "bits"):
+                    if _VECTOR_SIDECAR[name] is not None:
+                        _VECTOR_SIDECAR[name].flush()
+    except Exception as exc:
+        logger.exception("[rag][vector-sidecar] write failed; scheduling rebuild")
+        _VECTOR_SIDECAR["error"] = f"write_failed: {exc.__class__.__name__}"
+        _vector_sidecar_schedule_rebuild()
+
+def _vector_sidecar_copy_from_collection(ids: Optional[List[str]] = None) -> int:
+    """Quantise embeddings straight from Chroma: all of them, or only ``ids``."""
+    written = 0
+    page_size = max(16, RAG_SEARCH_INDEX_REBUILD_PAGE)
+    batches = _sql_batches(ids, page_size) if ids is not None else None
+    offset = 0
+    while True:
+        if batches is None:
+            got = collection.get(include=["embeddings"], limit=page_size, offset=offset)
+        else:
+            batch = next(batches, None)
+            if batch is None:
+                break
+            got = collection.get(ids=batch, include=["embeddings"])
+        page = got.get("ids") or []
+        if not page and batches is None:
+            break
+        offset += len(page)
+        ord_by_id = _SEARCH_INDEX_STATE["ord_by_id"]
+        embeddings = got.get("embeddings")
+        pairs = [(ord_by_id[chunk_id], embeddings[index]) for index, chunk_id in enumerate(page) if chunk_id in ord_by_id]
+        if pairs:
+            with VECTOR_SIDECAR_LOCK:
+                _vector_sidecar_write_unlocked([ord_value for ord_value, _ in pairs], [vector for _, vector in pairs])
+            written += len(pairs)
+    return written
+
+def _vector_sidecar_rebuild() -> int:
+    with VECTOR_SIDECAR_LOCK:
+        _VECTOR_SIDECAR.update(ready=False, rebuilding=True, dim=0, capacity=0, codes=None, scales=None, bits=None, dirty=set())
+        for file_name in ("codes.i8", "scales.f32", "bits.u8", "meta.json"):
+            (RAG_VECTOR_SIDECAR_PATH / file_name).unlink(missing_ok=True)
+    started = perf_counter()
+    try:
+        written = _vector_sidecar_copy_from_collection()
+        # Chunks written while we paged may have been copied before their upsert.
+        with VECTOR_SIDECAR_LOCK:
+            dirty = sorted(_VECTOR_SIDECAR["dirty"])
+            _VECTOR_SIDECAR["dirty"] = None
+        if dirty:
+            _vector_sidecar_copy_from_collection(dirty)
+        with VECTOR_SIDECAR_LOCK:
+            if _VECTOR_SIDECAR["dim"]:
+                for name in ("codes", "scales", "bits"):
+                    if _VECTOR_SIDECAR[name] is not None:
+                        _VECTOR_SIDECAR[name].flush()
+                _vector_sidecar_write_meta_unlocked()
+            _VECTOR_SIDECAR.update(ready=True, error=None)
+        logger.info("[rag][vector-sidecar] rebuilt vectors=%d ms=%.1f", written, (perf_counter() - started) * 1000)
+        return written
+    finally:
+        with VECTOR_SIDECAR_LOCK:
+            _VECTOR_SIDECAR.update(rebuilding=False, dirty=None)
+
+def _vector_sidecar_rebuild_safe() -> None:
+    if not RAG_VECTOR_SIDECAR_ENABLED:
+        return
+    try:
+        _vector_sidecar_rebuild()
+    except Exception as exc:
+        logger.exception("[rag][vector-sidecar] rebuild failed")
+        _VECTOR_SIDECAR["error"] = f"rebuild_failed: {exc.__class__.__name__}"
+
+def _vector_sidecar_schedule_rebuild() -> None:
+    if not RAG_VECTOR_SIDECAR_ENABLED or _VECTOR_SIDECAR["rebuilding"]:
+        return
+    _VECTOR_SIDECAR["rebuilding"] = True
+    _VECTOR_SIDECAR["ready"] = False
+    Thread(target=_vector_sidecar_rebuild_safe, name="vector-sidecar-rebuild", daemon=True).start()
+
+def _vector_sidecar_init() -> None:
+    if not RAG_VECTOR_SIDECAR_ENABLED or not _SEARCH_INDEX_STATE["enabled"]:
+        return
+    try:
+        meta_path = RAG_VECTOR_SIDECAR_PATH / "meta.json"
+        meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else None
+        identity = _vector_sidecar_identity()
+        if (
+            meta
+            and meta.get("collection") == identity["collection"]
+            and meta.get("index_rebuilt_at") == identity["index_rebuilt_at"]
+            and bool(meta.get("binary")) == RAG_VECTOR_SIDECAR_BINARY
+            and int(meta.get("dim") or 0) > 0
+        ):
+            dim = int(meta["dim"])
+            with VECTOR_SIDECAR_LOCK:
+                _vector_sidecar_open_unlocked(dim, (RAG_VECTOR_SIDECAR_PATH / "codes.i8").stat().st_size // dim)
+                _VECTOR_SIDECAR["ready"] = True
+            return
+    except Exception:
+        logger.exception("[rag][vector-sidecar] load failed; rebuilding")
+    if _SEARCH_INDEX_STATE["ready"]:
+        _vector_sidecar_schedule_rebuild()
+
+def _vector_sidecar_rows(filter_mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Ords to scan for ``filter_mask``, or None when the sidecar cannot answer exactly."""
+    if filter_mask is None or not _VECTOR_SIDECAR["ready"] or not _VECTOR_SIDECAR["dim"]:
+        return None
+    allowed = np.flatnonzero(filter_mask)
+    if len(allowed) > RAG_VECTOR_SCAN_MAX_ROWS:
+        return None
+    with VECTOR_SIDECAR_LOCK:
+        scales = _VECTOR_SIDECAR["scales"]
+        if scales is None or (len(allowed) and (allowed[-1] >= len(scales) or not np.all(scales[allowed] > 0))):
+            return None
+    return allowed
+
+def _exact_distances(matrix: np.ndarray, query: np.ndarray, space: str) -> np.ndarray:
+    """Chroma's distance for ``space`` between each row of ``matrix`` and ``query``."""
+    if space == "cosine":
+        norms = np.linalg.norm(matrix, axis=1) * max(float(np.linalg.norm(query)), 1e-12)
+        return 1.0 - (matrix @ query) / np.maximum(norms, 1e-12)
+    if space == "ip":
+        return 1.0 - matrix @ query
+    diff = matrix - query
+    return np.einsum("ij,ij->i", diff, diff)
+
+def _vector_sidecar_search(
+    plan: Dict[str, object],
+    embedding: List[float],
+    include_items: List[str],
+    rows: np.ndarray,
+) -> Tuple[List[Dict[str, object]], Dict[str, object]]:
+    """Filtered dense search: int8 scan over ``rows``, then full-precision rescoring."""
+    started = perf_counter()
+    query = np.asarray(embedding, dtype=np.float32)
+    top_k = plan["top_k"]
+    candidates = rows
+    shortlisted = False
+    # Only the memmap references are taken under the lock. Growing extends the
+    # files and a rebuild unlinks them, so held mappings stay readable; a row
+    # caught mid-write is corrected by the full-precision rescore below.
+    with VECTOR_SIDECAR_LOCK:
+        if query.shape[0] != _VECTOR_SIDECAR["dim"]:
+            raise ValueError(f"query has {query.shape[0]} dimensions, sidecar has {_VECTOR_SIDECAR['dim']}")
+        codes = _VECTOR_SIDECAR["codes"]
+        scales = _VECTOR_SIDECAR["scales"]
+        bits = _VECTOR_SIDECAR["bits"]
+    candidates = candidates[candidates < len(codes)]
+    if bits is not None and len(candidates) > RAG_VECTOR_BINARY_SHORTLIST:
+        hamming = np.bitwise_count(bits[candidates] ^ np.packbits(query > 0)).sum(axis=1, dtype=np.int32)
+        keep = np.argpartition(hamming, RAG_VECTOR_BINARY_SHORTLIST - 1)[:RAG_VECTOR_BINARY_SHORTLIST]
+        candidates = candidates[keep]
+        shortlisted = True
+    scores = np.empty(len(candidates), dtype=np.float32)
+    # Small blocks keep the int8 -> float32 widening in cache; that cast, not
+    # the dot product, dominates the scan.
+    block = 64
+    widened = np.empty((block, query.shape[0]), dtype=np.float32)
+    for start in range(0, len(candidates), block):
+        ords = candidates[start:start + block]
+        rows_f32 = widened[: len(ords)]
+        np.copyto(rows_f32, codes[ords], casting="unsafe")
+        scores[start:start + block] = (rows_f32 @ query) * scales[ords]
+    n_rescore = min(len(candidates), max(RAG_VECTOR_RESCORE_CANDIDATES, top_k * 4))
+    if n_rescore < len(candidates):
+        best = candidates[np.argpartition(-scores, n_rescore - 1)[:n_rescore]]
+    else:
+        best = candidates
+    scan_ms = (perf_counter() - started) * 1000
+
+    chunk_ids = _search_index_chunk_ids([int(ord_value) for ord_value in best])
+    got = collection.get(
+        ids=chunk_ids,
+        include=["embeddings"] + [item for item in ("documents", "metadatas") if item in include_items],
+    ) if chunk_ids else {"ids": []}
+    got_ids = list(got.get("ids") or [])
+    distances = (
+        _exact_distances(np.asarray(got.get("embeddings"), dtype=np.float32), query, _collection_hnsw(collection)["space"] or "l2")
+        if got_ids
+        else np.zeros(0)
+    )
+    order = np.argsort(distances, kind="stable")
+    res: Dict[str, object] = {"ids": [[got_ids[index] for index in order]]}
+    for item in ("documents", "metadatas"):
+        values = got.get(item)
+        if item in include_items and values is not None:
+            res[item] = [[values[index] for index in order]]
+    if "distances" in include_items:
+        res["distances"] = [[float(distances[index]) for index in order]]
+    flat, examined = _search_dense_results(plan, res)
+    return flat, {
+        "strategy": "sidecar_scan",
+        "rounds": 1,
+        "rows_scanned": int(len(rows)),
+        "binary_shortlist": int(len(candidates)) if shortlisted else None,
+        "rescored": len(got_ids),
+        "candidates_examined": examined,
+        "valid": len(flat),
+        "top_k": top_k,
+        "exhausted": len(rows) <= top_k,
+        "filter_pool": int(len(rows)),
+        "scan_ms": round(scan_ms, 3),
+        "rescore_ms": round((perf_counter() - started) * 1000 - scan_ms, 3),
+    }
+
+def _vector_sidecar_status() -> Dict[str, object]:
+    scales = _VECTOR_SIDECAR["scales"]
+    return {
+        "enabled": RAG_VECTOR_SIDECAR_ENABLED,
+        "ready": bool(_VECTOR_SIDECAR["ready"]),
+        "rebuilding": bool(_VECTOR_SIDECAR["rebuilding"]),
+        "dim": _VECTOR_SIDECAR["dim"],
+        "vectors": int(np.count_nonzero(scales)) if scales is not None else 0,
+        "binary": RAG_VECTOR_SIDECAR_BINARY,
+        "scan_max_rows": RAG_VECTOR_SCAN_MAX_ROWS,
+        "error": _VECTOR_SIDECAR["error"],
+        "path": str(RAG_VECTOR_SIDECAR_PATH),
+    }
+
+_vector_sidecar_init()
+
+# --------------------
+# Dense query planner
+# --------------------
+_EXACT_MATRIX_CACHE: "OrderedDict[str, Tuple[int, str, np.ndarray, List[str], np.ndarray]]" = OrderedDict()
+_EXACT_MATRIX_CACHE_LOCK = Lock()
+
+def _dense_query_plan(chroma_where: Optional[Dict[str, object]], filter_mask: Optional[np.ndarray]) -> Dict[str, object]:
+    """Pick how to run the dense channel from the filter's cardinality.
+
+    The filter bitmaps (per-value ord sets maintained at ingest) give the exact
+    number of allowed chunks, so the estimate is a count, not a guess.
+    """
+    alive = _SEARCH_INDEX_STATE["alive"]
+    if not chroma_where:
+        return {
+            "plan": "ann",
+            "estimated_rows": int(np.count_nonzero(alive)) if _SEARCH_INDEX_STATE["ready"] else None,
+            "source": "search_index",
+        }
+    if filter_mask is None:
+        return {"plan": "ann", "estimated_rows": None, "source": "unindexed_filter"}
+    rows = int(np.count_nonzero(filter_mask))
+    if rows == 0:
+        chosen = "empty"
+    elif rows <= RAG_EXACT_SCAN_MAX_ROWS:
+        chosen = "exact"
+    elif _vector_sidecar_rows(filter_mask) is not None:
+        chosen = "filtered_scan"
+    else:
+        chosen = "ann"
+    return {"plan": chosen, "estimated_rows": rows, "source": "filter_bitmaps"}
+
+def _exact_matrix(chroma_where: Dict[str, object], filter_mask: np.ndarray) -> Tuple[List[str], np.ndarray]:
+    """Chunk ids and full-precision embeddings of every chunk the filter allows."""
+    ords = np.flatnonzero(filter_mask)
+    key = json.dumps(chroma_where, sort_keys=True, default=str)
+    generation = _COLLECTION_GENERATION
+    with _EXACT_MATRIX_CACHE_LOCK:
+        entry = _EXACT_MATRIX_CACHE.get(key)
+        if entry is not None and entry[0] == generation and entry[1] == collection.name and np.array_equal(entry[2], ords):
+            _EXACT_MATRIX_CACHE.move_to_end(key)
+            return entry[3], entry[4]
+    ids: List[str] = []
+    rows: List[np.ndarray] = []
+    for batch in _sql_batches(_search_index_chunk_ids([int(ord_value) for ord_value in ords])):
+        got = collection.get(ids=batch, include=["embeddings"])
+        page = list(got.get("ids") or [])
+        if page:
+            ids.extend(page)
+            rows.append(np.asarray(got.get("embeddings"), dtype=np.float32))
+    matrix = np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+    if RAG_EXACT_MATRIX_CACHE_SIZE > 0:
+        with _EXACT_MATRIX_CACHE_LOCK:
+            _EXACT_MATRIX_CACHE[key] = (generation, collection.name, ords, ids, matrix)
+            _EXACT_MATRIX_CACHE.move_to_end(key)
+            while len(_EXACT_MATRIX_CACHE) > RAG_EXACT_MATRIX_CACHE_SIZE:
+                _EXACT_MATRIX_CACHE.popitem(last=False)
+    return ids, matrix
+
+def _exact_dense_search(
+    plan: Dict[str, object],
+    embedding: List[float],
+    include_items: List[str],
+) -> Tuple[List[Dict[str, object]], Dict[str, object]]:
+    """Exact top_k within a small filter: brute force over the cached embedding matrix."""
+    started = perf_counter()
+    ids, matrix = _exact_matrix(plan["chroma_where"], plan["filter_mask"])
+    top_k = plan["top_k"]
+    query = np.asarray(embedding, dtype=np.float32)
+    top_ids: List[str] = []
+    top_distances: List[float] = []
+    if ids:
+        distances = _exact_distances(matrix, query, _collection_hnsw(collection)["space"] or "l2")
+        k = min(top_k, len(ids))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        top_ids = [ids[index] for index in top]
+        top_distances = [float(distances[index]) for index in top]
+    scan_ms = (perf_counter() - started) * 1000
+    res: Dict[str, object] = {"ids": [top_ids]}
+    wanted = [item for item in ("documents", "metadatas") if item in include_items]
+    if wanted and top_ids:
+        got = collection.get(ids=top_ids, include=wanted)
+        position = {chunk_id: index for index, chunk_id in enumerate(got.get("ids") or [])}
+        for item in wanted:
+            values = got.get(item)
+            if values is not None:
+                res[item] = [[values[position[chunk_id]] if chunk_id in position else None for chunk_id in top_ids]]
+    if "distances" in include_items:
+        res["distances"] = [top_distances]
+    flat, examined = _search_dense_results(plan, res)
+    return flat, {
+        "strategy": "exact",
+        "rounds": 1,
+        "rows_scanned": len(ids),
+        "candidates_examined": examined,
+        "valid": len(flat),
+        "top_k": top_k,
+        "exhausted": len(ids) <= top_k,
+        "filter_pool": len(ids),
+        "scan_ms": round(scan_ms, 3),
+        "fetch_ms": round((perf_counter() - started) * 1000 - scan_ms, 3),
+    }
+
+# --------------------
+# Collection migration & benchmark
+# --------------------
+# A migration copies ids, embeddings, documents and metadatas into a new Chroma
+# collection built with the requested HNSW settings (nothing is re-embedded),
+# replays documents written meanwhile and swaps ``collection`` under
+# COLLECTION_WRITE_LOCK. ACTIVE_COLLECTION_PATH keeps the swap across restarts.
+def _collection_ids(target) -> List[str]:
+    ids: List[str] = []
+    page_size = max(16, RAG_COLLECTION_MIGRATE_PAGE)
+    while True:
+        got = target.get(include=[], limit=page_size, offset=len(ids))
+        page = got.get("ids") or []
+        if not page:
+            return ids
+        ids.extend(page)
+
+def _shorten_embeddings(matrix: np.ndarray, dimensions: Optional[int]) -> np.ndarray:
+    """Matryoshka shortening: keep the first ``dimensions`` components and re-normalise.
+
+    For text-embedding-3-* this matches what the API returns for ``dimensions``.
+    """
+    if not dimensions or dimensions >= matrix.shape[-1]:
+        return matrix
+    short = matrix[..., :dimensions]
+    norms = np.linalg.norm(short, axis=-1, keepdims=True)
+    return short / np.maximum(norms, 1e-12)
+
+def _collection_copy(target, got: Dict[str, object], dimensions: Optional[int] = None) -> int:
+    ids = list(got.get("ids") or [])
+    if not ids:
+        return 0
+    embeddings = _shorten_embeddings(np.asarray(got.get("embeddings"), dtype=np.float32), dimensions)
+    documents = got.get("documents")
+    metadatas = got.get("metadatas")
+    target.upsert(
+        ids=ids,
+        embeddings=embeddings.tolist(),
+        documents=list(documents) if documents is not None else None,
+        metadatas=[md if isinstance(md, dict) and md else None for md in metadatas] if metadatas is not None else None,
+    )
+    return len(ids)
+
+def _collection_write_active(name: str, previous: str) -> None:
+    tmp_path = ACTIVE_COLLECTION_PATH.with_suffix(f"{ACTIVE_COLLECTION_PATH.suffix}.tmp")
+    tmp_path.write_text(
+        json.dumps({"name": name, "previous": previous, "activated_at": now_iso()}, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+    os.replace(tmp_path, ACTIVE_COLLECTION_PATH)
+
+def _collection_migrate(payload: CollectionMigrateIn) -> Dict[str, object]:
+    global collection
+    source = collection
+    if isinstance(source, _ShardedCollection):
+        raise HTTPException(409, "Collection migration is not supported while RAG_SHARD_KEY is set")
+    source_dimensions = _embed_dimensions()
+    dimensions = payload.dimensions or source_dimensions
+    if payload.dimensions:
+        if not EMBED_MODEL.startswith("text-embedding-3"):
+            raise HTTPException(409, f"{EMBED_MODEL} does not support shortened embeddings")
+        # A native-size collection has no embed_dimensions; check the stored width.
+        probe = source.get(include=["embeddings"], limit=1).get("embeddings")
+        stored_dimensions = int(np.asarray(probe).shape[-1]) if probe is not None and len(probe) else source_dimensions
+        if stored_dimensions and payload.dimensions > stored_dimensions:
+            raise HTTPException(409, f"Cannot widen {stored_dimensions}-dimensional vectors to {payload.dimensions}")
+    suffix = f"-d{dimensions}" if dimensions else ""
+    target_name = f"{COLLECTION_NAME}-{payload.space}-m{payload.m}-ef{payload.construction_ef}{suffix}-{uuid.uuid4().hex[:8]}"
+    target = client.create_collection(
+        name=target_name,
+        configuration=_collection_configuration(payload.space, payload.m, payload.construction_ef, payload.search_ef),
+        metadata={"embed_model": EMBED_MODEL, "embed_dimensions": dimensions or 0},
+    )
+    include = ["embeddings", "documents", "metadatas"]
+    started = perf_counter()
+    with COLLECTION_WRITE_LOCK:
+        _COLLECTION_MIGRATION.update(running=True, target=target_name, copied=0, dirty=set())
+    try:
+        page_size = max(16, RAG_COLLECTION_MIGRATE_PAGE)
+        offset = 0
+        while True:
+            got = source.get(include=include, limit=page_size, offset=offset)
+            if not got.get("ids"):
+                break
+            copied = _collection_copy(target, got, dimensions)
+            offset += copied
+            _COLLECTION_MIGRATION["copied"] = offset
+        copy_ms = (perf_counter() - started) * 1000
+
+        # Catch up under the write lock: documents written during the copy, and
+        # any ids the offset paging skipped or duplicated while rows moved.
+        with COLLECTION_WRITE_LOCK:
+            swap_started = perf_counter()
+            dirty = sorted(_COLLECTION_MIGRATION["dirty"])
+            for doc_id in dirty:
+                target.delete(where={"doc_id": doc_id})
+                _collection_copy(target, source.get(where={"doc_id": doc_id}, include=include, limit=100000), dimensions)
+            source_ids = set(_collection_ids(source))
+            target_ids = set(_collection_ids(target))
+            missing = sorted(source_ids - target_ids)
+            extra = sorted(target_ids - source_ids)
+            for batch in _sql_batches(missing):
+                _collection_copy(target, source.get(ids=batch, include=include), dimensions)
+            if extra:
+                target.delete(ids=extra)
+            if target.count() != source.count():
+                raise RuntimeError(f"vector count mismatch after copy: {target.count()} != {source.count()}")
+            if payload.activate:
+                _collection_write_active(target_name, source.name)
+                collection = target
+            _COLLECTION_MIGRATION.update(running=False, target=None, dirty=set())
+            swap_ms = (perf_counter() - swap_started) * 1000
+    except Exception:
+        with COLLECTION_WRITE_LOCK:
+            _COLLECTION_MIGRATION.update(running=False, target=None, dirty=set())
+        try:
+            client.delete_collection(target_name)
+        except Exception:
+            logger.exception("[rag][collection] could not drop failed migration target %s", target_name)
+        raise
+
+    if payload.activate:
+        _bump_collection_generation()
+        _vector_sidecar_schedule_rebuild()
+        if payload.drop_previous:
+            try:
+                client.delete_collection(source.name)
+            except Exception:
+                logger.exception("[rag][collection] could not drop previous collection %s", source.name)
+    logger.info(
+        "[rag][collection] migrated %s -> %s vectors=%d replayed_docs=%d activated=%s",
+        source.name,
+        target_name,
+        len(source_ids),
+        len(dirty),
+        payload.activate,
+    )
+    return {
+        "collection": target_name,
+        "previous": source.name,
+        "activated": payload.activate,
+        "vectors": len(source_ids),
+        "replayed_documents": len(dirty),
+        "embed_dimensions": dimensions,
+        "hnsw": _collection_hnsw(target),
+        "copy_ms": round(copy_ms, 3),
+        "swap_ms": round(swap_ms, 3),
+    }
+
+def _collection_status() -> Dict[str, object]:
+    hnsw = _collection_hnsw(collection)
+    configured = {
+        "space": RAG_HNSW_SPACE,
+        "m": RAG_HNSW_M,
+        "construction_ef": RAG_HNSW_CONSTRUCTION_EF,
+        "search_ef": RAG_HNSW_SEARCH_EF,
+    }
+    return {
+        "name": collection.name,
+        "embed_model": (collection.metadata or {}).get("embed_model") or EMBED_MODEL,
+        "embed_dimensions": _embed_dimensions(),
+        "hnsw": hnsw,
+        "configured": configured,
+        "needs_migration": any(hnsw[key] != configured[key] for key in ("space", "m", "construction_ef")),
+        "migration": {
+            "running": bool(_COLLECTION_MIGRATION["running"]),
+            "target": _COLLECTION_MIGRATION["target"],
+            "copied": _COLLECTION_MIGRATION["copied"],
+        },
+        "shard_key": RAG_SHARD_KEY or None,
+        "shards": collection.shard_counts() if isinstance(collection, _ShardedCollection) else None,
+    }
+
+def _latency_summary(samples_ms: List[float]) -> Dict[str, object]:
+    if not samples_ms:
+        return {"p50_ms": None, "p95_ms": None, "mean_ms": None}
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+def _exact_neighbours(matrix: np.ndarray, query: np.ndarray, space: str, k: int) -> List[int]:
+    """Brute-force top-k rows of ``matrix`` under Chroma's distance for ``space``."""
+    distances = _exact_distances(matrix, query, space)
+    k = min(k, len(distances))
+    top = np.argpartition(distances, k - 1)[:k]
+    return top[np.argsort(distances[top], kind="stable")].tolist()
+
+def _collection_benchmark(payload: CollectionBenchmarkIn) -> Dict[str, object]:
+    """recall@k against exact search and query latency for each search_ef setting.
+
+    Call with COLLECTION_BENCHMARK_LOCK held.
+    """
+    target = collection
+    if payload.collection and payload.collection != collection.name:
+        try:
+            target = client.get_collection(payload.collection)
+        except Exception:
+            raise HTTPException(404, f"Collection not found: {payload.collection}")
+    serving = target is collection or (target.metadata or {}).get("shard_of") == collection.name
+    if serving and any(search_ef != _collection_hnsw(target)["search_ef"] for search_ef in payload.search_ef or []):
+        # Live /search would run with the sweep's ef until it finished.
+        raise HTTPException(
+            409,
+            "search_ef sweeps change the serving collection; benchmark a copy built with /collection/migrate (activate: false)",
+        )
+    total = target.count()
+    if total > RAG_COLLECTION_BENCHMARK_MAX_VECTORS:
+        raise HTTPException(409, f"Collection has {total} vectors; benchmark limit is {RAG_COLLECTION_BENCHMARK_MAX_VECTORS}")
+    ids: List[str] = []
+    rows: List[np.ndarray] = []
+    page_size = max(16, RAG_COLLECTION_MIGRATE_PAGE)
+    while True:
+        got = target.get(include=["embeddings"], limit=page_size, offset=len(ids))
+        page = got.get("ids") or []
+        if not page:
+            break
+        ids.extend(page)
+        rows.append(np.asarray(got.get("embeddings"), dtype=np.float32))
+    if not ids:
+        raise HTTPException(409, "Collection is empty")
+    matrix = np.vstack(rows)
+    hnsw = _collection_hnsw(target)
+    space = hnsw["space"] or "l2"
+    k = min(payload.k, len(ids))
+
+    query_source = "queries"
+    if payload.queries:
+        # Queries come back at the serving collection's size; match the target's.
+        embedded = np.asarray(_embed_queries_with_usage(payload.queries).get("embeddings") or [], dtype=np.float32)
+        if embedded.shape[-1] < matrix.shape[1]:
+            raise HTTPException(
+                409,
+                f"Query embeddings have {embedded.shape[-1]} dimensions, collection has {matrix.shape[1]}; use stored vectors (omit queries)",
+            )
+        queries = list(_shorten_embeddings(embedded, int(matrix.shape[1])))
+    else:
+        query_source = "stored_vectors"
+        picks = np.random.default_rng(payload.seed).choice(len(ids), size=min(payload.sample, len(ids)), replace=False)
+        queries = [matrix[index] for index in picks]
+
+    exact_ms: List[float] = []
+    truth: List[set] = []
+    for query in queries:
+        started = perf_counter()
+        truth.append({ids[index] for index in _exact_neighbours(matrix, query, space, k)})
+        exact_ms.append((perf_counter() - started) * 1000)
+
+    dimension_rows = []
+    for dimensions in payload.dimensions or []:
+        if dimensions > matrix.shape[1]:
+            dimension_rows.append({"dimensions": dimensions, "skipped": f"stored vectors have {matrix.shape[1]} dimensions"})
+            continue
+        short = _shorten_embeddings(matrix, dimensions)
+        latencies = []
+        recalls = []
+        for query, expected in zip(queries, truth):
+            started = perf_counter()
+            found = {ids[index] for index in _exact_neighbours(short, _shorten_embeddings(query, dimensions), space, k)}
+            latencies.append((perf_counter() - started) * 1000)
+            recalls.append(len(expected & found) / max(len(expected), 1))
+        dimension_rows.append({
+            "dimensions": dimensions,
+            f"recall_at_{k}": round(float(np.mean(recalls)), 4),
+            "vector_bytes": int(short.shape[1]) * 4 * len(ids),
+            **_latency_summary(latencies),
+        })
+
+    original_ef = hnsw["search_ef"]
+    settings = []
+    try:
+        for search_ef in payload.search_ef or [original_ef]:
+            if search_ef != _collection_hnsw(target)["search_ef"]:
+                target.modify(configuration={"hnsw": {"ef_search": int(search_ef)}})
+            target.query(query_embeddings=[queries[0].tolist()], n_results=k, include=[])
+            latencies: List[float] = []
+            recalls: List[float] = []
+            for query, expected in zip(queries, truth):
+                started = perf_counter()
+                res = target.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+                latencies.append((perf_counter() - started) * 1000)
+                recalls.append(len(expected & set(_query_result_row(res, "ids", 0))) / max(len(expected), 1))
+            settings.append({
+                "search_ef": search_ef,
+                f"recall_at_{k}": round(float(np.mean(recalls)), 4),
+                **_latency_summary(latencies),
+            })
+    finally:
+        if original_ef is not None and _collection_hnsw(target)["search_ef"] != original_ef:
+            target.modify(configuration={"hnsw": {"ef_search": int(original_ef)}})
+    return {
+        "collection": target.name,
+        "hnsw": _collection_hnsw(target),
+        "vectors": len(ids),
+        "k": k,
+        "query_source": query_source,
+        "queries": len(queries),
+        "exact": {"dimensions": int(matrix.shape[1]), "vector_bytes": int(matrix.nbytes), **_latency_summary(exact_ms)},
+        "settings": settings,
+        "dimensions": dimension_rows,
+    }
+
+# --------------------
+# Routes
+# --------------------
+@app.get("/health")
+def health():
+    reg = _load_registry()
+    try:
+        n = collection.count()
+    except Exception:
+        n = -1
+    return {
+        "ok": True,
+        "status": "ok",
+        "vectors": n,
+        "documents": len(reg),
+        "embed_model": EMBED_MODEL,
+        "collection": COLLECTION_NAME,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "allowed_mime": sorted(list(ALLOWED_MIME)),
+        "storage_dir": os.path.realpath(str(STORAGE_DIR)),
+        "search_index": _search_index_status(),
+        "vector_sidecar": _vector_sidecar_status(),
+        "query_embed_cache": _query_embed_cache_status(),
+        "chunk_embed_store": _chunk_embed_store_status(),
+        "search_cache": _search_cache_status(),
+        "search_timings": _search_timing_status(),
+        "vector_collection": _collection_status(),
+    }
+
+@app.get("/metrics")
+def metrics():
+    if not RAG_METRICS_ENABLED:
+        raise HTTPException(404, "Metrics are disabled")
+    return Response(content=_metrics_render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.post("/search-index/rebuild", dependencies=[Depends(_require_key)])
+def rebuild_search_index():
+    if not _SEARCH_INDEX_STATE["enabled"]:
+        raise HTTPException(409, "Search index is disabled")
+    if not _search_index_claim_rebuild():
+        raise HTTPException(409, "Search index rebuild already running")
+    try:
+        indexed = _search_index_rebuild()
+    except Exception as exc:
+        _SEARCH_INDEX_STATE["error"] = f"rebuild_failed: {exc.__class__.__name__}"
+        raise HTTPException(500, f"Search index rebuild failed: {exc}")
+    return {"ok": True, "indexed_chunks": indexed, "search_index": _search_index_status()}
+
+@app.post("/collection/migrate", dependencies=[Depends(_require_key)])
+def migrate_collection(payload: CollectionMigrateIn):
+    if _COLLECTION_MIGRATION["running"]:
+        raise HTTPException(409, "Collection migration already running")
+    try:
+        result = _collection_migrate(payload)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.exception("[rag][collection] migration failed")
+        raise HTTPException(500, f"Collection migration failed: {exc}")
+    return {"ok": True, **result, "vector_collection": _collection_status()}
+
+@app.post("/collection/reshard", dependencies=[Depends(_require_key)])
+def reshard_collection():
+    if not isinstance(collection, _ShardedCollection):
+        raise HTTPException(409, "Sharding is disabled (set RAG_SHARD_KEY)")
+    if _COLLECTION_MIGRATION["running"]:
+        raise HTTPException(409, "Collection migration is running")
+    try:
+        result = collection.reshard()
+    except Exception as exc:
+        logger.exception("[rag][collection] reshard failed")
+        raise HTTPException(500, f"Collection reshard failed: {exc}")
+    return {"ok": True, **result, "vector_collection": _collection_status()}
+
+@app.post("/collection/benchmark", dependencies=[Depends(_require_key)])
+def benchmark_collection(payload: CollectionBenchmarkIn):
+    if _COLLECTION_MIGRATION["running"]:
+        raise HTTPException(409, "Collection migration is running")
+    if not COLLECTION_BENCHMARK_LOCK.acquire(blocking=False):
+        raise HTTPException(409, "Collection benchmark already running")
+    try:
+        result = _collection_benchmark(payload)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(500, f"Collection benchmark failed: {exc}")
+    finally:
+        COLLECTION_BENCHMARK_LOCK.release()
+    return {"ok": True, **result}
+
+@app.post("/embedding-store/compact", dependencies=[Depends(_require_key)])
+def compact_chunk_embed_store(payload: ChunkEmbedStoreCompactIn):
+    try:
+        result = _chunk_embed_store_compact(payload.max_mb, payload.current_model_only, payload.drop_unreferenced)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.exception("[rag][embed-store] compaction failed")
+        raise HTTPException(500, f"Chunk embedding store compaction failed: {exc}")
+    return {"ok": True, **result}
+
+# --- Ephemeral analyze (no persistence) ---
+@app.post("/analyze", dependencies=[Depends(_require_key)])
+async def analyze(
+    file: UploadFile = File(...),
+    mimeType: Optional[str] = Form(None),
+    maxChunks: Optional[int] = Form(None),
+):
+    raw = await file.read()
+    if not raw:
+        raise HTTPException(400, "Empty file")
+    size_mb = _bytes_mb(raw)
+    if size_mb > MAX_MB:
+        raise HTTPException(413, f"File too large ({size_mb:.1f}MB > {MAX_MB}MB)")
+
+    declared_mime = mimeType or file.content_type
+    mime = _detect_mime(file.filename or "file", raw, declared_mime)
+    if ALLOWED_MIME and mime not in ALLOWED_MIME:
+        raise HTTPException(415, f"MIME not allowed: {mime}")
+
+    # extract text (without saving to storage or indexing)
+    # NOTE: keep raw_text with lõigud/pealkirjad kasutajale kuvamiseks.
+    if mime == "application/pdf":
+        pages = _extract_text_from_pdf(raw)
+        texts = [t for (_, t) in pages if t]
+        raw_text = "\n\n".join(texts)
+    elif mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+        raw_text = _extract_text_from_docx(raw)
+    elif mime == "text/html":
+        raw_text = _extract_text_from_html(raw.decode("utf-8", errors="ignore"))
+    else:
+        raw_text = raw.decode("utf-8", errors="ignore")
+
+    # clean up only for chunking (embeddings), mitte kasutaja eelvaadet
+    cleaned_text = _clean_text(raw_text)
+    chunks = _split_chunks(cleaned_text)
+    if maxChunks is not None:
+        try:
+            k = int(maxChunks)
+            if k > 0:
+                chunks = chunks[:k]
+        except Exception:
+            pass
+
+    # Tagasta kliendile täistekst; eelvaateks kärbi, et vältida liiga suurt payloadi
+    # (kuid jäta lõigud alles).
+    preview = raw_text[:8000]
+    return {
+        "ok": True,
+        "fileName": file.filename,
+        "mimeType": mime,
+        "sizeMB": round(size_mb, 2),
+        "chunks": chunks,
+        "preview": preview,
+        "fullText": raw_text,
+    }
+
+# --- shared worker for file ingestion (used by JSON + multipart) ---
+def _process_ingest_file(
+    doc_id: str,
+    file_name: str,
+    raw: bytes,
+    mime_declared: Optional[str],
+    meta: Dict,
     page_start: Optional[int] = None,
     page_end: Optional[int] = None,
     observability: Optional[Dict[str, object]] = None,
@@ -3352,7 +7325,7 @@ def _process_ingest_file(
 
     existing_doc_known = doc_id in _load_registry()
     try:
-        inserted = _replace_document_vectors(
+        changes = _replace_document_vectors(
             doc_id,
             text_or_pages,
             meta_common={
@@ -3435,7 +7408,8 @@ def _process_ingest_file(
 
     return {
         "ok": True,
-        "inserted": inserted,
+        "inserted": changes["inserted"],
+        "chunk_changes": changes,
         "docId": doc_id,
         "pageRange": pages_compact,
         "shortRef": summary_ref,
@@ -3510,10 +7484,10 @@ def ingest_text(payload: IngestText, request: Request):
     )
 
     if chunks:
-        chunk_payload = _build_explicit_chunk_payload(doc_id, chunks, meta_common)
+        chunk_payload = _build_explicit_chunk_payload(doc_id, chunks, meta_common, embed=False)
         if not chunk_payload["count"]:
             raise HTTPException(400, "chunks must contain readable text")
-        inserted = _replace_document_vectors_payload(
+        changes = _replace_document_vectors_payload(
             doc_id,
             chunk_payload,
             observability=observability,
@@ -3522,7 +7496,7 @@ def ingest_text(payload: IngestText, request: Request):
         text = str(payload.text or "")
         if not text.strip():
             raise HTTPException(400, "text is required")
-        inserted = _replace_document_vectors(
+        changes = _replace_document_vectors(
             doc_id,
             text,
             meta_common=meta_common,
@@ -3579,7 +7553,7 @@ def ingest_text(payload: IngestText, request: Request):
     }
     _register(doc_id, reg_entry)
 
-    return {"ok": True, "inserted": inserted, "docId": doc_id}
+    return {"ok": True, "inserted": changes["inserted"], "chunk_changes": changes, "docId": doc_id}
 
 # --- Multipart ingest (compat with older UI / direct browser forms) ---
 @app.post("/upload", dependencies=[Depends(_require_key)])
@@ -3794,7 +7768,7 @@ def ingest_url(payload: IngestURL, request: Request):
     html_path = d / "source.html"
     html_path.write_text(html, encoding="utf-8")
 
-    inserted = _replace_document_vectors(
+    changes = _replace_document_vectors(
         doc_id,
         text,
         meta_common={
@@ -3865,7 +7839,7 @@ def ingest_url(payload: IngestURL, request: Request):
     }
     _register(doc_id, reg_entry)
 
-    return {"ok": True, "inserted": inserted, "docId": doc_id}
+    return {"ok": True, "inserted": changes["inserted"], "chunk_changes": changes, "docId": doc_id}
 
 # ------------- Ingest ARTICLES (magazine workflow) ----------------
 def _parse_range(range_str: str) -> Optional[Tuple[int, int]]:
@@ -4103,8 +8077,19 @@ def get_document_chunks(
         raise HTTPException(404, "Document not in registry")
 
     safe_limit = max(1, min(int(limit or 10000), 100000))
+    where: Dict[str, object] = {}
+    if item_type:
+        where["item_type"] = str(item_type).strip()
+    if source_type:
+        where["source_type"] = str(source_type).strip()
+    filter_mask = _search_index_filter_mask({"doc_id": doc_id, **where})
     try:
-        got = collection.get(where={"doc_id": doc_id}, include=["documents", "metadatas"], limit=safe_limit)
+        if filter_mask is not None:
+            chunk_ids = _search_index_chunk_ids([int(value) for value in np.flatnonzero(filter_mask)[:safe_limit]])
+            got = collection.get(ids=chunk_ids, include=["documents", "metadatas"]) if chunk_ids else {}
+            where = {}
+        else:
+            got = collection.get(where={"doc_id": doc_id}, include=["documents", "metadatas"], limit=safe_limit)
     except Exception as exc:
         logger.exception("Document chunks read failed for doc_id=%s", doc_id)
         raise HTTPException(500, "Document chunks read failed") from exc
@@ -4112,11 +8097,6 @@ def get_document_chunks(
     ids = got.get("ids", []) or []
     documents = got.get("documents") or []
     metadatas = got.get("metadatas") or []
-    where: Dict[str, object] = {}
-    if item_type:
-        where["item_type"] = str(item_type).strip()
-    if source_type:
-        where["source_type"] = str(source_type).strip()
 
     chunks = []
     for index, item_id in enumerate(ids):
@@ -4201,7 +8181,7 @@ def reindex(doc_id: str):
         else:
             text_or_pages = raw.decode("utf-8", errors="ignore")
 
-        inserted = _replace_document_vectors(doc_id, text_or_pages, meta_common={
+        changes = _replace_document_vectors(doc_id, text_or_pages, meta_common={
             "title": entry.get("title"),
             "description": entry.get("description"),
             "authors": entry.get("authors"),
@@ -4232,13 +8212,13 @@ def reindex(doc_id: str):
         })
         entry["lastIngested"] = now_iso()
         _register(doc_id, entry)
-        return {"ok": True, "inserted": inserted, "doc": entry}
+        return {"ok": True, "inserted": changes["inserted"], "chunk_changes": changes, "doc": entry}
 
     if entry.get("type") == "URL":
         html_path = Path(entry["path"])
         html = html_path.read_text(encoding="utf-8")
         text = _extract_text_from_html(html)
-        inserted = _replace_document_vectors(doc_id, text, meta_common={
+        changes = _replace_document_vectors(doc_id, text, meta_common={
             "title": entry.get("title"),
             "description": entry.get("description"),
             "authors": entry.get("authors"),
@@ -4270,17 +8250,17 @@ def reindex(doc_id: str):
         })
         entry["lastIngested"] = now_iso()
         _register(doc_id, entry)
-        return {"ok": True, "inserted": inserted, "doc": entry}
+        return {"ok": True, "inserted": changes["inserted"], "chunk_changes": changes, "doc": entry}
 
     if entry.get("type") == "TEXT":
         text_path = Path(entry.get("path") or "")
         if not text_path.exists():
             raise HTTPException(404, "Stored text source is missing")
         text = text_path.read_text(encoding="utf-8")
-        inserted = _replace_document_vectors(doc_id, text, meta_common=dict(entry))
+        changes = _replace_document_vectors(doc_id, text, meta_common=dict(entry))
         entry["lastIngested"] = now_iso()
         _register(doc_id, entry)
-        return {"ok": True, "inserted": inserted, "doc": entry}
+        return {"ok": True, "inserted": changes["inserted"], "chunk_changes": changes, "doc": entry}
 
     raise HTTPException(400, "Unsupported registry entry type")
 
@@ -4395,8 +8375,13 @@ def patch_document_metadata(doc_id: str, payload: PatchMetadata):
             for index in range(len(ids)):
                 row = metadatas[index] if index < len(metadatas) and isinstance(metadatas[index], dict) else {}
                 new_metadatas.append({**row, **updates})
-            collection.update(ids=ids, metadatas=new_metadatas)
+            with COLLECTION_WRITE_LOCK:
+                _collection_note_write(doc_id)
+                started = perf_counter()
+                collection.update(ids=ids, metadatas=new_metadatas)
+                _chroma_observe("update", started)
             chunks_updated = len(ids)
+            _search_index_update_metadata(ids, new_metadatas)
     except Exception as exc:
         raise HTTPException(500, f"Registry updated but chunk metadata update failed: {exc}")
 
@@ -4409,10 +8394,15 @@ def patch_document_metadata(doc_id: str, payload: PatchMetadata):
 
 @app.delete("/documents/{doc_id}", dependencies=[Depends(_require_key)])
 def delete_doc(doc_id: str):
+    started = perf_counter()
     try:
-        collection.delete(where={"doc_id": doc_id})
+        with COLLECTION_WRITE_LOCK:
+            _collection_note_write(doc_id)
+            collection.delete(where={"doc_id": doc_id})
+            _chroma_observe("delete", started)
     except Exception:
         pass
+    _search_index_delete_document(doc_id)
 
     had = _pop_registry_entry(doc_id)
 
@@ -4430,8 +8420,292 @@ def delete_doc(doc_id: str):
 
     return {"ok": True, "deleted": doc_id, "hadEntry": had}
 
-@app.post("/search", dependencies=[Depends(_require_key)])
-def search(payload: SearchIn, request: Request):
+def _build_search_groups(flat: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    groups_map: Dict[Tuple[str, str, str], Dict] = {}
+    for r in flat:
+        article_id = r.get("articleId") or ""
+        doc_id = r.get("doc_id") or ""
+        title_key = (r.get("title") or "").strip()
+        key = (article_id, doc_id, title_key)
+        g = groups_map.get(key)
+        if not g:
+            g = {
+                "doc_id": doc_id or None,
+                "docId": r.get("docId") or doc_id or None,
+                "title": r.get("title"),
+                "authors": r.get("authors"),
+                "year": r.get("year"),
+                "issue": r.get("issue"),
+                "audience": r.get("audience"),
+                "audiences": r.get("audiences"),
+                "url": r.get("url"),
+                "source_type": r.get("source_type"),
+                "fileName": r.get("fileName"),
+                "section": r.get("section"),
+                "articleId": r.get("articleId"),
+                "journalTitle": r.get("journalTitle"),
+                "collection_id": r.get("collection_id"),
+                "country": r.get("country"),
+                "county": r.get("county"),
+                "jurisdiction_level": r.get("jurisdiction_level"),
+                "municipality_name": r.get("municipality_name"),
+                "municipality_id": r.get("municipality_id"),
+                "district_name": r.get("district_name"),
+                "district_id": r.get("district_id"),
+                "item_type": r.get("item_type"),
+                "content_status": r.get("content_status"),
+                "resource_type": r.get("resource_type"),
+                "checked_at": r.get("checked_at"),
+                "source_keys": r.get("source_keys"),
+                "source_urls": r.get("source_urls"),
+                "source_register_file": r.get("source_register_file"),
+                "source_count": r.get("source_count"),
+                "administering_body": r.get("administering_body"),
+                "tags": r.get("tags"),
+                "language": r.get("language"),
+                "retrieval_channels": set(),
+                "pages_all": [],
+                "page_ranges": [],
+                "items": [],
+            }
+            groups_map[key] = g
+        if isinstance(r.get("page"), int):
+            g["pages_all"].append(r["page"])
+        if isinstance(r.get("pages"), list):
+            for p in r["pages"]:
+                if isinstance(p, int):
+                    g["pages_all"].append(p)
+        if isinstance(r.get("pageRange"), str) and r["pageRange"]:
+            g["page_ranges"].append(r["pageRange"])
+        if isinstance(r.get("tags"), list):
+            if not isinstance(g.get("tags"), list):
+                g["tags"] = []
+            for t in r["tags"]:
+                if t and t not in g["tags"]:
+                    g["tags"].append(t)
+        g["items"].append(r)
+        if isinstance(r.get("retrieval_channels"), list):
+            for channel in r["retrieval_channels"]:
+                if channel:
+                    g["retrieval_channels"].add(channel)
+
+    def _collapse_pages_local(pages):
+        s = sorted({p for p in pages if isinstance(p, int)})
+        if not s:
+            return ""
+        out = []
+        start = prev = None
+        for p in s:
+            if start is None:
+                start = prev = p
+                continue
+            if p == prev + 1:
+                prev = p
+                continue
+            out.append(f"{start}" if start == prev else f"{start}–{prev}")
+            start = prev = p
+        out.append(f"{start}" if start == prev else f"{start}–{prev}")
+        return ", ".join(out)
+
+    groups = []
+    for g in groups_map.values():
+        pages_compact = _collapse_pages_local(g["pages_all"]) or (", ".join(sorted(set(g["page_ranges"]))) if g["page_ranges"] else "")
+        meta_for_ref = {
+            "authors": g["authors"],
+            "title": g["title"],
+            "year": g["year"],
+            "issue": g["issue"],
+            "issue_id": g["issue"],
+            "journal_title": g.get("journalTitle"),
+        }
+        short_ref = _make_short_ref(meta_for_ref, pages_compact)
+        groups.append({
+            "doc_id": g["doc_id"],
+            "docId": g.get("docId"),
+            "title": g["title"],
+            "authors": g["authors"],
+            "year": g["year"],
+            "issue": g["issue"],
+            "audience": g["audience"],
+            "audiences": g.get("audiences"),
+            "url": g["url"],
+            "source_type": g["source_type"],
+            "fileName": g["fileName"],
+            "section": g["section"],
+            "articleId": g["articleId"],
+            "journalTitle": g["journalTitle"],
+            "collection_id": g.get("collection_id"),
+            "country": g.get("country"),
+            "county": g.get("county"),
+            "jurisdiction_level": g.get("jurisdiction_level"),
+            "municipality_name": g.get("municipality_name"),
+            "municipality_id": g.get("municipality_id"),
+            "district_name": g.get("district_name"),
+            "district_id": g.get("district_id"),
+            "item_type": g.get("item_type"),
+            "content_status": g.get("content_status"),
+            "resource_type": g.get("resource_type"),
+            "checked_at": g.get("checked_at"),
+            "source_keys": g.get("source_keys"),
+            "source_urls": g.get("source_urls"),
+            "source_register_file": g.get("source_register_file"),
+            "source_count": g.get("source_count"),
+            "administering_body": g.get("administering_body"),
+            "retrieval_channels": sorted(list(g.get("retrieval_channels") or [])),
+            "tags": g.get("tags"),
+            "language": g.get("language"),
+            "pages": pages_compact,
+            "short_ref": short_ref,
+            "count": len(g["items"]),
+            "items": g["items"],
+        })
+
+    groups.sort(key=lambda x: (-x["count"], x["title"] or ""))
+    return groups
+
+def _project_search_response(
+    response: Dict[str, object],
+    view: str = "full",
+    fields: Optional[List[str]] = None,
+) -> Dict[str, object]:
+    """Apply the ``view`` / ``fields`` projection to a computed search response.
+
+    Runs after the result cache, so cached responses stay complete and every
+    projection of the same search shares one cache entry.
+    """
+    if view == "full" and not fields:
+        return response
+    if fields:
+        keys = ["id"] + [str(key) for key in fields if str(key) and str(key) != "id"]
+    else:
+        keys = list(SEARCH_IDS_ONLY_FIELDS if view == "ids_only" else SEARCH_COMPACT_FIELDS)
+    group_keys = ("doc_id", "count") if view == "ids_only" else SEARCH_COMPACT_GROUP_FIELDS
+    results = [{key: item[key] for key in keys if key in item} for item in response.get("results") or []]
+    index_by_id = {str(item.get("id")): index for index, item in enumerate(response.get("results") or [])}
+    groups = []
+    for group in response.get("groups") or []:
+        projected = {key: group[key] for key in group_keys if key in group}
+        projected["item_indexes"] = [
+            index_by_id[str(item.get("id"))]
+            for item in group.get("items") or []
+            if str(item.get("id")) in index_by_id
+        ]
+        groups.append(projected)
+    out = {key: value for key, value in response.items() if key not in {"results", "groups"}}
+    out["results"] = results
+    out["groups"] = groups
+    out["view"] = "fields" if fields else view
+    return out
+
+def _search_json_response(content: Dict[str, object]):
+    """Serialise a search response with orjson, skipping FastAPI's generic encoder."""
+    if not _ORJSON_OK:
+        return content
+    return Response(
+        content=orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS),
+        media_type="application/json",
+    )
+
+_SEARCH_CACHE: "OrderedDict[Tuple[int, str], Tuple[float, Dict[str, object]]]" = OrderedDict()
+_SEARCH_CACHE_LOCK = Lock()
+_SEARCH_CACHE_INFLIGHT: Dict[Tuple[int, str], Dict[str, object]] = {}
+_SEARCH_CACHE_STATS = {"hits": 0, "misses": 0, "coalesced": 0}
+
+def _search_cache_key(payload: SearchIn) -> str:
+    canonical = {
+        "query": _query_embed_cache_key(payload.query)[1],
+        "top_k": max(1, min(50, payload.top_k or 5)),
+        "filterDocId": payload.filterDocId or None,
+        "where": payload.where if isinstance(payload.where, dict) else None,
+        "include": sorted(payload.include or []),
+        "retrievers": _normalize_requested_retrievers(payload.retrievers),
+        "phrase_slop": payload.phrase_slop,
+    }
+    encoded = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def _search_cache_get(key: Tuple[int, str]) -> Optional[Dict[str, object]]:
+    with _SEARCH_CACHE_LOCK:
+        entry = _SEARCH_CACHE.get(key)
+        if entry is None:
+            return None
+        if time() - entry[0] > RAG_SEARCH_CACHE_TTL_SEC:
+            del _SEARCH_CACHE[key]
+            return None
+        _SEARCH_CACHE.move_to_end(key)
+        return entry[1]
+
+def _search_cache_put(key: Tuple[int, str], result: Dict[str, object]) -> None:
+    with _SEARCH_CACHE_LOCK:
+        if key[0] != _COLLECTION_GENERATION:
+            return
+        stale = [cached_key for cached_key in _SEARCH_CACHE if cached_key[0] != key[0]]
+        for cached_key in stale:
+            del _SEARCH_CACHE[cached_key]
+        _SEARCH_CACHE[key] = (time(), result)
+        _SEARCH_CACHE.move_to_end(key)
+        while len(_SEARCH_CACHE) > RAG_SEARCH_CACHE_SIZE:
+            _SEARCH_CACHE.popitem(last=False)
+
+def _search_cache_status() -> Dict[str, object]:
+    with _SEARCH_CACHE_LOCK:
+        size = len(_SEARCH_CACHE)
+        inflight = len(_SEARCH_CACHE_INFLIGHT)
+    return {
+        "enabled": RAG_SEARCH_CACHE_SIZE > 0,
+        "size": size,
+        "max_size": RAG_SEARCH_CACHE_SIZE,
+        "ttl_sec": RAG_SEARCH_CACHE_TTL_SEC,
+        "generation": _COLLECTION_GENERATION,
+        "inflight": inflight,
+        **_SEARCH_CACHE_STATS,
+    }
+
+def _search_cached(payload: SearchIn, request: Request) -> Dict[str, object]:
+    """Serve ``_run_search`` through the result cache.
+
+    Concurrent misses for the same key are coalesced: the first request computes
+    the result and the others wait on its event instead of re-running the
+    pipeline. Error responses are never cached.
+    """
+    started = perf_counter()
+    key = (_COLLECTION_GENERATION, _search_cache_key(payload))
+    cached = _search_cache_get(key)
+    if cached is not None:
+        _SEARCH_CACHE_STATS["hits"] += 1
+        return {**cached, "result_cache": "hit", "timings": _search_timings(started)}
+    with _SEARCH_CACHE_LOCK:
+        flight = _SEARCH_CACHE_INFLIGHT.get(key)
+        leader = flight is None
+        if leader:
+            flight = {"event": Event(), "result": None}
+            _SEARCH_CACHE_INFLIGHT[key] = flight
+    if not leader:
+        _SEARCH_CACHE_STATS["coalesced"] += 1
+        flight["event"].wait(RAG_SEARCH_COALESCE_WAIT_SEC)
+        if flight["result"] is not None:
+            return {**flight["result"], "result_cache": "coalesced", "timings": _search_timings(started)}
+        return _run_search(payload, request)
+    _SEARCH_CACHE_STATS["misses"] += 1
+    try:
+        result = _run_search(payload, request)
+        if not result.get("error"):
+            flight["result"] = result
+            _search_cache_put(key, result)
+        return {**result, "result_cache": "miss"}
+    finally:
+        with _SEARCH_CACHE_LOCK:
+            _SEARCH_CACHE_INFLIGHT.pop(key, None)
+        flight["event"].set()
+
+def _search_plan(payload: SearchIn) -> Dict[str, object]:
+    """Resolve filters and the exact provision lookup for one search request.
+
+    ``response`` is already set when ``provision_lookup`` answers the query on
+    its own; otherwise the caller embeds the query, runs the dense query and
+    finishes with ``_search_finish``.
+    """
+    started = perf_counter()
     md_where: Dict[str, object] = {}
     requested_retrievers = _normalize_requested_retrievers(payload.retrievers)
 
@@ -4508,177 +8782,300 @@ def search(payload: SearchIn, request: Request):
         elif isinstance(jurisdiction, str):
             md_where["jurisdiction_level"] = normalize_jurisdiction(jurisdiction)
 
-    embed_result = _embed_batch_with_usage([payload.query])
-    q_embeds = list(embed_result.get("embeddings") or [])
-    if not q_embeds:
-        return {"results": [], "groups": [], "retrievers_used": ["dense"], "search_strategy": "dense"}
-    q_emb = q_embeds[0]
-    observability = _build_observability_context(
-        request,
-        "rag_search",
-        top_k=max(1, min(50, payload.top_k or 5)),
+    chroma_where = _compose_chroma_where(md_where)
+    filter_mask = _search_index_filter_mask(chroma_where)
+    top_k = max(1, min(50, payload.top_k or 5))
+    normalize_ms = (perf_counter() - started) * 1000
+    provision_refs = (
+        _extract_query_provision_refs(payload.query)
+        if any(channel in requested_retrievers for channel in ["provision_lookup", "title_match"])
+        else []
     )
-    result_count = 0
+    provision_started = perf_counter()
+    provision_stats: Dict[str, object] = {}
+    provision_candidates = _fetch_provision_candidates(
+        provision_refs,
+        chroma_where,
+        top_k,
+        provision_stats,
+        filter_mask=filter_mask,
+    )
+    provision_info = {
+        "refs": [
+            {key: ref[key] for key in ("act", "paragraph", "subsection", "point") if ref[key]}
+            for ref in provision_refs
+        ],
+        "hits": len(provision_candidates),
+        "lookup_ms": provision_stats.get("lookup_ms"),
+        "latency_ms": round((perf_counter() - provision_started) * 1000, 3),
+        "short_circuit": False,
+    } if provision_refs else None
+    plan: Dict[str, object] = {
+        "payload": payload,
+        "requested_retrievers": requested_retrievers,
+        "top_k": top_k,
+        "chroma_where": chroma_where,
+        "filter_mask": filter_mask,
+        "dense_plan": _dense_query_plan(chroma_where, filter_mask),
+        "provision_candidates": provision_candidates,
+        "provision_info": provision_info,
+        # Stage timings (ms) filled in as the request moves through the pipeline.
+        "stages": {
+            "normalize_ms": normalize_ms,
+            "provision_ms": (perf_counter() - provision_started) * 1000 if provision_refs else None,
+        },
+        "response": None,
+    }
+    if provision_candidates and RAG_PROVISION_SHORT_CIRCUIT and _provision_query_is_pure(payload.query, provision_refs):
+        provision_info["short_circuit"] = True
+        plan["response"] = _search_provision_response(plan)
+    return plan
 
-    chroma_where = _compose_chroma_where(md_where)
+def _search_provision_response(plan: Dict[str, object]) -> Dict[str, object]:
+    skeletons = _search_index_skeletons([str(candidate["id"]) for candidate in plan["provision_candidates"]])
+    flat = []
+    for rank, candidate in enumerate(plan["provision_candidates"], start=1):
+        provision_result = _search_result_from_metadata(
+            item_id=str(candidate["id"]),
+            document=str(candidate.get("document") or ""),
+            md=candidate["metadata"],
+            distance=None,
+            channels=list(candidate["channels"]),
+            rank=rank,
+            lexical_score=float(candidate["score"]),
+            lexical_details=candidate,
+            skeleton=skeletons.get(str(candidate["id"])),
+        )
+        provision_result["lexical_rank"] = rank
+        flat.append(provision_result)
+    _apply_hybrid_ranking(flat)
+    return {
+        "results": flat,
+        "groups": _build_search_groups(flat),
+        "retrievers_used": ["provision_lookup"],
+        "search_strategy": "provision_lookup",
+        "merge_strategy": _build_hybrid_merge_strategy(plan["requested_retrievers"]),
+        "channel_stats": _build_channel_stats(flat),
+        "provision_lookup": plan["provision_info"],
+    }
 
-    try:
-        include_items = payload.include or ["documents", "metadatas", "distances"]
+def _dense_search_result(
+    item_id: str,
+    document: str,
+    md: Dict,
+    distance,
+    rank: int,
+    skeleton: Optional[Dict[str, object]] = None,
+) -> Dict[str, object]:
+    return {
+        "id": item_id,
+        "retriever": "dense",
+        "retrieval_channel": "dense",
+        "retrievalChannel": "dense",
+        "retrieval_channels": ["dense"],
+        "retrieval_rank": rank,
+        "dense_rank": rank,
+        **(skeleton if skeleton is not None else _result_skeleton(md)),
+        "chunk": document,
+        "distance": distance,
+    }
 
-        res = collection.query(
-            query_embeddings=[q_emb],
-            n_results=max(1, min(50, payload.top_k or 5)),
-            where=chroma_where,
-            include=include_items,
-        )
-    except Exception as e:
-        _log_rag_cost_usage(
-            model=embed_result.get("model"),
-            latency_ms=embed_result.get("latency_ms"),
-            prompt_tokens=_to_int(embed_result.get("prompt_tokens")),
-            total_tokens=_to_int(embed_result.get("total_tokens")),
-            embedding_input_count=int(embed_result.get("embedding_input_count") or 0),
-            text_chars=_to_int(embed_result.get("text_chars")),
-            chunk_count=1,
-            result_count=result_count,
-            cost_read_directly=bool(embed_result.get("cost_read_directly")),
-            **observability,
-        )
-        return {
-            "results": [],
-            "groups": [],
-            "retrievers_used": ["dense"],
-            "search_strategy": "dense",
-            "error": f"query_failed: {e.__class__.__name__}: {e}",
-        }
+def _query_result_row(res: Dict[str, object], key: str, row: int) -> List[object]:
+    rows = res.get(key) or []
+    if row >= len(rows) or not rows[row]:
+        return []
+    return list(rows[row])
 
-    ids = (res.get("ids") or [[]])[0] if res.get("ids") else []
-    docs = (res.get("documents") or [[]])[0] if res.get("documents") else []
-    metas = (res.get("metadatas") or [[]])[0] if res.get("metadatas") else []
-    dists = (res.get("distances") or [[]])[0] if res.get("distances") else []
+def _search_dense_results(
+    plan: Dict[str, object],
+    res: Dict[str, object],
+    row: int = 0,
+) -> Tuple[List[Dict[str, object]], int]:
+    """Turn row ``row`` of a ``collection.query`` result into at most top_k dense results.
 
-    flat = []
+    Also returns how many Chroma candidates were examined to find them.
+    """
+    ids = _query_result_row(res, "ids", row)
+    docs = _query_result_row(res, "documents", row)
+    metas = _query_result_row(res, "metadatas", row)
+    dists = _query_result_row(res, "distances", row)
+    valid = []
+    examined = 0
     for i, _id in enumerate(ids):
-        ch = docs[i] if i < len(docs) and isinstance(docs[i], str) else ""
+        if len(valid) >= plan["top_k"]:
+            break
+        examined += 1
         md = metas[i] if i < len(metas) and isinstance(metas[i], dict) else {}
-        if not _metadata_matches_filter(md, chroma_where):
-            continue
-        source_path = md.get("source_path")
-        file_name = None
-        if source_path:
+        if _filter_mask_allows(plan["filter_mask"], _id, md, plan["chroma_where"]):
+            valid.append((i, _id, md))
+    skeletons = _search_index_skeletons([str(item_id) for _, item_id, _ in valid])
+    flat = []
+    for i, _id, md in valid:
+        ch = docs[i] if i < len(docs) and isinstance(docs[i], str) else ""
+        distance = dists[i] if i < len(dists) else None
+        flat.append(_dense_search_result(_id, ch, md, distance, i + 1, skeletons.get(str(_id))))
+    return flat, examined
+
+# Observed share of Chroma hits that survive the post-filter, per filter shape.
+_DENSE_KEEP_RATES: Dict[str, float] = {}
+_DENSE_KEEP_RATES_LOCK = Lock()
+
+def _dense_filter_shape(where: Optional[Dict[str, object]]) -> str:
+    """Key for the keep-rate table: the where clause with its literal values dropped."""
+    def _shape(node: object) -> object:
+        if isinstance(node, dict):
+            return {key: _shape(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [_shape(item) for item in node]
+        return None
+    return json.dumps(_shape(where), sort_keys=True)
+
+def _dense_initial_fetch(plan: Dict[str, object]) -> int:
+    """n_results for the first Chroma query: top_k scaled by the learned keep rate."""
+    top_k = plan["top_k"]
+    if not plan["chroma_where"]:
+        return top_k
+    with _DENSE_KEEP_RATES_LOCK:
+        keep_rate = _DENSE_KEEP_RATES.get(_dense_filter_shape(plan["chroma_where"]), 1.0)
+    return max(top_k, min(max(top_k, RAG_DENSE_OVERFETCH_MAX), math.ceil(top_k / max(keep_rate, 0.05))))
+
+def _dense_record_keep_rate(plan: Dict[str, object], examined: int, kept: int) -> None:
+    if not plan["chroma_where"] or examined <= 0:
+        return
+    shape = _dense_filter_shape(plan["chroma_where"])
+    observed = kept / examined
+    with _DENSE_KEEP_RATES_LOCK:
+        previous = _DENSE_KEEP_RATES.get(shape)
+        _DENSE_KEEP_RATES[shape] = observed if previous is None else previous * 0.7 + observed * 0.3
+        if len(_DENSE_KEEP_RATES) > 512:
+            _DENSE_KEEP_RATES.pop(next(iter(_DENSE_KEEP_RATES)))
+
+def _dense_fetch(
+    plan: Dict[str, object],
+    embedding: List[float],
+    include_items: List[str],
+    res: Optional[Dict[str, object]] = None,
+    row: int = 0,
+    fetch_k: Optional[int] = None,
+) -> Tuple[List[Dict[str, object]], Dict[str, object]]:
+    """Dense retrieval that over-fetches until ``top_k`` hits pass the filter.
+
+    ``res``/``row``/``fetch_k`` hand in an already executed first round (as
+    ``/search/batch`` does). The first Chroma error propagates; errors in later
+    rounds keep the hits found so far.
+    """
+    chosen = (plan.get("dense_plan") or {}).get("plan") if res is None else "ann"
+    if chosen == "empty":
+        return [], {"strategy": "empty", "rounds": 0, "candidates_examined": 0, "valid": 0, "top_k": plan["top_k"], "exhausted": True, "filter_pool": 0}
+    if chosen == "exact":
+        try:
+            return _exact_dense_search(plan, embedding, include_items)
+        except Exception:
+            logger.exception("[rag][planner] exact scan failed; falling back to HNSW")
+    if chosen == "filtered_scan":
+        rows = _vector_sidecar_rows(plan["filter_mask"])
+        if rows is not None:
             try:
-                file_name = Path(source_path).name
+                return _vector_sidecar_search(plan, embedding, include_items, rows)
             except Exception:
-                file_name = source_path
-        issue_val = md.get("issue_label") or md.get("issueLabel") or md.get("issue_id") or md.get("issueId") or None
-        authors_val = normalize_authors(md.get("authors") or md.get("authors_list"))
-        tags_val = normalize_tags(md.get("tags") or md.get("tags_list"))
-        tag_tokens_val = normalize_tag_tokens(md.get("tag_tokens") or md.get("tagTokens") or tags_val)
-        flat.append({
-            "id": _id,
-            "retriever": "dense",
-            "retrieval_channel": "dense",
-            "retrievalChannel": "dense",
-            "retrieval_channels": ["dense"],
-            "retrieval_rank": i + 1,
-            "dense_rank": i + 1,
-            "doc_id": md.get("doc_id") or md.get("docId"),
-            "docId": md.get("docId") or md.get("doc_id"),
-            "chunk_id": md.get("chunk_id") or md.get("chunkId"),
-            "chunkId": md.get("chunkId") or md.get("chunk_id"),
-            "chunk_index": md.get("chunk_index") or md.get("chunkIndex"),
-            "chunkIndex": md.get("chunkIndex") or md.get("chunk_index"),
-            "original_doc_id": md.get("original_doc_id") or md.get("originalDocId"),
-            "originalDocId": md.get("originalDocId") or md.get("original_doc_id"),
-            "title": md.get("title"),
-            "description": md.get("description"),
-            "audience": md.get("audience"),
-            "audiences": md.get("audiences"),
-            "authors": authors_val,
-            "tag_tokens": tag_tokens_val,
-            "tagTokens": tag_tokens_val,
-            "issue": issue_val,
-            "issueLabel": md.get("issue_label") or md.get("issueLabel"),
-            "issueId": md.get("issue_id") or md.get("issueId"),
-            "year": md.get("year"),
-            "articleId": md.get("article_id") or md.get("articleId"),
-            "section": md.get("section"),
-            "item_type": md.get("item_type"),
-            "content_status": md.get("content_status"),
-            "resource_type": md.get("resource_type"),
-            "checked_at": md.get("checked_at"),
-            "pages": md.get("pages"),
-            "pageRange": md.get("pageRange"),
-            "journalTitle": md.get("journal_title") or md.get("journalTitle"),
-            "source_id": md.get("source_id"),
-            "sourceId": md.get("sourceId") or md.get("source_id"),
-            "document_id": md.get("document_id"),
-            "documentId": md.get("documentId") or md.get("document_id"),
-            "legacy_source_type": md.get("legacy_source_type"),
-            "authority": md.get("authority"),
-            "url_canonical": md.get("url_canonical"),
-            "retrieved_at": md.get("retrieved_at"),
-            "last_checked": md.get("last_checked"),
-            "valid_from": md.get("valid_from"),
-            "valid_to": md.get("valid_to"),
-            "historical": md.get("historical"),
-            "source_status": md.get("source_status"),
-            "canonical_item_id": md.get("canonical_item_id"),
-            "content_hash": md.get("content_hash"),
-            "collection_id": md.get("collection_id"),
-            "country": md.get("country"),
-            "county": md.get("county"),
-            "jurisdiction_level": md.get("jurisdiction_level"),
-            "municipality_name": md.get("municipality_name"),
-            "municipality": md.get("municipality"),
-            "issuer": md.get("issuer"),
-            "act_title": md.get("act_title"),
-            "act_reference": md.get("act_reference"),
-            "chapter_number": md.get("chapter_number"),
-            "chapter_title": md.get("chapter_title"),
-            "paragraph_number": md.get("paragraph_number"),
-            "paragraph_title": md.get("paragraph_title"),
-            "subsection_number": md.get("subsection_number"),
-            "point_number": md.get("point_number"),
-            "chunk_level": md.get("chunk_level"),
-            "canonical_source_id": md.get("canonical_source_id"),
-            "canonical_chunk_id": md.get("canonical_chunk_id"),
-            "source_format": md.get("source_format"),
-            "municipality_id": md.get("municipality_id"),
-            "district_name": md.get("district_name"),
-            "district_id": md.get("district_id"),
-            "source_keys": md.get("source_keys"),
-            "source_urls": md.get("source_urls"),
-            "source_register_file": md.get("source_register_file"),
-            "source_count": md.get("source_count"),
-            "administering_body": md.get("administering_body"),
-            "tags": tags_val,
-            "language": md.get("language"),
-            "chunk": ch,
-            "url": md.get("source_url"),
-            "fileName": file_name,
-            "source_type": md.get("source_type"),
-            "page": md.get("page"),
-            "distance": dists[i] if i < len(dists) else None,
-        })
+                logger.exception("[rag][vector-sidecar] scan failed; falling back to HNSW")
+    top_k = plan["top_k"]
+    max_fetch = max(top_k, RAG_DENSE_OVERFETCH_MAX)
+    pool = int(np.count_nonzero(plan["filter_mask"])) if plan["filter_mask"] is not None else None
+    fetch_k = fetch_k or _dense_initial_fetch(plan)
+    rounds = 0
+    while True:
+        if res is None:
+            try:
+                started = perf_counter()
+                res = collection.query(
+                    query_embeddings=[embedding],
+                    n_results=fetch_k,
+                    where=plan["chroma_where"],
+                    include=include_items,
+                )
+                _chroma_observe("query", started)
+            except Exception:
+                if not rounds:
+                    raise
+                logger.exception("[rag][search] dense over-fetch round failed")
+                break
+            row = 0
+        rounds += 1
+        flat, examined = _search_dense_results(plan, res, row)
+        returned = len(_query_result_row(res, "ids", row))
+        exhausted = returned < fetch_k or (pool is not None and returned >= pool)
+        if (
+            len(flat) >= top_k
+            or exhausted
+            or fetch_k >= max_fetch
+            or rounds >= max(1, RAG_DENSE_OVERFETCH_ROUNDS)
+        ):
+            break
+        keep_rate = max(len(flat), 1) / max(examined, 1)
+        fetch_k = min(max_fetch, max(fetch_k * 2, math.ceil(top_k / keep_rate * 1.2)))
+        res = None
+    _dense_record_keep_rate(plan, examined, len(flat))
+    return flat, {
+        "rounds": rounds,
+        "n_results": fetch_k,
+        "candidates_examined": examined,
+        "valid": len(flat),
+        "top_k": top_k,
+        "exhausted": bool(exhausted),
+        "filter_pool": pool,
+    }
 
-    lexical_candidates = (
-        _fetch_lexical_candidates(
-            payload.query,
-            chroma_where,
-            max(1, min(50, payload.top_k or 5)),
-            requested_retrievers,
-        )
-        if any(channel in requested_retrievers for channel in ["title_match", "exact_phrase", "bm25"])
-        else []
+def _search_lexical_candidates(
+    plan: Dict[str, object],
+    lexical_cache: Optional[Dict[str, object]] = None,
+) -> List[Dict[str, object]]:
+    payload = plan["payload"]
+    requested_retrievers = plan["requested_retrievers"]
+    if not any(channel in requested_retrievers for channel in ["title_match", "exact_phrase", "bm25"]):
+        return []
+    return _fetch_lexical_candidates(
+        payload.query,
+        plan["chroma_where"],
+        plan["top_k"],
+        requested_retrievers,
+        phrase_slop=payload.phrase_slop,
+        filter_mask=plan["filter_mask"],
+        lexical_cache=lexical_cache,
+        stats=plan["stages"],
     )
+
+def _search_lexical_batch(
+    plans: Dict[int, Dict[str, object]],
+    lexical_cache: Dict[str, object],
+) -> Dict[int, List[Dict[str, object]]]:
+    return {index: _search_lexical_candidates(plan, lexical_cache) for index, plan in plans.items()}
+
+def _search_finish(
+    plan: Dict[str, object],
+    flat: List[Dict[str, object]],
+    lexical_candidates: List[Dict[str, object]],
+) -> Dict[str, object]:
+    """Merge lexical and provision candidates into the dense results and rank them."""
+    started = perf_counter()
+    requested_retrievers = plan["requested_retrievers"]
+    chroma_where = plan["chroma_where"]
+    filter_mask = plan["filter_mask"]
+    provision_candidates = plan["provision_candidates"]
+    provision_info = plan["provision_info"]
+    lexical_candidates = _merge_provision_candidates(lexical_candidates, provision_candidates)
     flat_by_id = {str(item.get("id") or ""): item for item in flat if item.get("id")}
+    skeletons = _search_index_skeletons([
+        str(candidate.get("id") or "").strip()
+        for candidate in lexical_candidates
+        if str(candidate.get("id") or "").strip() not in flat_by_id
+    ])
     for rank, candidate in enumerate(lexical_candidates, start=1):
         item_id = str(candidate.get("id") or "").strip()
         if not item_id:
             continue
         candidate_md = candidate.get("metadata") if isinstance(candidate.get("metadata"), dict) else {}
-        if not _metadata_matches_filter(candidate_md, chroma_where):
+        if not _filter_mask_allows(filter_mask, item_id, candidate_md, chroma_where):
             continue
         channels = [str(item) for item in candidate.get("channels") or [] if str(item or "").strip()]
         if not channels:
@@ -4708,12 +9105,14 @@ def search(payload: SearchIn, request: Request):
             rank=rank,
             lexical_score=float(candidate.get("score") or 0),
             lexical_details=candidate,
+            skeleton=skeletons.get(item_id),
         )
         lexical_result["lexical_rank"] = rank
         flat_by_id[item_id] = lexical_result
         flat.append(lexical_result)
+    merged = perf_counter()
     _apply_hybrid_ranking(flat)
-    result_count = len(flat)
+    ranked = perf_counter()
     retrievers_used: List[str] = []
     for item in flat:
         for channel in item.get("retrieval_channels") if isinstance(item.get("retrieval_channels"), list) else []:
@@ -4721,6 +9120,152 @@ def search(payload: SearchIn, request: Request):
                 retrievers_used.append(channel)
     if not retrievers_used:
         retrievers_used = ["dense"]
+    groups = _build_search_groups(flat)
+    plan["stages"].update(
+        merge_ms=(merged - started) * 1000,
+        hybrid_rank_ms=(ranked - merged) * 1000,
+        group_ms=(perf_counter() - ranked) * 1000,
+    )
+    return {
+        "results": flat,
+        "groups": groups,
+        "retrievers_used": retrievers_used,
+        "search_strategy": "hybrid" if any(channel != "dense" for channel in retrievers_used) else "dense",
+        "merge_strategy": _build_hybrid_merge_strategy(requested_retrievers),
+        "channel_stats": _build_channel_stats(flat),
+        **({"provision_lookup": provision_info} if provision_info else {}),
+    }
+
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, RAG_SEARCH_WORKERS), thread_name_prefix="rag-search")
+
+def _timed_call(fn, *args, **kwargs) -> Tuple[object, float]:
+    started = perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (perf_counter() - started) * 1000
+
+def _submit_search_task(fn, *args) -> Future:
+    """Run embedding-independent search work off the request thread.
+
+    The future resolves to ``(result, elapsed_ms)``. With RAG_SEARCH_PARALLEL
+    off the work runs inline and an already completed future is returned.
+    """
+    if RAG_SEARCH_PARALLEL:
+        return _SEARCH_EXECUTOR.submit(copy_context().run, _timed_call, fn, *args)
+    future: Future = Future()
+    future.set_result(_timed_call(fn, *args))
+    return future
+
+def _search_timings(started: float, **stages: Optional[float]) -> Dict[str, object]:
+    timings: Dict[str, object] = {
+        key: round(float(value), 3) for key, value in stages.items() if value is not None
+    }
+    timings["total_ms"] = round((perf_counter() - started) * 1000, 3)
+    timings["parallel"] = RAG_SEARCH_PARALLEL
+    return timings
+
+_SEARCH_TIMING_LOCK = Lock()
+_SEARCH_TIMING_SAMPLES: Dict[str, Dict[str, deque]] = {}
+
+def _search_timing_track(route: str, response: Dict[str, object], serialize_ms: Optional[float]) -> None:
+    """Feed one response's stage timings into the rolling percentiles and the timing log.
+
+    Cache hits are tracked under ``<route>_cached`` so they do not flatten the
+    percentiles of the stages that actually ran.
+    """
+    timings = response.get("timings") if isinstance(response.get("timings"), dict) else {}
+    stages = {key: float(value) for key, value in timings.items() if key.endswith("_ms") and isinstance(value, (int, float))}
+    if serialize_ms is not None:
+        stages["serialize_ms"] = serialize_ms
+    result_cache = response.get("result_cache")
+    label = f"{route}_cached" if result_cache in {"hit", "coalesced"} else route
+    window = max(1, RAG_SEARCH_TIMING_WINDOW)
+    with _SEARCH_TIMING_LOCK:
+        samples = _SEARCH_TIMING_SAMPLES.setdefault(label, {})
+        for stage, value in stages.items():
+            samples.setdefault(stage, deque(maxlen=window)).append(value)
+    if RAG_SEARCH_TIMING_LOG:
+        record = {
+            "route": route,
+            "result_cache": result_cache,
+            "embed_cache": timings.get("embed_cache"),
+            "dense_plan": (response.get("dense_plan") or {}).get("plan") if isinstance(response.get("dense_plan"), dict) else None,
+            "results": len(response.get("results") or response.get("queries") or []),
+            **{stage: round(value, 3) for stage, value in stages.items()},
+        }
+        logger.info("[rag][search-timing] %s", json.dumps(record, ensure_ascii=False, sort_keys=True))
+
+def _search_timing_status() -> Dict[str, object]:
+    with _SEARCH_TIMING_LOCK:
+        snapshot = {
+            label: {stage: np.fromiter(values, dtype=np.float64, count=len(values)) for stage, values in stages.items()}
+            for label, stages in _SEARCH_TIMING_SAMPLES.items()
+        }
+    routes: Dict[str, object] = {}
+    for label, stages in sorted(snapshot.items()):
+        routes[label] = {
+            stage: {
+                "count": int(values.size),
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p95_ms": round(float(np.percentile(values, 95)), 3),
+                "p99_ms": round(float(np.percentile(values, 99)), 3),
+                "max_ms": round(float(values.max()), 3),
+            }
+            for stage, values in sorted(stages.items())
+            if values.size
+        }
+    return {"window": RAG_SEARCH_TIMING_WINDOW, "routes": routes}
+
+def _run_search(payload: SearchIn, request: Request) -> Dict[str, object]:
+    started = perf_counter()
+    plan, plan_ms = _timed_call(_search_plan, payload)
+    if plan["response"] is not None:
+        return {**plan["response"], "timings": _search_timings(started, plan_ms=plan_ms, **plan["stages"])}
+
+    lexical_future = _submit_search_task(_search_lexical_candidates, plan)
+    embed_result, embed_ms = _timed_call(_embed_query_with_usage, payload.query)
+    q_embeds = list(embed_result.get("embeddings") or [])
+    if not q_embeds:
+        return {"results": [], "groups": [], "retrievers_used": ["dense"], "search_strategy": "dense"}
+    q_emb = q_embeds[0]
+    observability = _build_observability_context(
+        request,
+        "rag_search",
+        top_k=plan["top_k"],
+    )
+    result_count = 0
+
+    dense_started = perf_counter()
+    try:
+        include_items = payload.include or ["documents", "metadatas", "distances"]
+        flat, dense_fetch = _dense_fetch(plan, q_emb, include_items)
+    except Exception as e:
+        _log_rag_cost_usage(
+            model=embed_result.get("model"),
+            latency_ms=embed_result.get("latency_ms"),
+            prompt_tokens=_to_int(embed_result.get("prompt_tokens")),
+            total_tokens=_to_int(embed_result.get("total_tokens")),
+            embedding_input_count=int(embed_result.get("embedding_input_count") or 0),
+            text_chars=_to_int(embed_result.get("text_chars")),
+            chunk_count=1,
+            result_count=result_count,
+            embedding_calls=int(embed_result.get("embedding_calls") or 0),
+            cost_read_directly=bool(embed_result.get("cost_read_directly")),
+            embedding_cache=embed_result.get("embedding_cache"),
+            **observability,
+        )
+        return {
+            "results": [],
+            "groups": [],
+            "retrievers_used": ["dense"],
+            "search_strategy": "dense",
+            "error": f"query_failed: {e.__class__.__name__}: {e}",
+        }
+
+    dense_ms = (perf_counter() - dense_started) * 1000
+    wait_started = perf_counter()
+    lexical_candidates, lexical_ms = lexical_future.result()
+    lexical_wait_ms = (perf_counter() - wait_started) * 1000
+    response, rank_ms = _timed_call(_search_finish, plan, flat, lexical_candidates)
     _log_rag_cost_usage(
         model=embed_result.get("model"),
         latency_ms=embed_result.get("latency_ms"),
@@ -4729,156 +9274,221 @@ def search(payload: SearchIn, request: Request):
         embedding_input_count=int(embed_result.get("embedding_input_count") or 0),
         text_chars=_to_int(embed_result.get("text_chars")),
         chunk_count=1,
-        result_count=result_count,
+        result_count=len(response["results"]),
+        embedding_calls=int(embed_result.get("embedding_calls") or 0),
         cost_read_directly=bool(embed_result.get("cost_read_directly")),
+        embedding_cache=embed_result.get("embedding_cache"),
         **observability,
     )
+    response["dense_plan"] = plan["dense_plan"]
+    response["dense_fetch"] = dense_fetch
+    response["timings"] = _search_timings(
+        started,
+        plan_ms=plan_ms,
+        embed_ms=embed_ms,
+        dense_ms=dense_ms,
+        lexical_ms=lexical_ms,
+        lexical_wait_ms=lexical_wait_ms,
+        rank_ms=rank_ms,
+        **plan["stages"],
+    )
+    response["timings"]["embed_cache"] = embed_result.get("embedding_cache")
+    return response
 
-    groups_map: Dict[Tuple[str, str, str], Dict] = {}
-    for r in flat:
-        article_id = r.get("articleId") or ""
-        doc_id = r.get("doc_id") or ""
-        title_key = (r.get("title") or "").strip()
-        key = (article_id, doc_id, title_key)
-        g = groups_map.get(key)
-        if not g:
-            g = {
-                "doc_id": doc_id or None,
-                "docId": r.get("docId") or doc_id or None,
-                "title": r.get("title"),
-                "authors": r.get("authors"),
-                "year": r.get("year"),
-                "issue": r.get("issue"),
-                "audience": r.get("audience"),
-                "audiences": r.get("audiences"),
-                "url": r.get("url"),
-                "source_type": r.get("source_type"),
-                "fileName": r.get("fileName"),
-                "section": r.get("section"),
-                "articleId": r.get("articleId"),
-                "journalTitle": r.get("journalTitle"),
-                "collection_id": r.get("collection_id"),
-                "country": r.get("country"),
-                "county": r.get("county"),
-                "jurisdiction_level": r.get("jurisdiction_level"),
-                "municipality_name": r.get("municipality_name"),
-                "municipality_id": r.get("municipality_id"),
-                "district_name": r.get("district_name"),
-                "district_id": r.get("district_id"),
-                "item_type": r.get("item_type"),
-                "content_status": r.get("content_status"),
-                "resource_type": r.get("resource_type"),
-                "checked_at": r.get("checked_at"),
-                "source_keys": r.get("source_keys"),
-                "source_urls": r.get("source_urls"),
-                "source_register_file": r.get("source_register_file"),
-                "source_count": r.get("source_count"),
-                "administering_body": r.get("administering_body"),
-                "tags": r.get("tags"),
-                "language": r.get("language"),
-                "retrieval_channels": set(),
-                "pages_all": [],
-                "page_ranges": [],
-                "items": [],
-            }
-            groups_map[key] = g
-        if isinstance(r.get("page"), int):
-            g["pages_all"].append(r["page"])
-        if isinstance(r.get("pages"), list):
-            for p in r["pages"]:
-                if isinstance(p, int):
-                    g["pages_all"].append(p)
-        if isinstance(r.get("pageRange"), str) and r["pageRange"]:
-            g["page_ranges"].append(r["pageRange"])
-        if isinstance(r.get("tags"), list):
-            if not isinstance(g.get("tags"), list):
-                g["tags"] = []
-            for t in r["tags"]:
-                if t and t not in g["tags"]:
-                    g["tags"].append(t)
-        g["items"].append(r)
-        if isinstance(r.get("retrieval_channels"), list):
-            for channel in r["retrieval_channels"]:
-                if channel:
-                    g["retrieval_channels"].add(channel)
+@app.post("/search", dependencies=[Depends(_require_key)])
+def search(payload: SearchIn, request: Request):
+    if RAG_SEARCH_CACHE_SIZE <= 0:
+        response = _run_search(payload, request)
+    else:
+        response = _search_cached(payload, request)
+    projected = _project_search_response(response, payload.view, payload.fields)
+    if not payload.timings:
+        projected = {key: value for key, value in projected.items() if key != "timings"}
+    serialize_started = perf_counter()
+    out = _search_json_response(projected)
+    _search_timing_track("search", response, (perf_counter() - serialize_started) * 1000 if out is not projected else None)
+    return out
 
-    def _collapse_pages_local(pages):
-        s = sorted({p for p in pages if isinstance(p, int)})
-        if not s:
-            return ""
-        out = []
-        start = prev = None
-        for p in s:
-            if start is None:
-                start = prev = p
-                continue
-            if p == prev + 1:
-                prev = p
+def _fuse_search_results(responses: List[Dict[str, object]], limit: Optional[int]) -> List[Dict[str, object]]:
+    """Reciprocal-rank fusion of per-query result lists, keeping each chunk's best-ranked copy."""
+    rrf_k = max(1, RAG_RRF_K)
+    fused: Dict[str, Dict[str, object]] = {}
+    for query_index, response in enumerate(responses):
+        for rank, item in enumerate(response.get("results") or [], start=1):
+            item_id = str(item.get("id") or "")
+            if not item_id:
                 continue
-            out.append(f"{start}" if start == prev else f"{start}–{prev}")
-            start = prev = p
-        out.append(f"{start}" if start == prev else f"{start}–{prev}")
-        return ", ".join(out)
+            entry = fused.get(item_id)
+            if entry is None:
+                entry = fused[item_id] = {**item, "fused_score": 0.0, "matched_queries": []}
+            entry["fused_score"] += 1.0 / (rrf_k + rank)
+            entry["matched_queries"].append(query_index)
+    ordered = sorted(fused.values(), key=lambda item: -item["fused_score"])
+    for rank, item in enumerate(ordered, start=1):
+        item["fused_score"] = round(item["fused_score"], 6)
+        item["fused_rank"] = rank
+    return ordered[:limit] if limit else ordered
+
+def _search_batch_failed(exc: Exception) -> Dict[str, object]:
+    """Per-query response for a dense retrieval failure inside /search/batch."""
+    return {
+        "results": [],
+        "groups": [],
+        "retrievers_used": ["dense"],
+        "search_strategy": "dense",
+        "error": f"query_failed: {exc.__class__.__name__}: {exc}",
+    }
 
-    groups = []
-    for g in groups_map.values():
-        pages_compact = _collapse_pages_local(g["pages_all"]) or (", ".join(sorted(set(g["page_ranges"]))) if g["page_ranges"] else "")
-        meta_for_ref = {
-            "authors": g["authors"],
-            "title": g["title"],
-            "year": g["year"],
-            "issue": g["issue"],
-            "issue_id": g["issue"],
-            "journal_title": g.get("journalTitle"),
-        }
-        short_ref = _make_short_ref(meta_for_ref, pages_compact)
-        groups.append({
-            "doc_id": g["doc_id"],
-            "docId": g.get("docId"),
-            "title": g["title"],
-            "authors": g["authors"],
-            "year": g["year"],
-            "issue": g["issue"],
-            "audience": g["audience"],
-            "audiences": g.get("audiences"),
-            "url": g["url"],
-            "source_type": g["source_type"],
-            "fileName": g["fileName"],
-            "section": g["section"],
-            "articleId": g["articleId"],
-            "journalTitle": g["journalTitle"],
-            "collection_id": g.get("collection_id"),
-            "country": g.get("country"),
-            "county": g.get("county"),
-            "jurisdiction_level": g.get("jurisdiction_level"),
-            "municipality_name": g.get("municipality_name"),
-            "municipality_id": g.get("municipality_id"),
-            "district_name": g.get("district_name"),
-            "district_id": g.get("district_id"),
-            "item_type": g.get("item_type"),
-            "content_status": g.get("content_status"),
-            "resource_type": g.get("resource_type"),
-            "checked_at": g.get("checked_at"),
-            "source_keys": g.get("source_keys"),
-            "source_urls": g.get("source_urls"),
-            "source_register_file": g.get("source_register_file"),
-            "source_count": g.get("source_count"),
-            "administering_body": g.get("administering_body"),
-            "retrieval_channels": sorted(list(g.get("retrieval_channels") or [])),
-            "tags": g.get("tags"),
-            "language": g.get("language"),
-            "pages": pages_compact,
-            "short_ref": short_ref,
-            "count": len(g["items"]),
-            "items": g["items"],
-        })
+@app.post("/search/batch", dependencies=[Depends(_require_key)])
+def search_batch(payload: SearchBatchIn, request: Request):
+    """Run several searches with one embedding call and one Chroma query per distinct filter.
 
-    groups.sort(key=lambda x: (-x["count"], x["title"] or ""))
-    return {
-        "results": flat,
-        "groups": groups,
-        "retrievers_used": retrievers_used,
-        "search_strategy": "hybrid" if any(channel != "dense" for channel in retrievers_used) else "dense",
-        "merge_strategy": _build_hybrid_merge_strategy(requested_retrievers),
-        "channel_stats": _build_channel_stats(flat),
+    Each entry of ``queries`` in the response has the same shape as a ``/search``
+    response. Results already in the search cache are served from it.
+    """
+    started = perf_counter()
+    inputs = payload.search_inputs()
+    responses: List[Optional[Dict[str, object]]] = [None] * len(inputs)
+    cache_keys: List[Optional[Tuple[int, str]]] = [None] * len(inputs)
+    plans: Dict[int, Dict[str, object]] = {}
+    for index, search_in in enumerate(inputs):
+        if RAG_SEARCH_CACHE_SIZE > 0:
+            cache_keys[index] = (_COLLECTION_GENERATION, _search_cache_key(search_in))
+            cached = _search_cache_get(cache_keys[index])
+            if cached is not None:
+                _SEARCH_CACHE_STATS["hits"] += 1
+                responses[index] = {**cached, "result_cache": "hit"}
+                cache_keys[index] = None
+                continue
+        plan = _search_plan(search_in)
+        if plan["response"] is not None:
+            responses[index] = plan["response"]
+        else:
+            plans[index] = plan
+
+    lexical_cache: Dict[str, object] = {}
+    lexical_future = _submit_search_task(_search_lexical_batch, plans, lexical_cache)
+    embed_result, embed_ms = _timed_call(_embed_queries_with_usage, [inputs[index].query for index in plans])
+    embeddings = dict(zip(plans.keys(), embed_result.get("embeddings") or []))
+    include_items = payload.include or ["documents", "metadatas", "distances"]
+    by_where: Dict[str, List[int]] = {}
+    for index, plan in plans.items():
+        by_where.setdefault(json.dumps(plan["chroma_where"], sort_keys=True, default=str), []).append(index)
+
+    dense_started = perf_counter()
+    dense_results: Dict[int, List[Dict[str, object]]] = {}
+    dense_fetch: Dict[int, Dict[str, object]] = {}
+    chroma_queries = 0
+    for indexes in by_where.values():
+        indexes = [index for index in indexes if embeddings.get(index)]
+        if not indexes:
+            continue
+        if plans[indexes[0]]["dense_plan"]["plan"] != "ann":
+            for index in indexes:
+                try:
+                    dense_results[index], dense_fetch[index] = _dense_fetch(plans[index], embeddings[index], include_items)
+                except Exception as e:
+                    responses[index] = _search_batch_failed(e)
+            continue
+        fetch_k = max(_dense_initial_fetch(plans[index]) for index in indexes)
+        try:
+            chroma_queries += 1
+            query_started = perf_counter()
+            res = collection.query(
+                query_embeddings=[embeddings[index] for index in indexes],
+                n_results=fetch_k,
+                where=plans[indexes[0]]["chroma_where"],
+                include=include_items,
+            )
+            _chroma_observe("query", query_started)
+        except Exception as e:
+            for index in indexes:
+                responses[index] = _search_batch_failed(e)
+            continue
+        for row, index in enumerate(indexes):
+            try:
+                dense_results[index], dense_fetch[index] = _dense_fetch(
+                    plans[index],
+                    embeddings[index],
+                    include_items,
+                    res=res,
+                    row=row,
+                    fetch_k=fetch_k,
+                )
+            except Exception as e:
+                # A follow-up over-fetch round failed; only this query loses its dense hits.
+                responses[index] = _search_batch_failed(e)
+                continue
+            chroma_queries += dense_fetch[index]["rounds"] - 1
+    dense_ms = (perf_counter() - dense_started) * 1000
+    wait_started = perf_counter()
+    lexical_by_index, lexical_ms = lexical_future.result()
+    lexical_wait_ms = (perf_counter() - wait_started) * 1000
+    rank_started = perf_counter()
+    for index, flat in dense_results.items():
+        responses[index] = _search_finish(plans[index], flat, lexical_by_index.get(index) or [])
+        responses[index]["dense_plan"] = plans[index]["dense_plan"]
+        responses[index]["dense_fetch"] = dense_fetch[index]
+    rank_ms = (perf_counter() - rank_started) * 1000
+
+    for index, response in enumerate(responses):
+        if response is None:
+            responses[index] = {"results": [], "groups": [], "retrievers_used": ["dense"], "search_strategy": "dense"}
+        elif cache_keys[index] is not None and not response.get("error"):
+            _SEARCH_CACHE_STATS["misses"] += 1
+            _search_cache_put(cache_keys[index], response)
+            responses[index] = {**response, "result_cache": "miss"}
+
+    if plans:
+        _log_rag_cost_usage(
+            model=embed_result.get("model"),
+            latency_ms=embed_result.get("latency_ms"),
+            prompt_tokens=_to_int(embed_result.get("prompt_tokens")),
+            total_tokens=_to_int(embed_result.get("total_tokens")),
+            embedding_input_count=int(embed_result.get("embedding_input_count") or 0),
+            text_chars=_to_int(embed_result.get("text_chars")),
+            chunk_count=len(plans),
+            result_count=sum(len(responses[index].get("results") or []) for index in plans),
+            top_k=max(plans[index]["top_k"] for index in plans),
+            embedding_calls=int(embed_result.get("embedding_calls") or 0),
+            cost_read_directly=bool(embed_result.get("cost_read_directly")),
+            embedding_cache=embed_result.get("embedding_cache"),
+            **_build_observability_context(request, "rag_search_batch"),
+        )
+
+    out: Dict[str, object] = {
+        "queries": [
+            {"query": search_in.query, **_project_search_response(response, payload.view, payload.fields)}
+            for search_in, response in zip(inputs, responses)
+        ],
+        "embedding_calls": int(embed_result.get("embedding_calls") or 0),
+        "chroma_queries": chroma_queries,
+        "timings": _search_timings(
+            started,
+            embed_ms=embed_ms,
+            dense_ms=dense_ms,
+            lexical_ms=lexical_ms,
+            lexical_wait_ms=lexical_wait_ms,
+            rank_ms=rank_ms,
+        ),
     }
+    if payload.fuse:
+        fused = _fuse_search_results(responses, payload.fused_top_k)
+        if payload.view != "full" or payload.fields:
+            fused = [
+                {
+                    **item,
+                    "fused_score": source["fused_score"],
+                    "fused_rank": source["fused_rank"],
+                    "matched_queries": source["matched_queries"],
+                }
+                for item, source in zip(
+                    _project_search_response({"results": fused}, payload.view, payload.fields)["results"],
+                    fused,
+                )
+            ]
+        out["fused_results"] = fused
+    serialize_started = perf_counter()
+    body = _search_json_response(out)
+    _search_timing_track("search_batch", out, (perf_counter() - serialize_started) * 1000 if body is not out else None)
+    return body
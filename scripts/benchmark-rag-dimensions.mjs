@@ -0,0 +1,130 @@
+#!/usr/bin/env node
+
+import fs from "node:fs/promises";
+import { pathToFileURL } from "node:url";
+
+const DEFAULT_EVAL_PATH = "eval/golden-rag-v1.json";
+const DEFAULT_DIMENSIONS = [3072, 1536, 1024, 256];
+const RAW_RAG_HOST = String(process.env.RAG_INTERNAL_HOST || process.env.RAG_API_BASE || "127.0.0.1:8000").trim();
+const RAG_KEY = String(process.env.RAG_SERVICE_API_KEY || "").trim();
+
+function usage() {
+  return [
+    "Usage:",
+    "  npm run rag:benchmark:dimensions",
+    "  npm run rag:benchmark:dimensions -- --dimensions 3072,1536,1024,256 --k 10",
+    "  npm run rag:benchmark:dimensions -- --collection sotsiaalai-cosine-m16-ef100-d1024-1a2b3c4d --search-ef 40,100",
+    "  npm run rag:benchmark:dimensions -- --json reports/rag-dimensions-benchmark.json",
+    "",
+    "Environment:",
+    "  RAG_INTERNAL_HOST=127.0.0.1:8000",
+    "  RAG_SERVICE_API_KEY=...",
+    "",
+    "Embeds the golden eval questions once and asks /collection/benchmark for",
+    "recall@k of exact search on shortened vectors (truncate + normalise, as",
+    "text-embedding-3-* does for `dimensions`) against full-size exact search,",
+    "plus latency and vector memory for each size."
+  ].join("\n");
+}
+
+function parseList(value) {
+  return String(value || "")
+    .split(",")
+    .map(item => Number.parseInt(item.trim(), 10))
+    .filter(item => Number.isFinite(item) && item > 0);
+}
+
+export function parseArgs(argv = []) {
+  const args = {
+    evalPath: DEFAULT_EVAL_PATH,
+    dimensions: DEFAULT_DIMENSIONS,
+    searchEf: [],
+    collection: null,
+    k: 10,
+    jsonPath: null,
+    help: false
+  };
+  for (let index = 0; index < argv.length; index += 1) {
+    const arg = argv[index];
+    if (arg === "--help" || arg === "-h") args.help = true;
+    else if (arg === "--eval-file") args.evalPath = argv[++index] || args.evalPath;
+    else if (arg === "--dimensions") args.dimensions = parseList(argv[++index]);
+    else if (arg === "--search-ef") args.searchEf = parseList(argv[++index]);
+    else if (arg === "--collection") args.collection = argv[++index] || null;
+    else if (arg === "--k") args.k = Number.parseInt(argv[++index], 10) || args.k;
+    else if (arg === "--json") args.jsonPath = argv[++index] || null;
+    else throw new Error(`Unknown option: ${arg}`);
+  }
+  return args;
+}
+
+function normalizeBaseFromHost(host) {
+  const trimmed = String(host || "").trim().replace(/\/+$/u, "");
+  if (!trimmed) return "http://127.0.0.1:8000";
+  if (/^https?:\/\//iu.test(trimmed)) return trimmed;
+  return `http://${trimmed}`;
+}
+
+export function goldenQuestions(evalSet = {}) {
+  const cases = Array.isArray(evalSet.cases) ? evalSet.cases : [];
+  return [...new Set(cases.map(item => String(item?.question || "").trim()).filter(Boolean))];
+}
+
+function formatRow(label, row, k) {
+  if (row.skipped) return `${label.padEnd(14)} skipped: ${row.skipped}`;
+  const recall = row[`recall_at_${k}`];
+  const memory = row.vector_bytes ? `${(row.vector_bytes / 1024 / 1024).toFixed(1)} MiB` : "-";
+  return [
+    label.padEnd(14),
+    `recall@${k}=${recall === undefined ? "1.0000" : Number(recall).toFixed(4)}`,
+    `p50=${row.p50_ms}ms`,
+    `p95=${row.p95_ms}ms`,
+    `vectors=${memory}`
+  ].join("  ");
+}
+
+async function main() {
+  const args = parseArgs(process.argv.slice(2));
+  if (args.help) {
+    console.log(usage());
+    return;
+  }
+  if (!RAG_KEY) throw new Error("RAG_SERVICE_API_KEY is required");
+  const questions = goldenQuestions(JSON.parse(await fs.readFile(args.evalPath, "utf8")));
+  if (!questions.length) throw new Error(`No questions in ${args.evalPath}`);
+
+  const res = await fetch(`${normalizeBaseFromHost(RAW_RAG_HOST)}/collection/benchmark`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "X-API-Key": RAG_KEY
+    },
+    body: JSON.stringify({
+      collection: args.collection,
+      k: args.k,
+      queries: questions,
+      dimensions: args.dimensions,
+      search_ef: args.searchEf.length ? args.searchEf : null
+    })
+  });
+  const raw = await res.text();
+  if (!res.ok) throw new Error(`RAG benchmark failed (${res.status}): ${raw.slice(0, 500)}`);
+  const data = raw ? JSON.parse(raw) : {};
+
+  console.log(`[rag-dimensions] ${data.collection}: ${data.vectors} vectors, ${data.queries} golden questions, k=${data.k}`);
+  console.log(formatRow(`exact ${data.exact?.dimensions}d`, data.exact || {}, data.k));
+  for (const row of data.dimensions || []) console.log(formatRow(`exact ${row.dimensions}d`, row, data.k));
+  for (const row of data.settings || []) console.log(formatRow(`hnsw ef=${row.search_ef}`, row, data.k));
+
+  if (args.jsonPath) {
+    await fs.writeFile(args.jsonPath, `${JSON.stringify(data, null, 2)}\n`, "utf8");
+    console.log(`[rag-dimensions] wrote ${args.jsonPath}`);
+  }
+}
+
+if (process.argv[1] && import.meta.url === pathToFileURL(process.argv[1]).href) {
+  main().catch(error => {
+    console.error(`[rag-dimensions] ${error?.message || error}`);
+    process.exitCode = 1;
+  });
+}
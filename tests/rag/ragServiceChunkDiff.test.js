@@ -0,0 +1,70 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+import path from "node:path";
+import { spawnSync } from "node:child_process";
+
+const repoRoot = process.cwd();
+const ragServicePath = path.join(repoRoot, "rag-service", "main.py");
+const hasPython = spawnSync("python3", ["--version"], { encoding: "utf8" }).status === 0;
+
+function extractPythonFunction(source, name) {
+  const startMarker = `def ${name}(`;
+  const start = source.indexOf(startMarker);
+  assert.notEqual(start, -1, `${name} not found in rag-service/main.py`);
+
+  const nextDef = source.indexOf("\ndef ", start + startMarker.length);
+  assert.notEqual(nextDef, -1, `could not find end of ${name}`);
+  return source.slice(start, nextDef);
+}
+
+function matchPositionalChunkIds(input) {
+  const fn = extractPythonFunction(fs.readFileSync(ragServicePath, "utf8"), "_match_positional_chunk_ids");
+  const code = [
+    "import json, sys",
+    "from typing import Dict, List, Tuple",
+    fn,
+    "args = json.load(sys.stdin)",
+    "stored = {key: (value[0], value[1]) for key, value in args['stored'].items()}",
+    "print(json.dumps(_match_positional_chunk_ids(args['ids'], args['documents'], args['metadatas'], stored)))"
+  ].join("\n");
+  const result = spawnSync("python3", ["-c", code], { input: JSON.stringify(input), encoding: "utf8" });
+  assert.equal(result.status, 0, result.stderr);
+  return JSON.parse(result.stdout);
+}
+
+const stored = {
+  "doc:0:aaaa": ["A", { chunk_index: 0 }],
+  "doc:1:bbbb": ["B", { chunk_index: 1 }],
+  "doc:2:cccc": ["C", { chunk_index: 2 }]
+};
+
+test("chunk diff keeps stored ids when a prepended paragraph shifts every chunk index", { skip: !hasPython }, () => {
+  const ids = matchPositionalChunkIds({
+    stored,
+    ids: ["doc:0:xxxx", "doc:1:aaaa", "doc:2:bbbb", "doc:3:cccc"],
+    documents: ["X", "A", "B", "C"],
+    metadatas: [0, 1, 2, 3].map(index => ({ chunk_index: index }))
+  });
+  assert.deepEqual(ids, ["doc:0:xxxx", "doc:0:aaaa", "doc:1:bbbb", "doc:2:cccc"]);
+});
+
+test("chunk diff pairs a re-worded chunk with the stored chunk at the same index", { skip: !hasPython }, () => {
+  const ids = matchPositionalChunkIds({
+    stored,
+    ids: ["doc:0:aaaa", "doc:1:dddd", "doc:2:cccc"],
+    documents: ["A", "B2", "C"],
+    metadatas: [0, 1, 2].map(index => ({ chunk_index: index }))
+  });
+  assert.deepEqual(ids, ["doc:0:aaaa", "doc:1:bbbb", "doc:2:cccc"]);
+});
+
+test("chunk diff gives repeated text one stored id each", { skip: !hasPython }, () => {
+  const ids = matchPositionalChunkIds({
+    stored: { "doc:0:aaaa": ["A", { chunk_index: 0 }] },
+    ids: ["doc:0:aaaa", "doc:1:aaaa"],
+    documents: ["A", "A"],
+    metadatas: [0, 1].map(index => ({ chunk_index: index }))
+  });
+  assert.deepEqual(ids, ["doc:0:aaaa", "doc:1:aaaa"]);
+});
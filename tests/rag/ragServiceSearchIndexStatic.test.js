@@ -0,0 +1,327 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+import path from "node:path";
+
+const repoRoot = process.cwd();
+const ragServicePath = path.join(repoRoot, "rag-service", "main.py");
+
+function readRagServiceMain() {
+  return fs.readFileSync(ragServicePath, "utf8");
+}
+
+function extractPythonFunction(source, name) {
+  const startMarker = `def ${name}(`;
+  const start = source.indexOf(startMarker);
+  assert.notEqual(start, -1, `${name} not found in rag-service/main.py`);
+
+  const nextDef = source.indexOf("\ndef ", start + startMarker.length);
+  assert.notEqual(nextDef, -1, `could not find end of ${name}`);
+  return source.slice(start, nextDef);
+}
+
+test("RAG service keeps the lexical search index in sync with collection writes", () => {
+  const source = readRagServiceMain();
+  assert.match(extractPythonFunction(source, "_replace_document_vectors_payload"), /_search_index_replace_document\(\s*doc_id,/);
+  assert.match(extractPythonFunction(source, "_ingest_text"), /_search_index_upsert_chunks\(/);
+  assert.match(extractPythonFunction(source, "patch_document_metadata"), /_search_index_update_metadata\(ids, new_metadatas\)/);
+  assert.match(extractPythonFunction(source, "delete_doc"), /_search_index_delete_document\(doc_id\)/);
+});
+
+test("RAG service rebuilds the search index without racing concurrent collection writes", () => {
+  const source = readRagServiceMain();
+  const rebuild = extractPythonFunction(source, "_search_index_rebuild");
+  assert.match(rebuild, /with COLLECTION_WRITE_LOCK:\s*got = collection\.get\(include=\["documents", "metadatas"\]/);
+  assert.match(rebuild, /_search_index_rebuild_reconcile\(conn, page_size\)/);
+  assert.match(extractPythonFunction(source, "_collection_note_write"), /_SEARCH_INDEX_STATE\["rebuild_dirty"\]\.add\(doc_id\)/);
+  assert.match(extractPythonFunction(source, "_search_index_ensure_ready"), /if _search_index_claim_rebuild\(\):/);
+  assert.match(extractPythonFunction(source, "rebuild_search_index"), /if not _search_index_claim_rebuild\(\):/);
+});
+
+test("RAG service lexical retrieval reads postings and falls back to a bounded scan", () => {
+  const fn = extractPythonFunction(readRagServiceMain(), "_fetch_lexical_candidates");
+  assert.match(fn, /_search_index_ensure_ready\(\)/);
+  assert.match(fn, /_fetch_lexical_candidates_indexed\(/);
+  assert.match(fn, /limit=scan_limit/);
+});
+
+test("RAG service lexical IDF ignores the metadata filter", () => {
+  const fn = extractPythonFunction(readRagServiceMain(), "_lexical_index_term_stats");
+  const idf = fn.indexOf("idf = np.log(");
+  const filtered = fn.indexOf("filter_mask[postings[allowed, 2]]");
+  assert.ok(idf > 0 && filtered > idf, "df/idf must be computed before filtered postings are dropped");
+});
+
+test("RAG service ingest payloads carry normalised lexical fields for the search index", () => {
+  const source = readRagServiceMain();
+  for (const name of ["_build_ingest_payload", "_build_explicit_chunk_payload"]) {
+    assert.match(extractPythonFunction(source, name), /"lexical_fields": \[_lexical_index_fields\(md, text\)/);
+  }
+});
+
+test("RAG service merges exact legal provision hits as the provision_lookup channel", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /HYBRID_CHANNEL_WEIGHTS = \{[^}]*"provision_lookup"/);
+  assert.match(source, /LEXICAL_RETRIEVAL_CHANNELS = \("provision_lookup"/);
+  assert.match(extractPythonFunction(source, "_search_plan"), /_extract_query_provision_refs\(payload\.query\)/);
+  assert.match(
+    extractPythonFunction(source, "_search_finish"),
+    /_merge_provision_candidates\(lexical_candidates, provision_candidates\)/
+  );
+  assert.match(extractPythonFunction(source, "_search_provision_response"), /"search_strategy": "provision_lookup"/);
+});
+
+test("RAG service serves repeated search queries from the query embedding cache", () => {
+  const source = readRagServiceMain();
+  const cached = extractPythonFunction(source, "_embed_query_with_usage");
+  assert.match(cached, /_query_embed_cache_get\(key\)/);
+  assert.match(cached, /"embedding_calls": 0/);
+  assert.match(extractPythonFunction(source, "_log_rag_cost_usage"), /"embedding_cache": context\.get\("embedding_cache"\)/);
+  const fn = extractPythonFunction(source, "_run_search");
+  assert.match(fn, /_timed_call\(_embed_query_with_usage, payload\.query\)/);
+  assert.doesNotMatch(fn, /_embed_batch_with_usage\(\[payload\.query\]\)/);
+});
+
+test("RAG service caches /search responses per collection generation and coalesces misses", () => {
+  const source = readRagServiceMain();
+  assert.match(extractPythonFunction(source, "_search_index_apply"), /_bump_collection_generation\(\)/);
+  assert.match(extractPythonFunction(source, "_search_index_apply"), /    finally:\n(?:\s+#.*\n)*\s+_bump_collection_generation\(\)\s*$/);
+  const cached = extractPythonFunction(source, "_search_cached");
+  assert.match(cached, /key = \(_COLLECTION_GENERATION, _search_cache_key\(payload\)\)/);
+  assert.match(cached, /flight\["event"\]\.wait\(/);
+  assert.match(cached, /if not result\.get\("error"\)/);
+  assert.match(source, /def search\(payload: SearchIn, request: Request\):\n(?:.*\n){0,4}\s+response = _search_cached\(payload, request\)/);
+});
+
+test("RAG service batch search embeds once and queries Chroma once per distinct filter", () => {
+  const source = readRagServiceMain();
+  const start = source.indexOf("def search_batch(payload: SearchBatchIn");
+  assert.notEqual(start, -1, "search_batch route not found in rag-service/main.py");
+  const fn = source.slice(start);
+  assert.match(fn, /_embed_queries_with_usage, \[inputs\[index\]\.query for index in plans\]\)/);
+  assert.match(fn, /by_where\.setdefault\(json\.dumps\(plan\["chroma_where"\]/);
+  assert.match(fn, /query_embeddings=\[embeddings\[index\] for index in indexes\]/);
+  assert.match(fn, /_submit_search_task\(_search_lexical_batch, plans, lexical_cache\)/);
+  assert.match(fn, /_fuse_search_results\(responses, payload\.fused_top_k\)/);
+});
+
+test("RAG service overlaps lexical retrieval with query embedding and reports stage timings", () => {
+  const source = readRagServiceMain();
+  const fn = extractPythonFunction(source, "_run_search");
+  const submitted = fn.indexOf("_submit_search_task(_search_lexical_candidates, plan)");
+  const embedded = fn.indexOf("_embed_query_with_usage");
+  assert.notEqual(submitted, -1);
+  assert.ok(submitted < embedded, "lexical work must be submitted before the query is embedded");
+  assert.match(fn, /lexical_candidates, lexical_ms = lexical_future\.result\(\)/);
+  assert.match(fn, /response\["timings"\] = _search_timings\(/);
+});
+
+test("RAG service projects search responses after the result cache and serialises them with orjson", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /SEARCH_VIEWS = \("full", "compact", "ids_only"\)/);
+  assert.match(extractPythonFunction(source, "_project_search_response"), /projected\["item_indexes"\] = \[/);
+  assert.match(extractPythonFunction(source, "_search_json_response"), /orjson\.dumps\(/);
+  assert.doesNotMatch(extractPythonFunction(source, "_search_cache_key"), /"view"|"fields"/);
+  const route = extractPythonFunction(source, "search");
+  assert.match(route, /projected = _project_search_response\(response, payload\.view, payload\.fields\)/);
+  assert.match(route, /out = _search_json_response\(projected\)/);
+});
+
+test("RAG service stores per-chunk result skeletons and reuses them at query time", () => {
+  const source = readRagServiceMain();
+  assert.match(extractPythonFunction(source, "_lexical_index_fields"), /"skeleton": _result_skeleton\(md\)/);
+  assert.match(
+    extractPythonFunction(source, "_search_index_write_fields_unlocked"),
+    /INSERT OR REPLACE INTO result_skeletons/
+  );
+  assert.match(extractPythonFunction(source, "_search_index_delete_ords_unlocked"), /DELETE FROM result_skeletons/);
+  assert.match(extractPythonFunction(source, "_search_dense_results"), /_search_index_skeletons\(/);
+  assert.match(extractPythonFunction(source, "_search_finish"), /skeleton=skeletons\.get\(item_id\)/);
+});
+
+test("RAG service over-fetches filtered dense retrieval until top_k hits survive the filter", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_DENSE_OVERFETCH_MAX = int\(os\.getenv\("RAG_DENSE_OVERFETCH_MAX", "200"\)\)/);
+  const fn = extractPythonFunction(source, "_dense_fetch");
+  assert.match(fn, /len\(flat\) >= top_k/);
+  assert.match(fn, /exhausted = returned < fetch_k/);
+  assert.match(fn, /_dense_record_keep_rate\(plan, examined, len\(flat\)\)/);
+  assert.match(fn, /"candidates_examined": examined/);
+  assert.match(extractPythonFunction(source, "_run_search"), /flat, dense_fetch = _dense_fetch\(plan, q_emb, include_items\)/);
+  const batch = source.slice(source.indexOf("def search_batch(payload: SearchBatchIn"));
+  assert.match(batch, /_dense_fetch\(\s*plans\[index\],[\s\S]*?res=res,\s*row=row,\s*fetch_k=fetch_k,/);
+  assert.match(batch, /try:\s*dense_results\[index\], dense_fetch\[index\] = _dense_fetch\(plans\[index\], embeddings\[index\], include_items\)\s*except Exception as e:\s*responses\[index\] = _search_batch_failed\(e\)/);
+});
+
+test("RAG service configures HNSW from env and migrates collections without re-embedding", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_HNSW_SPACE = os\.getenv\("RAG_HNSW_SPACE", "l2"\)/);
+  assert.match(source, /collection = _open_collection\(_load_active_collection_name\(\)\)/);
+  const migrate = extractPythonFunction(source, "_collection_migrate");
+  assert.match(migrate, /include = \["embeddings", "documents", "metadatas"\]/);
+  assert.doesNotMatch(migrate, /_embed_texts|_embed_queries_with_usage/);
+  assert.match(migrate, /with COLLECTION_WRITE_LOCK:[\s\S]*?_COLLECTION_MIGRATION\["dirty"\][\s\S]*?collection = target/);
+  assert.match(extractPythonFunction(source, "_collection_benchmark"), /_exact_neighbours\(matrix, query, space, k\)/);
+  assert.match(extractPythonFunction(source, "_collection_benchmark"), /queries = list\(_shorten_embeddings\(embedded, int\(matrix\.shape\[1\]\)\)\)/);
+  assert.match(extractPythonFunction(source, "_collection_benchmark"), /if serving and any\(search_ef != _collection_hnsw\(target\)\["search_ef"\]/);
+  assert.match(extractPythonFunction(source, "benchmark_collection"), /if not COLLECTION_BENCHMARK_LOCK\.acquire\(blocking=False\):/);
+  const deleteRoute = extractPythonFunction(source, "delete_doc");
+  assert.match(deleteRoute, /with COLLECTION_WRITE_LOCK:\s*_collection_note_write\(doc_id\)\s*collection\.delete/);
+});
+
+test("RAG service passes the collection's embedding dimensions to OpenAI and can shorten stored vectors", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_EMBED_DIMENSIONS = int\(os\.getenv\("RAG_EMBED_DIMENSIONS", "0"\)\)/);
+  assert.match(
+    extractPythonFunction(source, "_embed_subbatch_raw"),
+    /oa\.embeddings\.create\(model=EMBED_MODEL, input=texts, dimensions=dimensions\)/
+  );
+  assert.match(extractPythonFunction(source, "_embed_dimensions"), /collection\.metadata/);
+  assert.match(extractPythonFunction(source, "_query_embed_cache_key"), /f"\{EMBED_MODEL\}@\{dimensions\}"/);
+  assert.match(extractPythonFunction(source, "_collection_migrate"), /"embed_dimensions": dimensions or 0/);
+  assert.match(extractPythonFunction(source, "_collection_migrate"), /if stored_dimensions and payload\.dimensions > stored_dimensions:/);
+  assert.match(extractPythonFunction(source, "_collection_copy"), /_shorten_embeddings\(/);
+});
+
+test("RAG service answers small filtered dense searches from the int8 vector sidecar", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_VECTOR_SCAN_MAX_ROWS = int\(os\.getenv\("RAG_VECTOR_SCAN_MAX_ROWS", "50000"\)\)/);
+  assert.match(extractPythonFunction(source, "_quantize_int8"), /astype\(np\.int8\)/);
+  const searchFn = extractPythonFunction(source, "_vector_sidecar_search");
+  assert.match(searchFn, /np\.copyto\(rows_f32, codes\[ords\], casting="unsafe"\)/);
+  assert.match(searchFn, /bits = _VECTOR_SIDECAR\["bits"\]\n    candidates = candidates\[candidates < len\(codes\)\]/);
+  assert.match(searchFn, /\n    for start in range\(0, len\(candidates\), block\):/);
+  assert.match(searchFn, /include=\["embeddings"\]/);
+  assert.match(searchFn, /_exact_distances\(/);
+  assert.match(extractPythonFunction(source, "_dense_fetch"), /rows = _vector_sidecar_rows\(plan\["filter_mask"\]\)/);
+  assert.match(extractPythonFunction(source, "_ingest_text"), /_vector_sidecar_put\(payload\["ids"\], payload\["embeddings"\]\)/);
+  assert.match(extractPythonFunction(source, "_search_index_rebuild"), /_vector_sidecar_rebuild_safe\(\)/);
+});
+
+test("RAG service plans dense retrieval from the filter's cardinality", () => {
+  const source = readRagServiceMain();
+  const planner = extractPythonFunction(source, "_dense_query_plan");
+  assert.match(planner, /rows = int\(np\.count_nonzero\(filter_mask\)\)/);
+  assert.match(planner, /rows <= RAG_EXACT_SCAN_MAX_ROWS/);
+  assert.match(planner, /"filtered_scan"/);
+  assert.match(extractPythonFunction(source, "_search_plan"), /"dense_plan": _dense_query_plan\(chroma_where, filter_mask\)/);
+  const fetch = extractPythonFunction(source, "_dense_fetch");
+  assert.match(fetch, /if chosen == "exact":\s*try:\s*return _exact_dense_search\(plan, embedding, include_items\)/);
+  assert.match(extractPythonFunction(source, "_exact_matrix"), /np\.array_equal\(entry\[2\], ords\)/);
+  assert.match(extractPythonFunction(source, "_run_search"), /response\["dense_plan"\] = plan\["dense_plan"\]/);
+});
+
+test("RAG service can shard the vector collection by a metadata field", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /SHARD_KEYS = \("collection_id", "jurisdiction_level", "municipality_id"\)/);
+  assert.match(source, /if RAG_SHARD_KEY:\s*collection = _ShardedCollection\(collection, RAG_SHARD_KEY\)/);
+  assert.match(source, /class _ShardedCollection:/);
+  assert.match(source, /return \[\(value, shard\) for value, shard in self\._shards\.items\(\) if value == "" or value in values\]/);
+  assert.match(source, /hits\.sort\(key=lambda hit: \(hit\[0\], hit\[1\]\)\)/);
+  const routing = extractPythonFunction(source, "_where_shard_values");
+  assert.match(routing, /elif field == "\$or":/);
+  assert.match(routing, /"\$in" in expected/);
+  assert.match(extractPythonFunction(source, "_collection_migrate"), /not supported while RAG_SHARD_KEY is set/);
+  assert.match(source, /@app\.post\("\/collection\/reshard", dependencies=\[Depends\(_require_key\)\]\)/);
+  const sharded = source.slice(source.indexOf("class _ShardedCollection:"), source.indexOf("\nclient = chromadb.PersistentClient"));
+  assert.doesNotMatch(sharded, /for chunk_id in ids:\s*self\._location\[chunk_id\] = value/);
+  assert.match(sharded, /self\._location: "OrderedDict\[str, str\]" = OrderedDict\(\)/);
+  assert.match(sharded, /for chunk_id, current in self\._resolve\(ids, hints=targets\)\.items\(\):/);
+  assert.match(sharded, /cursor = self\._cursors\.get\(\(where_key, skip\)\) if skip else None/);
+  assert.match(sharded, /target = _shard_value\(patch, self\.key\) if self\.key in patch else value/);
+  assert.match(sharded, /existing = self\.get\(ids=moved, include=\["embeddings", "documents", "metadatas"\]\)/);
+  assert.doesNotMatch(sharded, /ids\.index\(/);
+});
+
+test("RAG service tracks per-stage search timings with rolling percentiles", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_SEARCH_TIMING_WINDOW = int\(os\.getenv\("RAG_SEARCH_TIMING_WINDOW", "2048"\)\)/);
+  assert.match(extractPythonFunction(source, "_search_finish"), /plan\["stages"\]\.update\(/);
+  assert.match(extractPythonFunction(source, "_search_lexical_candidates"), /stats=plan\["stages"\]/);
+  assert.match(extractPythonFunction(source, "_fetch_lexical_candidates"), /stats\["lexical_score_ms"\]/);
+  assert.match(extractPythonFunction(source, "_run_search"), /\*\*plan\["stages"\],/);
+  const track = extractPythonFunction(source, "_search_timing_track");
+  assert.match(track, /deque\(maxlen=window\)/);
+  assert.match(track, /logger\.info\("\[rag\]\[search-timing\] %s", json\.dumps\(/);
+  assert.match(extractPythonFunction(source, "_search_timing_status"), /np\.percentile\(values, 99\)/);
+  assert.match(extractPythonFunction(source, "search"), /_search_timing_track\("search", response, /);
+  assert.match(source, /class SearchIn\(BaseModel\):[\s\S]*?\n    timings: bool = False\n/);
+});
+
+test("RAG service exposes Prometheus metrics without a client library", () => {
+  const source = readRagServiceMain();
+  assert.doesNotMatch(source, /prometheus_client/);
+  assert.match(source, /@app\.get\("\/metrics"\)\ndef metrics\(\):/);
+  assert.match(extractPythonFunction(source, "metrics"), /media_type="text\/plain; version=0\.0\.4; charset=utf-8"/);
+  const render = extractPythonFunction(source, "_metrics_render");
+  assert.match(render, /_bucket\{?/);
+  assert.match(render, /\(\*METRIC_LATENCY_BUCKETS, math\.inf\)/);
+  assert.match(extractPythonFunction(source, "record_request_metrics"), /getattr\(request\.scope\.get\("route"\), "path", None\)/);
+  assert.match(extractPythonFunction(source, "_embed_subbatch_raw"), /_metric_inc\("rag_embedding_requests_total", outcome="rate_limited"\)/);
+  assert.match(extractPythonFunction(source, "_score_lexical_rows"), /rag_lexical_candidates_scanned_total/);
+  assert.match(extractPythonFunction(source, "_save_registry_unlocked"), /op="save"/);
+  assert.match(extractPythonFunction(source, "_ingest_text"), /_chroma_observe\("upsert", started\)/);
+});
+
+test("RAG service emits OpenTelemetry spans carrying the observability headers", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /TRACING_EXPORTERS = \("", "console", "memory", "otlp"\)/);
+  assert.match(extractPythonFunction(source, "_tracing_setup"), /InMemorySpanExporter\(\)/);
+  assert.match(extractPythonFunction(source, "_trace_request_attributes"), /OBSERVABILITY_CONVERSATION_ID_HEADER/);
+  const middleware = extractPythonFunction(source, "record_request_metrics");
+  assert.match(middleware, /context=otel_propagate\.extract\(dict\(request\.headers\)\)/);
+  assert.match(middleware, /_TRACE_ATTRIBUTES\.reset\(trace_token\)/);
+  assert.match(source, /@_traced\("rag\.extract\.pdf"\)\ndef _extract_text_from_pdf\(/);
+  assert.match(extractPythonFunction(source, "_chroma_observe"), /_span_record\(f"rag\.chroma\.\{op\}", started\)/);
+  assert.match(extractPythonFunction(source, "_submit_search_task"), /_SEARCH_EXECUTOR\.submit\(copy_context\(\)\.run, _timed_call, fn, \*args\)/);
+});
+
+test("RAG service embeds sub-batches concurrently under a shared RPM/TPM budget", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_EMBED_CONCURRENCY = int\(os\.getenv\("RAG_EMBED_CONCURRENCY", "4"\)\)/);
+  const concurrent = extractPythonFunction(source, "_embed_subbatches_concurrent");
+  assert.match(concurrent, /_EMBED_EXECUTOR\.submit\(copy_context\(\)\.run, _embed_subbatch_limited, batch\)/);
+  assert.match(concurrent, /return \[future\.result\(\) for future in futures\]/);
+  assert.match(extractPythonFunction(source, "_embed_subbatch_limited"), /_embed_rate_acquire\(sum\(_estimate_tokens\(text\) for text in texts\)\)/);
+  const acquire = extractPythonFunction(source, "_embed_rate_acquire");
+  assert.match(acquire, /elapsed \* RAG_EMBED_TPM \/ 60\.0/);
+  assert.match(acquire, /raise HTTPException\(\s*status_code=503/);
+  assert.match(extractPythonFunction(source, "_embed_batch_with_usage"), /for resp in _embed_subbatches_concurrent\(subbatches\):/);
+});
+
+test("RAG service micro-batches concurrent query embeddings", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_QUERY_EMBED_BATCH_WINDOW_MS = float\(os\.getenv\("RAG_QUERY_EMBED_BATCH_WINDOW_MS", "5"\)\)/);
+  const batched = extractPythonFunction(source, "_embed_query_batched");
+  assert.match(batched, /batch\["full"\]\.wait\(RAG_QUERY_EMBED_BATCH_WINDOW_MS \/ 1000\.0\)/);
+  assert.match(batched, /_embed_batch_with_usage\(list\(batch\["texts"\]\)\)/);
+  assert.match(batched, /share = weight \/ max\(1, sum\(weights\)\)/);
+  assert.match(extractPythonFunction(source, "_embed_query_with_usage"), /_embed_query_batched\(query\)/);
+});
+
+test("RAG service reuses stored chunk embeddings for unchanged text", () => {
+  const source = readRagServiceMain();
+  assert.match(source, /RAG_CHUNK_EMBED_STORE_PATH = os\.getenv\("RAG_CHUNK_EMBED_STORE_PATH", str\(STORAGE_DIR \/ "chunk_embeddings\.sqlite3"\)\)/);
+  assert.match(extractPythonFunction(source, "_chunk_embed_store_key"), /f"\{EMBED_MODEL\}\\x00\{dimensions or 0\}\\x00\{text\}"/);
+  const embed = extractPythonFunction(source, "_embed_batch_with_usage");
+  assert.match(embed, /stored = _chunk_embed_store_get\(keys\)/);
+  assert.match(embed, /result = _embed_batch_with_usage\(list\(missing\.values\(\)\)\)/);
+  assert.match(embed, /result\["embedding_store_hits"\] = hits/);
+  assert.match(extractPythonFunction(source, "_build_ingest_payload"), /_embed_batch_with_usage\(final_texts, use_store=True\)/);
+  assert.match(extractPythonFunction(source, "_log_rag_cost_usage"), /"embedding_store_hits": context\.get\("embedding_store_hits"\)/);
+  assert.match(source, /@app\.post\("\/embedding-store\/compact", dependencies=\[Depends\(_require_key\)\]\)/);
+});
+
+test("RAG service re-ingests documents by diffing stored chunks", () => {
+  const source = readRagServiceMain();
+  const replace = extractPythonFunction(source, "_replace_document_vectors_payload");
+  assert.match(replace, /if previous is None or previous\[0\] != documents\[index\]:/);
+  assert.match(replace, /if payload\.get\("positional_ids"\) and stored:\n\s+ids = _match_positional_chunk_ids\(ids, documents, metadatas, stored\)/);
+  assert.match(replace, /_embed_batch_with_usage\(\[documents\[index\] for index in embed_positions\], use_store=True\)/);
+  assert.match(replace, /collection\.delete\(ids=removed_ids\)/);
+  assert.match(replace, /collection\.update\(ids=meta_ids, metadatas=meta_updates\)/);
+  assert.match(replace, /keep=keep_ids,/);
+  assert.ok(replace.indexOf("_log_rag_cost_usage(") < replace.indexOf("with COLLECTION_WRITE_LOCK:"), "cost log must run outside the write lock");
+  assert.match(extractPythonFunction(source, "_replace_document_vectors"), /_build_ingest_payload\(doc_id, text_or_pages, meta_common, embed=False\)/);
+  assert.match(source, /"inserted": changes\["inserted"\], "chunk_changes": changes, "doc": entry/);
+});
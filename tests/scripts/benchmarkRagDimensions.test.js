@@ -0,0 +1,20 @@
+import test from "node:test";
+import assert from "node:assert/strict";
+import fs from "node:fs";
+
+import { goldenQuestions, parseArgs } from "../../scripts/benchmark-rag-dimensions.mjs";
+
+test("dimension benchmark defaults to the golden set at 3072/1536/1024/256 dimensions", () => {
+  const args = parseArgs([]);
+  assert.equal(args.evalPath, "eval/golden-rag-v1.json");
+  assert.deepEqual(args.dimensions, [3072, 1536, 1024, 256]);
+  assert.deepEqual(parseArgs(["--dimensions", "512, 128,x", "--search-ef", "40,100"]).dimensions, [512, 128]);
+});
+
+test("dimension benchmark sends each distinct golden question once", () => {
+  const evalSet = JSON.parse(fs.readFileSync("eval/golden-rag-v1.json", "utf8"));
+  const questions = goldenQuestions(evalSet);
+  assert.ok(questions.length > 0);
+  assert.equal(new Set(questions).size, questions.length);
+  assert.deepEqual(goldenQuestions({ cases: [{ question: " a " }, { question: "a" }, { question: "" }, {}] }), ["a"]);
+});